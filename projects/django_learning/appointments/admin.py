@@ -1,3 +1,12 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import WeeklyTemplate
+
+
+@admin.register(WeeklyTemplate)
+class WeeklyTemplateAdmin(admin.ModelAdmin):
+    """Недельные шаблоны: слоты по ним вычисляются на лету, талоны - при бронировании"""
+    list_display = ('id', 'doctor', 'clinic', 'weekday', 'start_time', 'end_time', 'valid_from', 'valid_to')
+    list_filter = ('weekday', 'clinic')
+    list_select_related = ('doctor', 'clinic')
+    raw_id_fields = ('doctor',)
@@ -1,5 +1,12 @@
 from django.apps import AppConfig
+from django.core.signals import request_started
 
 
 class AppointmentsConfig(AppConfig):
     name = 'appointments'
+
+    def ready(self):
+        from . import checks, signals  # noqa: F401
+        from .services.doctor_search import warm_up
+
+        request_started.connect(warm_up, dispatch_uid='doctor_index_warm_up')
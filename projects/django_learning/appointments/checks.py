@@ -0,0 +1,23 @@
+# appointments/checks.py
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+from .services.cache_versions import cache_is_shared
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs=None, **kwargs):
+    """
+    Версии ключей сбрасывают кэш только в том процессе, который их увеличил:
+    с кэшем в памяти процесса другие воркеры отдают устаревшие данные
+    """
+    if cache_is_shared():
+        return []
+    backend = settings.CACHES['default']['BACKEND']
+    return [Error(
+        f"Кэш {backend} не общий для процессов: бронирование в одном процессе "
+        "не сбросит доступность и страницы в других",
+        hint="Настройте Redis, Memcached или DatabaseCache, либо CACHE_SINGLE_PROCESS = True "
+             "для запуска в одном процессе",
+        id='appointments.E001',
+    )]
@@ -0,0 +1,153 @@
+# appointments/db_router.py
+"""
+Маршрутизация чтения на реплику.
+
+На реплику уходят только запросы моделей appointments внутри
+read_from_replica / replica_reads - это страницы списков. Все записи,
+чтения в сервисах, сессии и пользователи идут на основную БД. Данные,
+которые кладутся в версионный кэш, читаются с основной БД (primary_reads):
+иначе отстающая реплика попала бы в кэш под новой версией.
+Пользователь, только что забронировавший или отменивший талон, на
+REPLICA_LAG_SECONDS закрепляется за основной БД (cookie), чтобы не увидеть
+на отстающей реплике свое старое состояние
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+REPLICA_ALIAS = 'replica'
+CACHE_ALIAS = 'cache'
+PIN_COOKIE_NAME = 'pin_primary'
+# Приложения, чьи чтения можно отдавать реплике
+REPLICA_APP_LABELS = frozenset({'appointments'})
+
+_use_replica = ContextVar('use_replica', default=False)
+_pinned_to_primary = ContextVar('pinned_to_primary', default=False)
+_force_primary = ContextVar('force_primary', default=False)
+
+
+def replica_configured() -> bool:
+    return REPLICA_ALIAS in settings.DATABASES
+
+
+def read_db() -> str:
+    """Алиас БД для чтения в текущем контексте"""
+    if (_use_replica.get() and not _pinned_to_primary.get() and not _force_primary.get()
+            and replica_configured()):
+        return REPLICA_ALIAS
+    return DEFAULT_DB_ALIAS
+
+
+@contextmanager
+def replica_reads():
+    token = _use_replica.set(True)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+@contextmanager
+def primary_reads():
+    """Чтения на основную БД, даже внутри replica_reads - например, при заполнении кэша"""
+    token = _force_primary.set(True)
+    try:
+        yield
+    finally:
+        _force_primary.reset(token)
+
+
+def read_from_replica(view):
+    """Декоратор view только для чтения: его запросы уходят на реплику"""
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            with replica_reads():
+                return await view(request, *args, **kwargs)
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        with replica_reads():
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+def pin_to_primary(request) -> None:
+    """Закрепить пользователя за основной БД после записи"""
+    request.pin_to_primary = True
+
+
+class CacheRouter:
+    """Таблица DatabaseCache живет в отдельной БД CACHE_ALIAS, если та настроена"""
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label == 'django_cache' and CACHE_ALIAS in settings.DATABASES:
+            return CACHE_ALIAS
+        return None
+
+    db_for_write = db_for_read
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if CACHE_ALIAS not in settings.DATABASES:
+            return None
+        return (app_label == 'django_cache') == (db == CACHE_ALIAS)
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in REPLICA_APP_LABELS:
+            return read_db()
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Реплика получает схему и данные репликацией с основной БД
+        return db != REPLICA_ALIAS
+
+
+class ReplicaPinMiddleware:
+    """Читает и выставляет cookie закрепления за основной БД"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        token = _pinned_to_primary.set(PIN_COOKIE_NAME in request.COOKIES)
+        try:
+            return self._finish(request, self.get_response(request))
+        finally:
+            _pinned_to_primary.reset(token)
+
+    async def __acall__(self, request):
+        token = _pinned_to_primary.set(PIN_COOKIE_NAME in request.COOKIES)
+        try:
+            return self._finish(request, await self.get_response(request))
+        finally:
+            _pinned_to_primary.reset(token)
+
+    def _finish(self, request, response):
+        if getattr(request, 'pin_to_primary', False):
+            response.set_cookie(
+                PIN_COOKIE_NAME, '1',
+                max_age=getattr(settings, 'REPLICA_LAG_SECONDS', 5),
+                httponly=True, samesite='Lax',
+            )
+        return response
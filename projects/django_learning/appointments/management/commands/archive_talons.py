@@ -0,0 +1,36 @@
+# appointments/management/commands/archive_talons.py
+from django.core.management.base import BaseCommand, CommandError
+
+from appointments.services.archive_service import ARCHIVE_BATCH_SIZE, archive_talons
+
+
+class Command(BaseCommand):
+    help = "Переносит талоны старше N дней в архивную таблицу порциями"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=int, default=365)
+        parser.add_argument('--batch-size', type=int, default=ARCHIVE_BATCH_SIZE)
+        parser.add_argument('--pause', type=float, default=0.0,
+                            help="Пауза между порциями, секунд")
+        parser.add_argument('--max-batches', type=int, default=None,
+                            help="Остановиться после стольких порций")
+
+    def handle(self, *args, **options):
+        if options['older_than_days'] < 1:
+            raise CommandError("--older-than-days должен быть не меньше 1")
+
+        def report(result):
+            if options['verbosity'] > 1:
+                self.stdout.write(f"Порция {result.batches}: всего перенесено {result.archived}")
+
+        result = archive_talons(
+            options['older_than_days'],
+            batch_size=options['batch_size'],
+            pause=options['pause'],
+            max_batches=options['max_batches'],
+            on_batch=report,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Талонов раньше {result.cutoff.isoformat()} перенесено в архив: {result.archived} "
+            f"({result.batches} порций) за {result.seconds:.2f} с"
+        ))
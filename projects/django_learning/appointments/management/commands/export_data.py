@@ -0,0 +1,60 @@
+# appointments/management/commands/export_data.py
+import sys
+from datetime import date
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from appointments.services.export_service import EXPORT_CHUNK_SIZE, EXPORT_FORMATS, EXPORTS, iter_export
+
+
+class Command(BaseCommand):
+    help = "Потоковая выгрузка талонов или графиков в CSV/NDJSON, опционально в gzip"
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=list(EXPORTS))
+        parser.add_argument('--format', choices=EXPORT_FORMATS, default='csv')
+        parser.add_argument('--output', default='-', help="Путь к файлу или - для stdout")
+        parser.add_argument('--date-from', type=date.fromisoformat, help="YYYY-MM-DD")
+        parser.add_argument('--date-to', type=date.fromisoformat, help="YYYY-MM-DD")
+        parser.add_argument('--clinic-id', type=int)
+        parser.add_argument('--gzip', action='store_true')
+        parser.add_argument('--include-archived', action='store_true',
+                            help="Добавить талоны из архива")
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        started = perf_counter()
+        chunks = iter_export(
+            options['kind'],
+            options['format'],
+            options['gzip'],
+            date_from=options['date_from'],
+            date_to=options['date_to'],
+            clinic_id=options['clinic_id'],
+            chunk_size=options['chunk_size'],
+            include_archived=options['include_archived'],
+        )
+
+        written = 0
+        try:
+            if options['output'] == '-':
+                output = sys.stdout.buffer if options['gzip'] else sys.stdout
+                for chunk in chunks:
+                    written += len(chunk)
+                    output.write(chunk)
+                output.flush()
+            else:
+                mode, encoding = ('wb', None) if options['gzip'] else ('w', 'utf-8')
+                with open(options['output'], mode, encoding=encoding, newline='' if encoding else None) as output:
+                    for chunk in chunks:
+                        written += len(chunk)
+                        output.write(chunk)
+        except OSError as e:
+            raise CommandError(f"Не удалось записать выгрузку: {e}")
+
+        # Итог в stderr, чтобы не смешивать с данными при выводе в stdout
+        self.stderr.write(
+            f"Выгрузка {options['kind']}: {written} {'байт' if options['gzip'] else 'символов'} "
+            f"за {perf_counter() - started:.2f} с"
+        )
@@ -0,0 +1,145 @@
+# appointments/management/commands/generate_fake_data.py
+import random
+from datetime import date, time, timedelta
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from appointments.models import Clinic, Doctor, Schedule, Talon
+from appointments.services.availability_cache import invalidate_day
+from appointments.services.cache_versions import bump_version_on_commit
+from appointments.services.page_cache import clinic_scope, doctors_scope, invalidate_doctor_pages
+from appointments.services.schedule_service import generate_talons_for_schedules
+from appointments.services.stats_service import rebuild_stats
+
+LAST_NAMES = ['Иванов', 'Петров', 'Сидоров', 'Смирнов', 'Кузнецов', 'Попов', 'Васильев', 'Соколов', 'Михайлов', 'Новиков']
+FIRST_NAMES = ['Иван', 'Петр', 'Алексей', 'Дмитрий', 'Сергей', 'Андрей', 'Михаил', 'Николай', 'Павел', 'Олег']
+PATRONYMICS = ['Иванович', 'Петрович', 'Алексеевич', 'Дмитриевич', 'Сергеевич', 'Андреевич', 'Михайлович']
+DURATIONS = [10, 15, 20, 30]
+
+# Порция строк для bulk_create и UPDATE
+BATCH_SIZE = 2000
+
+
+class Command(BaseCommand):
+    help = "Создает синтетические клиники, врачей, графики и талоны для нагрузочных замеров"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clinics', type=int, default=3)
+        parser.add_argument('--doctors', type=int, default=30, help="Всего врачей, распределяются по клиникам")
+        parser.add_argument('--days', type=int, default=365)
+        parser.add_argument('--start-date', type=date.fromisoformat, default=None, help="YYYY-MM-DD, по умолчанию сегодня")
+        parser.add_argument('--booking-density', type=float, default=0.3, help="Доля занятых талонов, 0..1")
+        parser.add_argument('--weekends', action='store_true', help="Создавать графики и в выходные")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if options['clinics'] < 1:
+            raise CommandError("--clinics должно быть не меньше 1")
+        if options['doctors'] < 0 or options['days'] < 0:
+            raise CommandError("--doctors и --days не могут быть отрицательными")
+        if not 0 <= options['booking_density'] <= 1:
+            raise CommandError("--booking-density должно быть от 0 до 1")
+
+        rng = random.Random(options['seed'])
+        start_date = options['start_date'] or date.today()
+        started = perf_counter()
+
+        clinics = Clinic.objects.bulk_create([
+            Clinic(name=f"Клиника №{number}") for number in range(1, options['clinics'] + 1)
+        ])
+
+        doctors = []
+        for number in range(options['doctors']):
+            last_name, first_name, patronymic = (
+                rng.choice(LAST_NAMES), rng.choice(FIRST_NAMES), rng.choice(PATRONYMICS)
+            )
+            doctors.append(Doctor(
+                clinic=clinics[number % len(clinics)],
+                last_name=last_name,
+                first_name=first_name,
+                patronymic=patronymic,
+                full_name=f"{last_name} {first_name} {patronymic}",
+                duration=rng.choice(DURATIONS),
+            ))
+        doctors = Doctor.objects.bulk_create(doctors)
+
+        days = [
+            start_date + timedelta(days=offset)
+            for offset in range(options['days'])
+            if options['weekends'] or (start_date + timedelta(days=offset)).weekday() < 5
+        ]
+        schedules = (
+            Schedule(
+                clinic_id=doctor.clinic_id,
+                doctor=doctor,
+                date=day,
+                start_time=time(rng.choice((8, 9))),
+                end_time=time(rng.choice((17, 18, 20))),
+                start_break_time=time(13),
+                end_break_time=time(14),
+            )
+            for doctor in doctors
+            for day in days
+        )
+        schedule_count = 0
+        batch = []
+        for schedule in schedules:
+            batch.append(schedule)
+            if len(batch) == BATCH_SIZE:
+                Schedule.objects.bulk_create(batch)
+                schedule_count += len(batch)
+                batch = []
+        if batch:
+            Schedule.objects.bulk_create(batch)
+            schedule_count += len(batch)
+
+        talons_created = sum(
+            generate_talons_for_schedules(clinic_id=clinic.id).talons_created
+            for clinic in clinics
+        )
+
+        booked_days = self._book_random_talons(
+            [doctor.id for doctor in doctors], options['booking_density'], rng
+        )
+        booked = sum(booked_days.values())
+        # Бронирование выше - массовые UPDATE мимо сервиса, статистику считаем заново
+        for clinic in clinics:
+            rebuild_stats(clinic_id=clinic.id)
+
+        # bulk_create и update не шлют сигналов - сбрасываем кэш сами
+        bump_version_on_commit(doctors_scope())
+        for clinic in clinics:
+            bump_version_on_commit(clinic_scope(clinic.id))
+        for doctor in doctors:
+            invalidate_doctor_pages(doctor.id)
+        for doctor_id, day in booked_days:
+            invalidate_day(doctor_id, day)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Клиник: {len(clinics)}, врачей: {len(doctors)}, графиков: {schedule_count}, "
+            f"талонов: {talons_created}, занято: {booked} "
+            f"за {perf_counter() - started:.1f} с"
+        ))
+
+    def _book_random_talons(self, doctor_ids: list[int], density: float,
+                            rng: random.Random) -> dict[tuple[int, date], int]:
+        """Помечает занятой случайную долю талонов каждого врача; число занятых по врачо-дням"""
+        booked = {}
+        if density <= 0:
+            return booked
+
+        for doctor_id in doctor_ids:
+            talons = [
+                (talon_id, day)
+                for talon_id, day in Talon.objects.filter(doctor_id=doctor_id).values_list('id', 'date')
+                if rng.random() < density
+            ]
+            for offset in range(0, len(talons), BATCH_SIZE):
+                batch = talons[offset:offset + BATCH_SIZE]
+                with transaction.atomic():
+                    Talon.objects.filter(id__in=[talon_id for talon_id, _ in batch]).update(is_free=False)
+                for _, day in batch:
+                    booked[(doctor_id, day)] = booked.get((doctor_id, day), 0) + 1
+        return booked
@@ -0,0 +1,85 @@
+# appointments/management/commands/import_schedules.py
+import sys
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from appointments.services.schedule_import import (
+    IMPORT_BATCH_SIZE,
+    ScheduleRowError,
+    import_schedules,
+    iter_rows,
+)
+from appointments.models import Schedule
+from appointments.services.schedule_service import (
+    GENERATION_POOLS,
+    BatchGenerationResult,
+    generate_talons_for_schedules,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Потоковый импорт графиков из CSV или NDJSON. Поля: doctor_id или doctor (ФИО), "
+        "clinic_id или clinic (название, по умолчанию клиника врача), date, start_time, "
+        "end_time, start_break_time, end_break_time"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Путь к файлу или - для stdin")
+        parser.add_argument('--format', choices=['csv', 'ndjson'], default=None,
+                            help="По умолчанию - по расширению файла")
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+        parser.add_argument('--skip-invalid', action='store_true',
+                            help="Пропускать неверные строки вместо остановки импорта")
+        parser.add_argument('--generate-talons', action='store_true',
+                            help="Генерировать талоны по созданным графикам после записи каждой порции")
+        parser.add_argument('--pool', choices=GENERATION_POOLS, default='serial',
+                            help="Где нарезать слоты при --generate-talons")
+        parser.add_argument('--workers', type=int, default=4, help="Размер пула для --pool processes|threads")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format']
+        if file_format is None:
+            if path == '-':
+                raise CommandError("Для stdin укажите --format")
+            file_format = 'ndjson' if Path(path).suffix.lower() in ('.ndjson', '.jsonl') else 'csv'
+
+        generation = BatchGenerationResult()
+
+        def generate_talons(schedules: list[Schedule]) -> None:
+            # Только графики этой порции, а не все графики клиник за период файла
+            batch = generate_talons_for_schedules(
+                schedule_ids=[schedule.id for schedule in schedules],
+                workers=options['workers'],
+                pool=options['pool'],
+            )
+            generation.schedules += batch.schedules
+            generation.doctor_days += batch.doctor_days
+            generation.talons_created += batch.talons_created
+            generation.seconds += batch.seconds
+
+        on_batch = generate_talons if options['generate_talons'] else None
+        try:
+            if path == '-':
+                result = import_schedules(
+                    iter_rows(sys.stdin, file_format), options['batch_size'], options['skip_invalid'], on_batch
+                )
+            else:
+                with open(path, newline='', encoding='utf-8') as file:
+                    result = import_schedules(
+                        iter_rows(file, file_format), options['batch_size'], options['skip_invalid'], on_batch
+                    )
+        except (OSError, ScheduleRowError) as e:
+            raise CommandError(f"Импорт остановлен: {e}. Строки до этой уже записаны")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Строк: {result.rows}, создано графиков: {result.created}, пропущено: {result.skipped} "
+            f"за {result.seconds:.2f} с ({result.rows_per_second:.0f} строк/с)"
+        ))
+        if options['generate_talons']:
+            self.stdout.write(
+                f"Создано талонов: {generation.talons_created} "
+                f"за {generation.seconds:.2f} с ({generation.talons_per_second:.0f} талонов/с)"
+            )
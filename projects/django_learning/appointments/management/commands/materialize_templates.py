@@ -0,0 +1,35 @@
+# appointments/management/commands/materialize_templates.py
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from appointments.services.template_service import materialize_templates
+
+
+class Command(BaseCommand):
+    help = "Создает талоны по недельным шаблонам на период (обычно слоты шаблонов остаются виртуальными)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date-from', type=date.fromisoformat, required=True, help="YYYY-MM-DD")
+        parser.add_argument('--date-to', type=date.fromisoformat, required=True, help="YYYY-MM-DD")
+        parser.add_argument('--clinic-id', type=int)
+        parser.add_argument('--doctor-id', type=int)
+        parser.add_argument('--chunk-size', type=int, default=100,
+                            help="Сколько врачо-дней записывать в одной транзакции")
+
+    def handle(self, *args, **options):
+        if options['date_to'] < options['date_from']:
+            raise CommandError("--date-to раньше --date-from")
+
+        result = materialize_templates(
+            options['date_from'],
+            options['date_to'],
+            clinic_id=options['clinic_id'],
+            doctor_id=options['doctor_id'],
+            chunk_size=options['chunk_size'],
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Врачо-дней: {result.doctor_days}, "
+            f"создано талонов: {result.talons_created} за {result.seconds:.2f} с"
+        ))
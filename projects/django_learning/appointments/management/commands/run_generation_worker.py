@@ -0,0 +1,58 @@
+# appointments/management/commands/run_generation_worker.py
+from time import perf_counter, sleep
+
+from django.core.management.base import BaseCommand
+
+from appointments.services.job_service import (
+    JOB_BATCH_SIZE,
+    JOB_HEARTBEAT_SECONDS,
+    JOB_STALE_SECONDS,
+    claim_jobs,
+    default_worker_id,
+    release_jobs,
+    requeue_stale_jobs,
+    run_jobs,
+)
+
+
+class Command(BaseCommand):
+    help = "Воркер очереди генерации талонов: забирает задачи из БД порциями и выполняет их"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=JOB_BATCH_SIZE)
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help="Пауза между опросами пустой очереди, секунд")
+        parser.add_argument('--stale-after', type=int, default=JOB_STALE_SECONDS,
+                            help="Через сколько секунд без heartbeat вернуть задачу в очередь")
+        parser.add_argument('--heartbeat-interval', type=float, default=JOB_HEARTBEAT_SECONDS,
+                            help="Как часто продлевать выполняемые задачи, секунд")
+        parser.add_argument('--worker-id', default=None)
+        parser.add_argument('--once', action='store_true',
+                            help="Выполнить задачи, которые есть в очереди, и выйти")
+
+    def handle(self, *args, **options):
+        worker_id = options['worker_id'] or default_worker_id()
+        self.stdout.write(f"Воркер {worker_id} запущен")
+
+        try:
+            while True:
+                requeued = requeue_stale_jobs(options['stale_after'])
+                if requeued:
+                    self.stdout.write(f"Возвращено в очередь зависших задач: {requeued}")
+
+                jobs = claim_jobs(worker_id, options['batch_size'])
+                if not jobs:
+                    if options['once']:
+                        break
+                    sleep(options['poll_interval'])
+                    continue
+
+                started = perf_counter()
+                done, failed = run_jobs(jobs, worker_id, options['heartbeat_interval'])
+                self.stdout.write(
+                    f"Задач: {len(jobs)}, готово: {done}, ошибок: {failed} "
+                    f"за {perf_counter() - started:.2f} с"
+                )
+        except KeyboardInterrupt:
+            released = release_jobs(worker_id)
+            self.stdout.write(f"Воркер остановлен, возвращено в очередь задач: {released}")
@@ -0,0 +1,173 @@
+# appointments/middleware.py
+import logging
+import re
+from collections import Counter, defaultdict, deque
+from contextvars import ContextVar
+from threading import Lock
+from time import perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger('appointments.perf')
+
+# Сколько одинаковых по форме запросов за запрос считаем признаком N+1
+N_PLUS_ONE_THRESHOLD = getattr(settings, 'PERF_N_PLUS_ONE_THRESHOLD', 5)
+# Сколько последних запросов на каждый URL хранить для перцентилей
+PERF_WINDOW = getattr(settings, 'PERF_WINDOW', 500)
+
+# Списки параметров IN (%s, %s, ...) сворачиваем, чтобы форма не зависела от их длины
+_IN_LIST = re.compile(r'\(\s*%s(?:\s*,\s*%s)*\s*\)')
+
+_history = defaultdict(lambda: deque(maxlen=PERF_WINDOW))
+_history_lock = Lock()
+
+
+def query_shape(sql: str) -> str:
+    """Форма запроса: SQL с плейсхолдерами, списки IN свернуты"""
+    return _IN_LIST.sub('(...)', sql)
+
+
+class QueryRecorder:
+    """Счетчик запросов, времени БД и форм запросов одного HTTP-запроса"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.shapes = Counter()
+
+    def record(self, sql: str, seconds: float) -> None:
+        self.seconds += seconds
+        self.count += 1
+        self.shapes[query_shape(sql)] += 1
+
+    def repeated_shapes(self, threshold: int = N_PLUS_ONE_THRESHOLD) -> list[tuple[str, int]]:
+        return [(shape, count) for shape, count in self.shapes.most_common() if count >= threshold]
+
+
+# Счетчик текущего запроса. Контекст копируется в потоки sync_to_async,
+# поэтому запросы async-представлений из пула потоков попадают в тот же счетчик
+_current_recorder: ContextVar = ContextVar('perf_recorder', default=None)
+
+
+def _record_query(execute, sql, params, many, context):
+    """Постоянная обертка execute каждого соединения; пишет в счетчик текущего запроса"""
+    recorder = _current_recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    started = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        recorder.record(sql, perf_counter() - started)
+
+
+def _install_wrapper(connection) -> None:
+    # execute_wrapper() действует только в своем потоке и блоке with,
+    # поэтому обертка ставится на каждое соединение один раз и навсегда
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+@receiver(connection_created)
+def _on_connection_created(sender, connection, **kwargs):
+    _install_wrapper(connection)
+
+
+class PerformanceMiddleware:
+    """
+    Замеряет каждый запрос: число SQL-запросов, время в БД, время вне БД
+    (view, рендер шаблона и прочие middleware) и повторяющиеся формы
+    запросов - вероятный N+1. Работает и в WSGI, и в ASGI без перевода
+    цепочки в поток. Итоги отдаются заголовками X-DB-* (если включен
+    PERF_HEADERS) и копятся по имени URL для /debug/perf/
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _start(self):
+        # Соединения, открытые до загрузки middleware, сигнала уже не получат
+        for connection in connections.all(initialized_only=True):
+            _install_wrapper(connection)
+        recorder = QueryRecorder()
+        return recorder, _current_recorder.set(recorder)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        recorder, token = self._start()
+        started = perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_recorder.reset(token)
+        return self._finish(request, response, recorder, perf_counter() - started)
+
+    async def __acall__(self, request):
+        recorder, token = self._start()
+        started = perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_recorder.reset(token)
+        return self._finish(request, response, recorder, perf_counter() - started)
+
+    def _finish(self, request, response, recorder: QueryRecorder, total_seconds: float):
+        repeated = recorder.repeated_shapes()
+        url_name = request.resolver_match.url_name if request.resolver_match else None
+
+        if repeated:
+            logger.warning(
+                "Возможный N+1 в %s (%s): %s",
+                request.path, url_name,
+                '; '.join(f"{count}x {shape[:200]}" for shape, count in repeated)
+            )
+
+        if url_name:
+            with _history_lock:
+                _history[url_name].append((total_seconds, recorder.count, recorder.seconds, bool(repeated)))
+
+        if getattr(settings, 'PERF_HEADERS', settings.DEBUG):
+            response['X-DB-Query-Count'] = str(recorder.count)
+            response['X-DB-Time-Ms'] = f"{recorder.seconds * 1000:.2f}"
+            # Не чистое время рендера: все время запроса за вычетом ожидания БД
+            response['X-Non-DB-Time-Ms'] = f"{(total_seconds - recorder.seconds) * 1000:.2f}"
+            response['X-Total-Time-Ms'] = f"{total_seconds * 1000:.2f}"
+            if repeated:
+                response['X-N-Plus-One'] = str(len(repeated))
+
+        return response
+
+
+def _percentile(values: list[float], fraction: float) -> float:
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def get_perf_stats() -> dict:
+    """Скользящие перцентили времени и среднее число запросов по именам URL"""
+    with _history_lock:
+        history = {url_name: list(samples) for url_name, samples in _history.items()}
+
+    stats = {}
+    for url_name, samples in sorted(history.items()):
+        total_ms = sorted(sample[0] * 1000 for sample in samples)
+        stats[url_name] = {
+            'requests': len(samples),
+            'p50_ms': _percentile(total_ms, 0.50),
+            'p95_ms': _percentile(total_ms, 0.95),
+            'p99_ms': _percentile(total_ms, 0.99),
+            'avg_queries': sum(sample[1] for sample in samples) / len(samples),
+            'avg_db_ms': sum(sample[2] for sample in samples) * 1000 / len(samples),
+            'n_plus_one_requests': sum(1 for sample in samples if sample[3]),
+        }
+    return stats
@@ -0,0 +1,43 @@
+# Generated by Django 6.0 on 2026-10-17 19:03
+
+from django.db import migrations, models
+
+
+def remove_duplicate_talons(apps, schema_editor):
+    """Перед уникальным ограничением оставляем по одному талону на слот, занятые в приоритете"""
+    Talon = apps.get_model('appointments', 'Talon')
+
+    seen = set()
+    duplicate_ids = []
+    for talon_id, key in (
+            (row[0], row[1:])
+            for row in Talon.objects.order_by(
+                'doctor_id', 'date', 'start_time', 'end_time', 'is_free', 'id'
+            ).values_list('id', 'doctor_id', 'date', 'start_time', 'end_time').iterator()
+    ):
+        if key in seen:
+            duplicate_ids.append(talon_id)
+        else:
+            seen.add(key)
+
+    for offset in range(0, len(duplicate_ids), 500):
+        Talon.objects.filter(id__in=duplicate_ids[offset:offset + 500]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0002_talon_is_free'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_talons, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='talon',
+            index=models.Index(fields=['doctor', 'date', 'is_free', 'start_time'], name='talon_doctor_day_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='talon',
+            constraint=models.UniqueConstraint(fields=('doctor', 'date', 'start_time', 'end_time'), name='unique_talon_slot'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 6.0 on 2026-10-17 19:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0003_talon_unique_slot'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='talon',
+            index=models.Index(fields=['date', 'start_time', 'id'], name='talon_date_start_idx'),
+        ),
+    ]
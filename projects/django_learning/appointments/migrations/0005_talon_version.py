@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-17 21:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0004_talon_date_start_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='talon',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
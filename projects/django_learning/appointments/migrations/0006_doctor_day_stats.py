@@ -0,0 +1,55 @@
+# Generated by Django 6.0 on 2026-10-17 19:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def fill_doctor_day_stats(apps, schema_editor):
+    """Считаем статистику по уже существующим талонам"""
+    Talon = apps.get_model('appointments', 'Talon')
+    DoctorDayStats = apps.get_model('appointments', 'DoctorDayStats')
+
+    rows = Talon.objects.values('doctor_id', 'date').annotate(
+        total_count=Count('id'),
+        free_count=Count('id', filter=Q(is_free=True)),
+    ).order_by().iterator()
+    batch = []
+    for row in rows:
+        batch.append(DoctorDayStats(
+            doctor_id=row['doctor_id'],
+            date=row['date'],
+            free=row['free_count'],
+            booked=row['total_count'] - row['free_count'],
+            total=row['total_count'],
+        ))
+        if len(batch) == 1000:
+            DoctorDayStats.objects.bulk_create(batch)
+            batch = []
+    DoctorDayStats.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0005_talon_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DoctorDayStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('free', models.IntegerField(default=0)),
+                ('booked', models.IntegerField(default=0)),
+                ('total', models.IntegerField(default=0)),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='appointments.doctor')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['date'], name='doctor_day_stats_date_idx')],
+                'constraints': [models.UniqueConstraint(fields=('doctor', 'date'), name='unique_doctor_day_stats')],
+            },
+        ),
+        migrations.RunPython(fill_doctor_day_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 6.0 on 2026-10-17 19:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0006_doctor_day_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WeeklyTemplate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weekday', models.PositiveSmallIntegerField(choices=[(0, 'Понедельник'), (1, 'Вторник'), (2, 'Среда'), (3, 'Четверг'), (4, 'Пятница'), (5, 'Суббота'), (6, 'Воскресенье')])),
+                ('start_time', models.TimeField()),
+                ('end_time', models.TimeField()),
+                ('start_break_time', models.TimeField()),
+                ('end_break_time', models.TimeField()),
+                ('valid_from', models.DateField()),
+                ('valid_to', models.DateField(blank=True, null=True)),
+                ('clinic', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='appointments.clinic')),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='appointments.doctor')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['doctor', 'weekday'], name='weekly_template_doctor_idx')],
+            },
+        ),
+    ]
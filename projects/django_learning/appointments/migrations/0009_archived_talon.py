@@ -0,0 +1,30 @@
+# Generated by Django 6.0 on 2026-10-17 20:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0008_talon_generation_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedTalon',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('start_time', models.TimeField()),
+                ('end_time', models.TimeField()),
+                ('date', models.DateField()),
+                ('is_free', models.BooleanField()),
+                ('version', models.PositiveIntegerField(default=0)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='appointments.doctor')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['doctor', 'date', 'start_time'], name='archived_talon_doctor_day_idx'), models.Index(fields=['date', 'start_time', 'id'], name='archived_talon_date_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0009_archived_talon'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='weeklytemplate',
+            constraint=models.CheckConstraint(condition=models.Q(('start_time__lt', models.F('end_time'))), name='weekly_template_hours'),
+        ),
+        migrations.AddConstraint(
+            model_name='weeklytemplate',
+            constraint=models.CheckConstraint(condition=models.Q(('end_break_time__gte', models.F('start_break_time')), ('end_time__gte', models.F('end_break_time')), ('start_break_time__gte', models.F('start_time'))), name='weekly_template_break_inside_hours'),
+        ),
+    ]
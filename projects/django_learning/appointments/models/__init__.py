@@ -2,5 +2,9 @@ from .clinic import Clinic
 from .doctor import Doctor
 from .schedule import Schedule
 from .talon import Talon
+from .doctor_day_stats import DoctorDayStats
+from .weekly_template import WeeklyTemplate
+from .talon_generation_job import TalonGenerationJob
+from .archived_talon import ArchivedTalon
 
-__all__ = [Clinic, Doctor, Schedule, Talon]
\ No newline at end of file
+__all__ = [Clinic, Doctor, Schedule, Talon, DoctorDayStats, WeeklyTemplate, TalonGenerationJob, ArchivedTalon]
\ No newline at end of file
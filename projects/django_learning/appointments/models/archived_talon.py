@@ -0,0 +1,33 @@
+from django.db import models
+
+from appointments.models.doctor import Doctor
+
+
+class ArchivedTalon(models.Model):
+    """
+    Прошедший талон, перенесенный из Talon командой archive_talons.
+    id совпадает с id исходного талона
+    """
+    id = models.BigIntegerField(primary_key=True)
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE)
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    date = models.DateField()
+    is_free = models.BooleanField()
+    version = models.PositiveIntegerField(default=0)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['doctor', 'date', 'start_time'],
+                name='archived_talon_doctor_day_idx',
+            ),
+            models.Index(
+                fields=['date', 'start_time', 'id'],
+                name='archived_talon_date_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"ArchivedTalon id: {self.id}, Doctor id: {self.doctor_id} Date: {self.date} Start time: {self.start_time} - End time: {self.end_time}"
@@ -0,0 +1,30 @@
+from django.db import models
+
+from appointments.models.doctor import Doctor
+
+
+class DoctorDayStats(models.Model):
+    """Счетчики талонов врача за день, обновляются вместе с талонами"""
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE)
+    date = models.DateField()
+    free = models.IntegerField(default=0)
+    booked = models.IntegerField(default=0)
+    total = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['doctor', 'date'],
+                name='unique_doctor_day_stats',
+            ),
+        ]
+        indexes = [
+            # Дашборды клиники читают все дни периода
+            models.Index(
+                fields=['date'],
+                name='doctor_day_stats_date_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"Stats Doctor id: {self.doctor_id} Date: {self.date} Free: {self.free} Booked: {self.booked} Total: {self.total}"
@@ -1,9 +1,18 @@
+from django.core.exceptions import ValidationError
 from django.db import models
 
 from appointments.models.clinic import Clinic
 from appointments.models.doctor import Doctor
 
 
+def validate_working_hours(start_time, end_time, start_break_time, end_break_time) -> None:
+    """Часы приема упорядочены, перерыв внутри них (общая проверка графика и шаблона)"""
+    if start_time >= end_time:
+        raise ValidationError("Начало приема должно быть раньше конца")
+    if not start_time <= start_break_time <= end_break_time <= end_time:
+        raise ValidationError("Перерыв должен быть внутри рабочего времени")
+
+
 class Schedule(models.Model):
     clinic = models.ForeignKey(Clinic, on_delete=models.CASCADE)
     doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE)
@@ -13,5 +22,11 @@ class Schedule(models.Model):
     end_break_time = models.TimeField()
     date = models.DateField()
 
+    def clean(self):
+        super().clean()
+        times = (self.start_time, self.end_time, self.start_break_time, self.end_break_time)
+        if None not in times:
+            validate_working_hours(*times)
+
     def __str__(self):
         return f"Schedule id: {self.id} Doctor id:: {self.doctor_id} Date: {self.date} Start time: {self.start_time} - End time: {self.end_time}"
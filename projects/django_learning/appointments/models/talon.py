@@ -9,6 +9,27 @@ class Talon(models.Model):
     end_time = models.TimeField()
     date = models.DateField()
     is_free = models.BooleanField(default=True)
+    # Увеличивается при каждом изменении состояния - для оптимистичных обновлений
+    version = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['doctor', 'date', 'start_time', 'end_time'],
+                name='unique_talon_slot',
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['doctor', 'date', 'is_free', 'start_time'],
+                name='talon_doctor_day_idx',
+            ),
+            # Ключ сортировки keyset-пагинации списков талонов
+            models.Index(
+                fields=['date', 'start_time', 'id'],
+                name='talon_date_start_idx',
+            ),
+        ]
 
     def __str__(self):
         return f"Talon id: {self.id}, Doctor id: {self.doctor_id} Date: {self.date} Start time: {self.start_time} - End time: {self.end_time}"
@@ -0,0 +1,41 @@
+from django.db import models
+
+from appointments.models.schedule import Schedule
+
+
+class TalonGenerationJob(models.Model):
+    """Задача фоновой генерации талонов по графику, очередь в БД без брокера"""
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'В очереди'),
+        (STATUS_RUNNING, 'Выполняется'),
+        (STATUS_DONE, 'Готово'),
+        (STATUS_FAILED, 'Ошибка'),
+    ]
+
+    schedule = models.ForeignKey(Schedule, on_delete=models.CASCADE)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # Воркер, взявший задачу, и время его последнего сигнала жизни
+    worker = models.CharField(max_length=100, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    talons_created = models.IntegerField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Выборка очереди воркером и поиск зависших задач
+            models.Index(
+                fields=['status', 'id'],
+                name='generation_job_status_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"TalonGenerationJob id: {self.id} Schedule id: {self.schedule_id} Status: {self.status}"
@@ -0,0 +1,64 @@
+from django.db import models
+
+from appointments.models.clinic import Clinic
+from appointments.models.doctor import Doctor
+from appointments.models.schedule import validate_working_hours
+
+
+class WeeklyTemplate(models.Model):
+    """
+    Повторяющийся график врача на день недели. Талоны по шаблону не создаются
+    заранее: свободные слоты вычисляются на лету, а в Talon попадают при бронировании
+    """
+    WEEKDAY_CHOICES = [
+        (0, 'Понедельник'),
+        (1, 'Вторник'),
+        (2, 'Среда'),
+        (3, 'Четверг'),
+        (4, 'Пятница'),
+        (5, 'Суббота'),
+        (6, 'Воскресенье'),
+    ]
+
+    clinic = models.ForeignKey(Clinic, on_delete=models.CASCADE)
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE)
+    weekday = models.PositiveSmallIntegerField(choices=WEEKDAY_CHOICES)
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    start_break_time = models.TimeField()
+    end_break_time = models.TimeField()
+    valid_from = models.DateField()
+    # Пусто - шаблон действует бессрочно
+    valid_to = models.DateField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.CheckConstraint(
+                condition=models.Q(start_time__lt=models.F('end_time')),
+                name='weekly_template_hours',
+            ),
+            # Перевернутый перерыв зациклил бы нарезку слотов (DayGrid.from_schedule)
+            models.CheckConstraint(
+                condition=models.Q(
+                    start_break_time__gte=models.F('start_time'),
+                    end_break_time__gte=models.F('start_break_time'),
+                    end_time__gte=models.F('end_break_time'),
+                ),
+                name='weekly_template_break_inside_hours',
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['doctor', 'weekday'],
+                name='weekly_template_doctor_idx',
+            ),
+        ]
+
+    def clean(self):
+        super().clean()
+        times = (self.start_time, self.end_time, self.start_break_time, self.end_break_time)
+        if None not in times:
+            validate_working_hours(*times)
+
+    def __str__(self):
+        return f"WeeklyTemplate id: {self.id} Doctor id: {self.doctor_id} Weekday: {self.weekday} Start time: {self.start_time} - End time: {self.end_time}"
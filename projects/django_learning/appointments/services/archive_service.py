@@ -0,0 +1,109 @@
+# appointments/services/archive_service.py
+"""
+Перенос прошедших талонов из Talon в холодную таблицу ArchivedTalon.
+
+Талоны переносятся порциями, каждая в своей короткой транзакции
+(DELETE ... RETURNING из Talon и INSERT в архив), поэтому блокировки держатся
+только на время одной порции, а горячая таблица и ее индексы не растут
+"""
+from dataclasses import dataclass
+from datetime import date, timedelta
+from time import perf_counter, sleep
+from typing import Callable, Optional
+
+from django.db import connections, router, transaction
+
+from ..models import ArchivedTalon, Talon
+from .availability_cache import invalidate_day
+from .page_cache import invalidate_doctor_pages
+
+# Порция талонов на одну транзакцию
+ARCHIVE_BATCH_SIZE = 1000
+
+ARCHIVE_FIELDS = ('id', 'doctor_id', 'date', 'start_time', 'end_time', 'is_free', 'version')
+
+
+@dataclass
+class ArchiveResult:
+    """Итог архивации"""
+    cutoff: date
+    archived: int = 0
+    batches: int = 0
+    seconds: float = 0.0
+
+
+def archive_cutoff(older_than_days: int, today: Optional[date] = None) -> date:
+    """Талоны с датой раньше этой считаются прошедшими"""
+    return (today or date.today()) - timedelta(days=older_than_days)
+
+
+def _delete_batch(cutoff: date, batch_size: int) -> list[Talon]:
+    """
+    DELETE ... WHERE id IN (первые batch_size талонов раньше cutoff) RETURNING:
+    удаленные строки возвращаются тем же запросом, поэтому в архив попадает
+    именно то состояние, которое было удалено, даже если талон успели
+    забронировать после выбора порции. Без сигналов на каждый талон -
+    кэши сбрасываем сами, как после bulk_create
+    """
+    alias = router.db_for_write(Talon)
+    quote = connections[alias].ops.quote_name
+    table = quote(Talon._meta.db_table)
+    pk, talon_date, start_time = (
+        quote(Talon._meta.get_field(name).column) for name in ('id', 'date', 'start_time')
+    )
+    columns = ', '.join(quote(Talon._meta.get_field(name).column) for name in ARCHIVE_FIELDS)
+    sql = (
+        f"DELETE FROM {table} WHERE {pk} IN ("
+        f"SELECT {pk} FROM {table} WHERE {talon_date} < %s ORDER BY {talon_date}, {start_time}, {pk} LIMIT %s"
+        f") RETURNING {columns}"
+    )
+    return list(Talon.objects.db_manager(alias).raw(sql, [cutoff, batch_size]))
+
+
+def archive_batch(cutoff: date, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """Переносит в архив одну порцию талонов раньше cutoff, возвращает их число"""
+    with transaction.atomic():
+        talons = _delete_batch(cutoff, batch_size)
+        if not talons:
+            return 0
+
+        # Без ignore_conflicts: если талон уже есть в архиве, IntegrityError
+        # откатит и DELETE, иначе удаленная строка пропала бы без следа
+        ArchivedTalon.objects.bulk_create(
+            [ArchivedTalon(**{name: getattr(talon, name) for name in ARCHIVE_FIELDS}) for talon in talons]
+        )
+
+        for doctor_id, talon_date in {(talon.doctor_id, talon.date) for talon in talons}:
+            invalidate_day(doctor_id, talon_date)
+        for doctor_id in {talon.doctor_id for talon in talons}:
+            invalidate_doctor_pages(doctor_id)
+    return len(talons)
+
+
+def archive_talons(
+        older_than_days: int,
+        batch_size: int = ARCHIVE_BATCH_SIZE,
+        pause: float = 0.0,
+        max_batches: Optional[int] = None,
+        on_batch: Optional[Callable[[ArchiveResult], None]] = None,
+) -> ArchiveResult:
+    """
+    Переносит талоны старше older_than_days дней порциями, пока они есть.
+    pause - пауза между порциями, чтобы не мешать рабочей нагрузке
+    """
+    started = perf_counter()
+    result = ArchiveResult(cutoff=archive_cutoff(older_than_days))
+    while max_batches is None or result.batches < max_batches:
+        archived = archive_batch(result.cutoff, batch_size)
+        if not archived:
+            break
+        result.archived += archived
+        result.batches += 1
+        result.seconds = perf_counter() - started
+        if on_batch:
+            on_batch(result)
+        if pause:
+            sleep(pause)
+
+    result.seconds = perf_counter() - started
+    return result
@@ -0,0 +1,81 @@
+# appointments/services/availability_cache.py
+from datetime import date, time
+from threading import Lock
+
+from django.core.cache import cache
+
+from ..models import Talon
+from .cache_versions import bump_version_on_commit, get_version
+from .day_grid import DayGrid
+
+# Сколько хранить доступность врачо-дня в кэше, секунд
+AVAILABILITY_TIMEOUT = 60 * 10
+
+_stats = {'hits': 0, 'misses': 0}
+_stats_lock = Lock()
+
+
+def _count(name: str) -> None:
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def get_cache_stats() -> dict:
+    """Счетчики попаданий и промахов кэша доступности в этом процессе"""
+    with _stats_lock:
+        stats = dict(_stats)
+    total = stats['hits'] + stats['misses']
+    stats['hit_ratio'] = stats['hits'] / total if total else 0.0
+    return stats
+
+
+def reset_cache_stats() -> None:
+    with _stats_lock:
+        _stats['hits'] = 0
+        _stats['misses'] = 0
+
+
+def _scope(doctor_id: int, day: date) -> str:
+    return f"availability:{doctor_id}:{day.isoformat()}"
+
+
+def _data_key(doctor_id: int, day: date, version: int) -> str:
+    return f"availability:data:{doctor_id}:{day.isoformat()}:v{version}"
+
+
+def _load_day(doctor_id: int, day: date) -> DayGrid:
+    """Компактное представление дня: сетка талонов с битовой картой свободных"""
+    return DayGrid.from_talons(
+        Talon.objects.filter(
+            doctor_id=doctor_id,
+            date=day
+        ).values_list('id', 'start_time', 'end_time', 'is_free')
+    )
+
+
+def get_day_availability(doctor_id: int, day: date) -> DayGrid:
+    """
+    Свободные и занятые талоны врача на дату из кэша.
+    Ключ данных содержит версию врачо-дня: после бронирования версия
+    увеличивается, и прочитанные до этого данные больше не находятся
+    """
+    key = _data_key(doctor_id, day, get_version(_scope(doctor_id, day)))
+    availability = cache.get(key)
+    if availability is not None:
+        _count('hits')
+        return availability
+
+    _count('misses')
+    availability = _load_day(doctor_id, day)
+    cache.set(key, availability, AVAILABILITY_TIMEOUT)
+    return availability
+
+
+def get_free_talons(doctor_id: int, day: date) -> list[tuple[int, time, time]]:
+    """Свободные талоны врача на дату: (id, start_time, end_time)"""
+    return list(get_day_availability(doctor_id, day).free_slots())
+
+
+def invalidate_day(doctor_id: int, day: date) -> None:
+    """Сбрасывает доступность врачо-дня сразу и после коммита транзакции"""
+    bump_version_on_commit(_scope(doctor_id, day))
@@ -0,0 +1,74 @@
+# appointments/services/cache_versions.py
+"""
+Версии для инвалидации кэша: версия входит в ключ закэшированных данных,
+и ее увеличение делает все старые записи недостижимыми без удаления
+"""
+from time import time_ns
+from typing import Iterable
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+# Бэкенды, у которых у каждого процесса свое хранилище
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def cache_is_shared() -> bool:
+    """
+    Видят ли все процессы одни и те же версии. С кэшем в памяти процесса
+    версия, увеличенная в одном процессе, не сбрасывает данные в других
+    """
+    backend = settings.CACHES.get('default', {}).get('BACKEND')
+    return backend not in PROCESS_LOCAL_CACHES or getattr(settings, 'CACHE_SINGLE_PROCESS', False)
+
+
+def _version_key(scope: str) -> str:
+    return f"version:{scope}"
+
+
+def _initial_version() -> int:
+    # Версия от текущего времени: если ключ версии вытеснят из кэша,
+    # новая версия не совпадет со старой и не оживит устаревшие данные
+    return time_ns() // 1000
+
+
+def get_version(scope: str) -> int:
+    key = _version_key(scope)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _initial_version(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def get_versions(scopes: Iterable[str]) -> dict[str, int]:
+    """Версии нескольких областей одним обращением к кэшу"""
+    scopes = list(dict.fromkeys(scopes))
+    found = cache.get_many([_version_key(scope) for scope in scopes])
+    return {
+        scope: found.get(_version_key(scope)) or get_version(scope)
+        for scope in scopes
+    }
+
+
+def bump_version(scope: str) -> None:
+    key = _version_key(scope)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Ключа версии нет - заводим новую, если параллельный читатель не успел раньше
+        if not cache.add(key, _initial_version(), timeout=None):
+            cache.incr(key)
+
+
+def bump_version_on_commit(scope: str) -> None:
+    """
+    Увеличивает версию сразу и еще раз после коммита транзакции:
+    читатель, успевший закэшировать данные до коммита, записал их под старой версией
+    """
+    bump_version(scope)
+    transaction.on_commit(lambda: bump_version(scope))
@@ -0,0 +1,195 @@
+# appointments/services/day_grid.py
+from array import array
+from datetime import date, time
+from typing import Iterable, Iterator, Optional
+
+from ..models import Talon
+from .interval_index import IntervalIndex
+
+MINUTES_IN_DAY = 24 * 60
+
+# Готовые объекты time для каждой минуты суток, чтобы не создавать их заново
+_MINUTE_TIMES = tuple(time(minute // 60, minute % 60) for minute in range(MINUTES_IN_DAY))
+
+
+def to_minutes(value: time) -> int:
+    """Время в минуты от начала суток (секунды отбрасываются)"""
+    return value.hour * 60 + value.minute
+
+
+def from_minutes(minutes: int) -> time:
+    return _MINUTE_TIMES[minutes]
+
+
+class DayGrid:
+    """
+    Слоты одного врачо-дня в компактном виде: начала и концы в минутах
+    от полуночи в array('H'), id талонов в array('q') (0 - талона еще нет)
+    и битовая карта свободных слотов. Слоты упорядочены по началу.
+    Объекты time создаются только при выдаче наружу
+    """
+
+    __slots__ = ('starts', 'ends', 'talon_ids', 'free')
+
+    def __init__(self, starts: Iterable[int] = (), ends: Iterable[int] = (),
+                 talon_ids: Optional[Iterable[int]] = None, free: Optional[bytearray] = None):
+        self.starts = array('H', starts)
+        self.ends = array('H', ends)
+        self.talon_ids = array('q', talon_ids) if talon_ids is not None else array('q', bytes(8 * len(self.starts)))
+        if free is None:
+            # По умолчанию все слоты свободны
+            free = bytearray(b'\xff' * ((len(self.starts) + 7) // 8))
+        self.free = free
+
+    @classmethod
+    def from_schedule(cls, start_time: time, end_time: time, start_break_time: time,
+                      end_break_time: time, duration_minutes: int) -> 'DayGrid':
+        """
+        Нарезает рабочий день на слоты по длительности приема с учетом перерыва.
+        Перевернутый перерыв или неположительная длительность - ValueError:
+        с ними цикл нарезки не продвигался бы вперед
+        """
+        start, end = to_minutes(start_time), to_minutes(end_time)
+        break_start, break_end = to_minutes(start_break_time), to_minutes(end_break_time)
+        if break_start > break_end:
+            raise ValueError(f"Конец перерыва {end_break_time:%H:%M} раньше начала {start_break_time:%H:%M}")
+        if duration_minutes <= 0:
+            raise ValueError(f"Длительность приема должна быть положительной, а не {duration_minutes}")
+
+        starts = array('H')
+        ends = array('H')
+        current = start
+        while current < end:
+            # Слот начинается в перерыве - перескакиваем на конец перерыва
+            if break_start <= current < break_end:
+                current = break_end
+                continue
+
+            slot_end = current + duration_minutes
+            # Слот выходит за конец рабочего дня
+            if slot_end > end:
+                break
+
+            # Конец слота попадает в перерыв - обрезаем до начала перерыва
+            if break_start < slot_end <= break_end:
+                slot_end = break_start
+                if slot_end <= current:
+                    current = break_end
+                    continue
+
+            # Слот начинается до перерыва, а заканчивается после - берем часть до перерыва
+            if current < break_start and slot_end > break_end:
+                starts.append(current)
+                ends.append(break_start)
+                current = break_end
+                continue
+
+            # Слот пересекается с перерывом - пропускаем перерыв
+            if current < break_end and slot_end > break_start:
+                current = break_end
+                continue
+
+            starts.append(current)
+            ends.append(slot_end)
+            current = slot_end
+
+        return cls(starts, ends)
+
+    @classmethod
+    def from_talons(cls, rows: Iterable[tuple[int, time, time, bool]]) -> 'DayGrid':
+        """Сетка по существующим талонам: строки (id, start_time, end_time, is_free)"""
+        rows = sorted(
+            (to_minutes(start_time), to_minutes(end_time), talon_id, is_free)
+            for talon_id, start_time, end_time, is_free in rows
+        )
+        grid = cls(
+            (row[0] for row in rows),
+            (row[1] for row in rows),
+            (row[2] for row in rows),
+            bytearray((len(rows) + 7) // 8),
+        )
+        for position, row in enumerate(rows):
+            if row[3]:
+                grid.set_free(position, True)
+        return grid
+
+    @classmethod
+    def union(cls, grids: Iterable['DayGrid']) -> 'DayGrid':
+        """Объединение слотов нескольких сеток без повторов"""
+        slots = sorted({slot for grid in grids for slot in zip(grid.starts, grid.ends)})
+        return cls((slot[0] for slot in slots), (slot[1] for slot in slots))
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def __getstate__(self):
+        return self.starts, self.ends, self.talon_ids, self.free
+
+    def __setstate__(self, state):
+        self.starts, self.ends, self.talon_ids, self.free = state
+
+    def is_free(self, position: int) -> bool:
+        return bool(self.free[position >> 3] & (1 << (position & 7)))
+
+    def set_free(self, position: int, value: bool) -> None:
+        if value:
+            self.free[position >> 3] |= 1 << (position & 7)
+        else:
+            self.free[position >> 3] &= ~(1 << (position & 7)) & 0xff
+
+    def interval_index(self, free: Optional[bool] = None) -> IntervalIndex:
+        """Индекс интервалов слотов: всех, только свободных или только занятых"""
+        return IntervalIndex(
+            (self.starts[position], self.ends[position])
+            for position in range(len(self))
+            if free is None or self.is_free(position) == free
+        )
+
+    def without(self, busy: IntervalIndex, existing: Iterable[tuple[int, int]] = ()) -> 'DayGrid':
+        """
+        Новая сетка без слотов, пересекающихся с busy (перерывы, занятые талоны)
+        и без слотов с ключами (начало, конец) из existing
+        """
+        existing = set(existing)
+        keep = [
+            position for position in range(len(self))
+            if (self.starts[position], self.ends[position]) not in existing
+            and not busy.overlaps(self.starts[position], self.ends[position])
+        ]
+        grid = DayGrid(
+            (self.starts[position] for position in keep),
+            (self.ends[position] for position in keep),
+            (self.talon_ids[position] for position in keep),
+            bytearray((len(keep) + 7) // 8),
+        )
+        for new_position, position in enumerate(keep):
+            if self.is_free(position):
+                grid.set_free(new_position, True)
+        return grid
+
+    def slots(self) -> Iterator[tuple[time, time]]:
+        for start, end in zip(self.starts, self.ends):
+            yield _MINUTE_TIMES[start], _MINUTE_TIMES[end]
+
+    def free_slots(self) -> Iterator[tuple[int, time, time]]:
+        """Свободные слоты: (id талона, start_time, end_time)"""
+        for position in range(len(self)):
+            if self.is_free(position):
+                yield (
+                    self.talon_ids[position],
+                    _MINUTE_TIMES[self.starts[position]],
+                    _MINUTE_TIMES[self.ends[position]],
+                )
+
+    def to_talons(self, doctor_id: int, talon_date: date) -> list[Talon]:
+        """Несохраненные талоны по слотам сетки"""
+        return [
+            Talon(
+                doctor_id=doctor_id,
+                date=talon_date,
+                start_time=_MINUTE_TIMES[start],
+                end_time=_MINUTE_TIMES[end],
+                is_free=self.is_free(position)
+            )
+            for position, (start, end) in enumerate(zip(self.starts, self.ends))
+        ]
@@ -0,0 +1,266 @@
+# appointments/services/doctor_search.py
+"""
+Поиск врачей по началу ФИО, фамилии или имени (type-ahead).
+
+Индекс - отсортированный список ключей (нормализованная строка, id врача)
+в памяти процесса; поиск - bisect к первому ключу с префиксом и проход
+вперед, пока ключи начинаются с префикса.
+
+Индекс строится фоновым потоком, который запускает первый запрос к процессу
+(warm_up), и этот же поток раз в DOCTOR_INDEX_REFRESH_SECONDS перестраивает
+его из БД - чтобы подхватить изменения из других процессов и массовые
+операции без сигналов. Новый индекс собирается отдельно и подменяется
+целиком; изменения от сигналов Doctor, пришедшие во время перестройки,
+применяются к нему повторно. Перестраивает только один поток за раз
+"""
+from bisect import bisect_left, insort
+from threading import Event, Lock, Thread
+from time import monotonic
+from typing import Iterable, NamedTuple, Optional
+
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import DatabaseError, connections
+
+from ..models import Doctor
+
+# Как часто фоновый поток перестраивает индекс из БД, секунд
+DOCTOR_INDEX_REFRESH_SECONDS = 300
+# Предел числа результатов поиска
+DOCTOR_SEARCH_MAX_LIMIT = 50
+
+
+class DoctorEntry(NamedTuple):
+    id: int
+    full_name: str
+    clinic_id: Optional[int]
+
+
+def normalize(value: str) -> str:
+    """Регистр и ё не важны, пробелы схлопываются"""
+    return ' '.join(value.casefold().replace('ё', 'е').split())
+
+
+def _index_keys(doctor_id: int, full_name: str, last_name: str, first_name: str) -> set[tuple[str, int]]:
+    return {
+        (normalize(value), doctor_id)
+        for value in (full_name, last_name, first_name)
+        if value and normalize(value)
+    }
+
+
+class DoctorPrefixIndex:
+    """
+    Отсортированный префиксный индекс врачей. _lock защищает чтение и
+    изменения, _rebuild_lock пускает в перестройку из БД один поток
+    """
+
+    __slots__ = ('_keys', '_entries', '_lock', '_rebuild_lock', '_pending', '_built_at')
+
+    def __init__(self):
+        self._keys = []
+        self._entries = {}
+        self._lock = Lock()
+        self._rebuild_lock = Lock()
+        # Изменения от сигналов, пришедшие во время перестройки (иначе None)
+        self._pending = None
+        self._built_at = None
+
+    @staticmethod
+    def _make(rows: Iterable[tuple[int, str, str, str, Optional[int]]]) -> tuple[list, dict]:
+        keys = set()
+        entries = {}
+        for doctor_id, full_name, last_name, first_name, clinic_id in rows:
+            entries[doctor_id] = DoctorEntry(doctor_id, full_name, clinic_id), _index_keys(
+                doctor_id, full_name, last_name, first_name
+            )
+            keys.update(entries[doctor_id][1])
+        return sorted(keys), entries
+
+    def build(self, rows: Iterable[tuple[int, str, str, str, Optional[int]]]) -> None:
+        """Строит индекс по строкам (id, full_name, last_name, first_name, clinic_id)"""
+        keys, entries = self._make(rows)
+        with self._lock:
+            self._keys, self._entries = keys, entries
+            self._built_at = monotonic()
+
+    @staticmethod
+    def _rows() -> list[tuple[int, str, str, str, Optional[int]]]:
+        return list(Doctor.objects.values_list('id', 'full_name', 'last_name', 'first_name', 'clinic_id'))
+
+    def _rebuild_locked(self) -> None:
+        with self._lock:
+            self._pending = []
+        try:
+            keys, entries = self._make(self._rows())
+        except BaseException:
+            with self._lock:
+                self._pending = None
+            raise
+        with self._lock:
+            self._keys, self._entries = keys, entries
+            for method, arg in self._pending:
+                method(self, arg)
+            self._pending = None
+            self._built_at = monotonic()
+
+    def refresh(self) -> bool:
+        """
+        Перестраивает индекс из БД одним запросом и подменяет его целиком.
+        Если перестройка уже идет в другом потоке, сразу возвращает False
+        """
+        if not self._rebuild_lock.acquire(blocking=False):
+            return False
+        try:
+            self._rebuild_locked()
+        finally:
+            self._rebuild_lock.release()
+        return True
+
+    def load(self) -> None:
+        """Строит индекс из БД, дождавшись перестройки в другом потоке"""
+        with self._rebuild_lock:
+            self._rebuild_locked()
+
+    def ensure_built(self) -> None:
+        """Строит индекс, если его еще нет; перестройку в другом потоке дожидается"""
+        if self.is_built():
+            return
+        with self._rebuild_lock:
+            if not self.is_built():
+                self._rebuild_locked()
+
+    def is_built(self) -> bool:
+        return self._built_at is not None
+
+    def _remove_locked(self, doctor_id: int) -> None:
+        entry = self._entries.pop(doctor_id, None)
+        if entry is None:
+            return
+        for key in entry[1]:
+            position = bisect_left(self._keys, key)
+            if position < len(self._keys) and self._keys[position] == key:
+                del self._keys[position]
+
+    def _update_locked(self, doctor: Doctor) -> None:
+        keys = _index_keys(doctor.id, doctor.full_name, doctor.last_name, doctor.first_name)
+        self._remove_locked(doctor.id)
+        self._entries[doctor.id] = DoctorEntry(doctor.id, doctor.full_name, doctor.clinic_id), keys
+        for key in keys:
+            insort(self._keys, key)
+
+    def _detach_clinic_locked(self, clinic_id: int) -> None:
+        for doctor_id, (entry, keys) in list(self._entries.items()):
+            if entry.clinic_id == clinic_id:
+                self._entries[doctor_id] = entry._replace(clinic_id=None), keys
+
+    def _apply(self, method, arg) -> None:
+        with self._lock:
+            # Перестройка могла прочитать БД до этого изменения - повторим его на новом индексе
+            if self._pending is not None:
+                self._pending.append((method, arg))
+            if self._built_at is not None:
+                method(self, arg)
+
+    def update(self, doctor: Doctor) -> None:
+        """Добавляет или обновляет врача"""
+        self._apply(DoctorPrefixIndex._update_locked, doctor)
+
+    def remove(self, doctor_id: int) -> None:
+        self._apply(DoctorPrefixIndex._remove_locked, doctor_id)
+
+    def detach_clinic(self, clinic_id: int) -> None:
+        """Клиника удалена: у ее врачей clinic_id стал NULL (без сигналов Doctor)"""
+        self._apply(DoctorPrefixIndex._detach_clinic_locked, clinic_id)
+
+    def search(self, prefix: str, clinic_id: Optional[int] = None, limit: int = 10) -> list[DoctorEntry]:
+        """Врачи, у которых ФИО, фамилия или имя начинаются с prefix, по алфавиту"""
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+
+        found = []
+        seen = set()
+        with self._lock:
+            keys = self._keys
+            position = bisect_left(keys, (prefix,))
+            while position < len(keys) and len(found) < limit:
+                value, doctor_id = keys[position]
+                if not value.startswith(prefix):
+                    break
+                position += 1
+                if doctor_id in seen:
+                    continue
+                seen.add(doctor_id)
+                entry = self._entries[doctor_id][0]
+                if clinic_id is None or entry.clinic_id == clinic_id:
+                    found.append(entry)
+        return found
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+doctor_index = DoctorPrefixIndex()
+
+_refresher: Optional[Thread] = None
+_refresher_lock = Lock()
+_stop_refresher = Event()
+
+
+def _refresh_loop(interval: float) -> None:
+    while True:
+        try:
+            doctor_index.refresh()
+        except DatabaseError:
+            # Остается прежний индекс, следующая попытка через interval
+            pass
+        finally:
+            # У потока свои соединения с БД - не держим их открытыми между перестройками
+            connections.close_all()
+        if _stop_refresher.wait(interval):
+            return
+
+
+def start_refresher(interval: float = DOCTOR_INDEX_REFRESH_SECONDS) -> bool:
+    """Запускает фоновую перестройку индекса раз в interval секунд; повторный вызов ничего не делает"""
+    global _refresher
+    with _refresher_lock:
+        if _refresher is not None:
+            return False
+        _stop_refresher.clear()
+        _refresher = Thread(target=_refresh_loop, args=(interval,), name='doctor-index-refresh', daemon=True)
+        _refresher.start()
+        return True
+
+
+def stop_refresher() -> None:
+    global _refresher
+    with _refresher_lock:
+        if _refresher is None:
+            return
+        _stop_refresher.set()
+        _refresher.join()
+        _refresher = None
+
+
+def warm_up(**kwargs) -> None:
+    """
+    Обработчик request_started: на первом запросе процесса запускает фоновую
+    перестройку индекса. Не в AppConfig.ready(), чтобы migrate и другие
+    команды не читали таблицу врачей. DOCTOR_INDEX_REFRESH_SECONDS = None
+    в настройках отключает фоновый поток - тогда индекс строит первый поиск
+    """
+    request_started.disconnect(warm_up, dispatch_uid='doctor_index_warm_up')
+    interval = getattr(settings, 'DOCTOR_INDEX_REFRESH_SECONDS', DOCTOR_INDEX_REFRESH_SECONDS)
+    if interval:
+        start_refresher(interval)
+
+
+def search_doctors(prefix: str, clinic_id: Optional[int] = None, limit: int = 10) -> list[DoctorEntry]:
+    """
+    Поиск по индексу процесса. Пока фоновый поток не построил индекс,
+    ждет его; без фонового потока строит индекс один раз сам
+    """
+    doctor_index.ensure_built()
+    return doctor_index.search(prefix, clinic_id=clinic_id, limit=limit)
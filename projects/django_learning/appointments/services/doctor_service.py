@@ -1,4 +1,5 @@
 from appointments.models import Doctor
+from appointments.services.read_models import DoctorRow, aproject, project
 
 
 def get_doctors() -> list[Doctor]:
@@ -6,6 +7,15 @@ def get_doctors() -> list[Doctor]:
     return list(doctors)
 
 
+def get_doctor_rows() -> list[DoctorRow]:
+    """Строки списка врачей с названием клиники одним запросом"""
+    return project(Doctor.objects.order_by('id'), DoctorRow)
+
+
+async def aget_doctor_rows() -> list[DoctorRow]:
+    return await aproject(Doctor.objects.order_by('id'), DoctorRow)
+
+
 def get_doctors_by_clinic_id(clinic_id: int) -> list[Doctor]:
     doctors = Doctor.objects.filter(clinic_id=clinic_id)
     return list(doctors)
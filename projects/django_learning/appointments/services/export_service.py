@@ -0,0 +1,103 @@
+# appointments/services/export_service.py
+"""
+Потоковая выгрузка талонов и графиков в CSV или NDJSON, опционально в gzip.
+Строки читаются values_list().iterator(chunk_size) и сразу кодируются,
+поэтому память ограничена одной порцией при любом объеме таблиц
+"""
+from datetime import date
+from typing import Iterator, Optional, Union
+
+from ..models import ArchivedTalon, Schedule, Talon
+from .streaming import iter_csv, iter_gzip, iter_ndjson
+
+# Порция строк, читаемая из курсора БД
+EXPORT_CHUNK_SIZE = 5000
+
+EXPORT_FORMATS = ('csv', 'ndjson')
+
+# Для каждого вида выгрузки: модель, (колонка, поле values_list), порядок строк
+# и модель архива с теми же полями (или None)
+EXPORTS = {
+    'talons': (
+        Talon,
+        (
+            ('id', 'id'),
+            ('doctor_id', 'doctor_id'),
+            ('clinic_id', 'doctor__clinic_id'),
+            ('date', 'date'),
+            ('start_time', 'start_time'),
+            ('end_time', 'end_time'),
+            ('is_free', 'is_free'),
+        ),
+        ('date', 'start_time', 'id'),
+        ArchivedTalon,
+    ),
+    'schedules': (
+        Schedule,
+        (
+            ('id', 'id'),
+            ('doctor_id', 'doctor_id'),
+            ('clinic_id', 'clinic_id'),
+            ('date', 'date'),
+            ('start_time', 'start_time'),
+            ('end_time', 'end_time'),
+            ('start_break_time', 'start_break_time'),
+            ('end_break_time', 'end_break_time'),
+        ),
+        ('date', 'id'),
+        None,
+    ),
+}
+
+
+def export_rows(
+        kind: str,
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+        clinic_id: Optional[int] = None,
+        chunk_size: int = EXPORT_CHUNK_SIZE,
+        using: Optional[str] = None,
+        include_archived: bool = False,
+) -> tuple[tuple[str, ...], Iterator[tuple]]:
+    """
+    Колонки и ленивый итератор строк выгрузки kind ('talons' или 'schedules').
+    include_archived добавляет строки архивной модели через UNION ALL
+    """
+    if kind not in EXPORTS:
+        raise ValueError(f"Неизвестная выгрузка {kind}, ожидается {' или '.join(EXPORTS)}")
+    model, columns, ordering, archive_model = EXPORTS[kind]
+    fields = [field for _, field in columns]
+
+    def select(source_model):
+        rows = source_model.objects.using(using) if using else source_model.objects.all()
+        if date_from is not None:
+            rows = rows.filter(date__gte=date_from)
+        if date_to is not None:
+            rows = rows.filter(date__lte=date_to)
+        if clinic_id is not None:
+            rows = rows.filter(**{dict(columns)['clinic_id']: clinic_id})
+        return rows.values_list(*fields)
+
+    rows = select(model)
+    if include_archived and archive_model is not None:
+        rows = rows.union(select(archive_model), all=True)
+
+    return (
+        tuple(name for name, _ in columns),
+        rows.order_by(*ordering).iterator(chunk_size=chunk_size),
+    )
+
+
+def iter_export(
+        kind: str,
+        file_format: str = 'csv',
+        compress: bool = False,
+        **filters
+) -> Iterator[Union[str, bytes]]:
+    """Поток выгрузки: строки текста или, при compress, байты gzip"""
+    if file_format not in EXPORT_FORMATS:
+        raise ValueError(f"format должен быть {' или '.join(EXPORT_FORMATS)}")
+    columns, rows = export_rows(kind, **filters)
+
+    chunks = iter_csv(rows, columns) if file_format == 'csv' else iter_ndjson(rows, columns)
+    return iter_gzip(chunks) if compress else chunks
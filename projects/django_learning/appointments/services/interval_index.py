@@ -0,0 +1,45 @@
+# appointments/services/interval_index.py
+from bisect import bisect_left
+from typing import Any, Iterable
+
+
+class IntervalIndex:
+    """
+    Индекс полуоткрытых интервалов [start, end) для проверки пересечений.
+
+    При построении интервалы сортируются по началу и склеиваются
+    в непересекающиеся, после чего запрос "пересекает ли [a, b)
+    хоть один интервал" решается бинарным поиском за O(log n).
+    Границы могут быть любыми сравнимыми значениями: time, datetime, минуты
+    """
+
+    __slots__ = ('_starts', '_ends')
+
+    def __init__(self, intervals: Iterable[tuple[Any, Any]] = ()):
+        starts = []
+        ends = []
+        for start, end in sorted(intervals):
+            if start >= end:
+                continue
+            # Пересекающиеся и соприкасающиеся интервалы склеиваем
+            if ends and start <= ends[-1]:
+                if end > ends[-1]:
+                    ends[-1] = end
+                continue
+            starts.append(start)
+            ends.append(end)
+
+        self._starts = starts
+        self._ends = ends
+
+    def __len__(self) -> int:
+        return len(self._starts)
+
+    def __bool__(self) -> bool:
+        return bool(self._starts)
+
+    def overlaps(self, start: Any, end: Any) -> bool:
+        """Пересекается ли [start, end) хотя бы с одним интервалом индекса"""
+        # Последний интервал, начинающийся строго раньше end
+        position = bisect_left(self._starts, end) - 1
+        return position >= 0 and self._ends[position] > start
@@ -0,0 +1,206 @@
+# appointments/services/job_service.py
+"""
+Очередь фоновой генерации талонов в таблице TalonGenerationJob.
+
+Воркер забирает задачи условным UPDATE ... WHERE status = 'pending':
+из нескольких воркеров задачу получает тот, чей UPDATE прошел первым,
+блокировки строк не нужны. Пока задачи выполняются, отдельный поток
+воркера по таймеру обновляет heartbeat_at - и во время долгой задачи;
+задачи упавшего воркера по устаревшему heartbeat возвращаются в очередь
+"""
+import os
+import socket
+from contextlib import contextmanager
+from datetime import timedelta
+from threading import Event, Thread
+from typing import Optional
+
+from django.db import DatabaseError, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from ..models import Schedule, TalonGenerationJob
+from .schedule_service import split_schedule_to_talons
+
+# Сколько задач воркер забирает за раз
+JOB_BATCH_SIZE = 20
+# Через сколько секунд без heartbeat задача считается брошенной
+JOB_STALE_SECONDS = 300
+# После стольких попыток брошенная задача помечается ошибкой
+JOB_MAX_ATTEMPTS = 3
+# Как часто воркер продлевает свои задачи, пока они выполняются, секунд
+JOB_HEARTBEAT_SECONDS = 30
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def enqueue_generation(schedule_id: int) -> TalonGenerationJob:
+    """Поставить генерацию талонов по графику в очередь"""
+    return TalonGenerationJob.objects.create(schedule_id=schedule_id)
+
+
+def create_schedule_with_job(**fields) -> tuple[Schedule, TalonGenerationJob]:
+    """
+    Создать график и задачу генерации его талонов в одной транзакции.
+    Часы и перерыв проверяются до записи (ValidationError): задача с
+    неверным графиком заняла бы воркер впустую
+    """
+    schedule = Schedule(**fields)
+    schedule.clean()
+    with transaction.atomic():
+        schedule.save()
+        job = enqueue_generation(schedule.id)
+    return schedule, job
+
+
+def claim_jobs(worker_id: str, batch_size: int = JOB_BATCH_SIZE) -> list[TalonGenerationJob]:
+    """
+    Забирает до batch_size задач из очереди в порядке постановки.
+    Кандидаты читаются без блокировок, а захват - условный UPDATE,
+    поэтому параллельные воркеры не получат одну и ту же задачу
+    """
+    candidate_ids = list(
+        TalonGenerationJob.objects.filter(status=TalonGenerationJob.STATUS_PENDING)
+        .order_by('id')
+        .values_list('id', flat=True)[:batch_size]
+    )
+    if not candidate_ids:
+        return []
+
+    now = timezone.now()
+    TalonGenerationJob.objects.filter(
+        id__in=candidate_ids,
+        status=TalonGenerationJob.STATUS_PENDING
+    ).update(
+        status=TalonGenerationJob.STATUS_RUNNING,
+        worker=worker_id,
+        attempts=F('attempts') + 1,
+        started_at=now,
+        heartbeat_at=now,
+    )
+    return list(TalonGenerationJob.objects.filter(
+        id__in=candidate_ids,
+        status=TalonGenerationJob.STATUS_RUNNING,
+        worker=worker_id,
+        started_at=now,
+    ).order_by('id'))
+
+
+def heartbeat(worker_id: str) -> int:
+    """Продлевает задачи, выполняемые воркером"""
+    return TalonGenerationJob.objects.filter(
+        status=TalonGenerationJob.STATUS_RUNNING,
+        worker=worker_id
+    ).update(heartbeat_at=timezone.now())
+
+
+def _heartbeat_loop(worker_id: str, stop: Event, interval: float) -> None:
+    try:
+        while not stop.wait(interval):
+            try:
+                heartbeat(worker_id)
+            except DatabaseError:
+                # Пропущенный heartbeat не страшен: задача устареет только через JOB_STALE_SECONDS
+                pass
+    finally:
+        # У потока свои соединения с БД - закрываем их сами
+        connections.close_all()
+
+
+@contextmanager
+def heartbeat_while_running(worker_id: str, interval: float = JOB_HEARTBEAT_SECONDS):
+    """
+    Продлевает задачи воркера каждые interval секунд в фоновом потоке,
+    пока выполняется блок: heartbeat идет и посреди долгой задачи
+    """
+    stop = Event()
+    thread = Thread(
+        target=_heartbeat_loop,
+        args=(worker_id, stop, interval),
+        name=f"heartbeat-{worker_id}",
+        daemon=True,
+    )
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def requeue_stale_jobs(stale_seconds: int = JOB_STALE_SECONDS) -> int:
+    """
+    Возвращает в очередь задачи без heartbeat дольше stale_seconds
+    (воркер упал или был перезапущен). Исчерпавшие попытки - в ошибку
+    """
+    stale = TalonGenerationJob.objects.filter(
+        status=TalonGenerationJob.STATUS_RUNNING,
+        heartbeat_at__lt=timezone.now() - timedelta(seconds=stale_seconds),
+    )
+    failed = stale.filter(attempts__gte=JOB_MAX_ATTEMPTS).update(
+        status=TalonGenerationJob.STATUS_FAILED,
+        error="Воркер не завершил задачу за отведенное число попыток",
+        finished_at=timezone.now(),
+    )
+    return failed + stale.update(status=TalonGenerationJob.STATUS_PENDING, worker='')
+
+
+def release_jobs(worker_id: str) -> int:
+    """Вернуть в очередь задачи воркера при штатной остановке"""
+    return TalonGenerationJob.objects.filter(
+        status=TalonGenerationJob.STATUS_RUNNING,
+        worker=worker_id
+    ).update(status=TalonGenerationJob.STATUS_PENDING, worker='', attempts=F('attempts') - 1)
+
+
+def _finish(job: TalonGenerationJob, worker_id: str, **fields) -> None:
+    # Задачу могли вернуть в очередь как зависшую - тогда результат не записываем
+    TalonGenerationJob.objects.filter(
+        id=job.id,
+        status=TalonGenerationJob.STATUS_RUNNING,
+        worker=worker_id
+    ).update(finished_at=timezone.now(), **fields)
+
+
+def run_jobs(
+        jobs: list[TalonGenerationJob],
+        worker_id: str,
+        heartbeat_interval: float = JOB_HEARTBEAT_SECONDS,
+) -> tuple[int, int]:
+    """
+    Выполняет захваченные задачи по одной, продлевая heartbeat по таймеру.
+    Ошибка одной задачи не мешает остальным. Возвращает (успешно, с ошибкой)
+    """
+    done = failed = 0
+    with heartbeat_while_running(worker_id, heartbeat_interval):
+        for job in jobs:
+            try:
+                talons_created = len(split_schedule_to_talons(job.schedule_id))
+            except Exception as e:
+                _finish(job, worker_id, status=TalonGenerationJob.STATUS_FAILED, error=str(e))
+                failed += 1
+            else:
+                _finish(job, worker_id, status=TalonGenerationJob.STATUS_DONE, talons_created=talons_created)
+                done += 1
+    return done, failed
+
+
+def get_job_status(job_id: int) -> Optional[dict]:
+    """Состояние задачи и число задач перед ней в очереди"""
+    job = TalonGenerationJob.objects.filter(id=job_id).values(
+        'id', 'schedule_id', 'status', 'attempts', 'talons_created', 'error',
+        'created_at', 'started_at', 'finished_at'
+    ).first()
+    if job is None:
+        return None
+
+    job['queue_position'] = (
+        TalonGenerationJob.objects.filter(
+            status=TalonGenerationJob.STATUS_PENDING,
+            id__lt=job_id
+        ).count()
+        if job['status'] == TalonGenerationJob.STATUS_PENDING else None
+    )
+    return job
@@ -0,0 +1,153 @@
+# appointments/services/page_cache.py
+from functools import wraps
+from threading import Lock
+from time import perf_counter
+from typing import Callable, Optional
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+
+from ..db_router import primary_reads
+from .cache_versions import bump_version_on_commit, cache_is_shared, get_versions
+
+# Сколько хранить страницы и фрагменты, секунд. Актуальность обеспечивают
+# версии, таймаут лишь ограничивает размер кэша. Версии работают только
+# с кэшем, общим для всех процессов (cache_is_shared) - иначе страницы
+# не кэшируются вовсе
+PAGE_CACHE_TIMEOUT = 60 * 60
+
+_stats = {
+    'page': {'hits': 0, 'misses': 0, 'saved_seconds': 0.0},
+    'fragment': {'hits': 0, 'misses': 0, 'saved_seconds': 0.0},
+}
+_stats_lock = Lock()
+
+
+def _count(kind: str, hits: int = 0, misses: int = 0, saved_seconds: float = 0.0) -> None:
+    with _stats_lock:
+        _stats[kind]['hits'] += hits
+        _stats[kind]['misses'] += misses
+        _stats[kind]['saved_seconds'] += saved_seconds
+
+
+def get_page_cache_stats() -> dict:
+    """Попадания, промахи и сэкономленное на рендере время в этом процессе"""
+    with _stats_lock:
+        stats = {kind: dict(values) for kind, values in _stats.items()}
+    for values in stats.values():
+        total = values['hits'] + values['misses']
+        values['hit_ratio'] = values['hits'] / total if total else 0.0
+    return stats
+
+
+def reset_page_cache_stats() -> None:
+    with _stats_lock:
+        for values in _stats.values():
+            values.update(hits=0, misses=0, saved_seconds=0.0)
+
+
+# Области версий: список врачей целиком, отдельный врач, клиника, график
+def doctors_scope() -> str:
+    return 'pages:doctors'
+
+
+def doctor_scope(doctor_id: int) -> str:
+    return f"pages:doctor:{doctor_id}"
+
+
+def clinic_scope(clinic_id: int) -> str:
+    return f"pages:clinic:{clinic_id}"
+
+
+def schedule_scope(schedule_id: int) -> str:
+    return f"pages:schedule:{schedule_id}"
+
+
+def invalidate_doctor_pages(doctor_id: int) -> None:
+    """Сбрасывает страницы и фрагменты одного врача"""
+    bump_version_on_commit(doctor_scope(doctor_id))
+
+
+def versioned_key(prefix: str, scopes: list[str], *parts) -> str:
+    versions = get_versions(scopes)
+    return ':'.join([prefix, *map(str, parts), *(str(versions[scope]) for scope in scopes)])
+
+
+def cached_page(key_func: Callable[..., Optional[str]], timeout: int = PAGE_CACHE_TIMEOUT):
+    """
+    Кэширует HTML страницы по ключу из key_func(request, **kwargs).
+    Ключ должен включать версии (versioned_key), тогда сигналы
+    моделей сбрасывают только затронутые страницы. При промахе view
+    читает с основной БД, даже под read_from_replica. Без общего
+    для процессов кэша страница рендерится каждый раз
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            key = key_func(request, **kwargs) if request.method == 'GET' and cache_is_shared() else None
+            if key is None:
+                return view(request, *args, **kwargs)
+
+            cached = cache.get(key)
+            if cached is not None:
+                content, content_type, render_seconds = cached
+                _count('page', hits=1, saved_seconds=render_seconds)
+                return HttpResponse(content, content_type=content_type)
+
+            started = perf_counter()
+            with primary_reads():
+                response = view(request, *args, **kwargs)
+            render_seconds = perf_counter() - started
+            _count('page', misses=1)
+
+            if response.status_code == 200 and not response.streaming:
+                cache.set(key, (response.content, response['Content-Type'], render_seconds), timeout)
+            return response
+        return wrapper
+    return decorator
+
+
+def render_cached_fragments(template_name: str, items: list, context_name: str,
+                            key_func: Callable[[object], str],
+                            prepare: Optional[Callable[[list], None]] = None,
+                            timeout: int = PAGE_CACHE_TIMEOUT) -> list[str]:
+    """
+    Рендерит фрагмент шаблона для каждого объекта с кэшированием.
+    Все ключи читаются одним get_many; prepare(items) вызывается только
+    для объектов без кэша - например, чтобы догрузить их данные. prepare
+    читает с основной БД: если items пришли с реплики, он должен их перечитать,
+    иначе отстающие данные попадут в кэш под новой версией.
+    Без общего для процессов кэша фрагменты рендерятся каждый раз
+    """
+    if not cache_is_shared():
+        if items and prepare is not None:
+            with primary_reads():
+                prepare(items)
+        return [render_to_string(template_name, {context_name: item}) for item in items]
+
+    keys = [key_func(item) for item in items]
+    cached = cache.get_many(keys)
+
+    missing = [item for item, key in zip(items, keys) if key not in cached]
+    if missing and prepare is not None:
+        with primary_reads():
+            prepare(missing)
+
+    fragments = []
+    to_store = {}
+    saved_seconds = 0.0
+    for item, key in zip(items, keys):
+        if key in cached:
+            html, render_seconds = cached[key]
+            saved_seconds += render_seconds
+        else:
+            started = perf_counter()
+            html = render_to_string(template_name, {context_name: item})
+            to_store[key] = (html, perf_counter() - started)
+        fragments.append(html)
+
+    if to_store:
+        cache.set_many(to_store, timeout)
+    _count('fragment', hits=len(items) - len(missing), misses=len(missing), saved_seconds=saved_seconds)
+    return fragments
@@ -0,0 +1,93 @@
+# appointments/services/read_models.py
+"""
+Легкие строки для страниц-списков (read-модели).
+
+Списки не создают экземпляры моделей: строки читаются через values_list()
+только с колонками, которые выводит шаблон (поля связанных моделей - через
+JOIN в том же запросе), и кладутся в классы с __slots__. Такая строка
+в несколько раз меньше экземпляра модели и создается без сигналов
+и _state, а шаблон обращается к ней так же, через точку
+"""
+from typing import Iterable, Optional
+
+
+class DoctorRow:
+    """Врач в списке врачей"""
+
+    __slots__ = ('id', 'full_name', 'duration', 'clinic_name')
+    columns = ('id', 'full_name', 'duration', 'clinic__name')
+
+    def __init__(self, id, full_name, duration, clinic_name):
+        self.id = id
+        self.full_name = full_name
+        self.duration = duration
+        self.clinic_name = clinic_name
+
+
+class TalonRow:
+    """
+    Талон в списках талонов и карточках графиков. doctor_full_name
+    выбирается только там, где выводится врач; archived - для строк архива
+    """
+
+    __slots__ = ('id', 'doctor_id', 'date', 'start_time', 'end_time', 'is_free', 'doctor_full_name', 'archived')
+    columns = ('id', 'doctor_id', 'date', 'start_time', 'end_time', 'is_free')
+
+    def __init__(self, id, doctor_id, date, start_time, end_time, is_free,
+                 doctor_full_name: Optional[str] = None, archived: bool = False):
+        self.id = id
+        self.doctor_id = doctor_id
+        self.date = date
+        self.start_time = start_time
+        self.end_time = end_time
+        self.is_free = is_free
+        self.doctor_full_name = doctor_full_name
+        self.archived = archived
+
+
+class ScheduleRow:
+    """
+    График в списке графиков. talons и card_html заполняются позже:
+    талоны - только для карточек без кэша, HTML - готовой карточкой
+    """
+
+    __slots__ = (
+        'id', 'doctor_id', 'clinic_id', 'date', 'start_time', 'end_time',
+        'start_break_time', 'end_break_time', 'doctor_full_name', 'clinic_name', 'talons', 'card_html'
+    )
+    columns = (
+        'id', 'doctor_id', 'clinic_id', 'date', 'start_time', 'end_time',
+        'start_break_time', 'end_break_time', 'doctor__full_name', 'clinic__name'
+    )
+    # Атрибуты, заполняемые из columns
+    data_fields = __slots__[:len(columns)]
+
+    def __init__(self, id, doctor_id, clinic_id, date, start_time, end_time,
+                 start_break_time, end_break_time, doctor_full_name, clinic_name):
+        self.id = id
+        self.doctor_id = doctor_id
+        self.clinic_id = clinic_id
+        self.date = date
+        self.start_time = start_time
+        self.end_time = end_time
+        self.start_break_time = start_break_time
+        self.end_break_time = end_break_time
+        self.doctor_full_name = doctor_full_name
+        self.clinic_name = clinic_name
+        self.talons = None
+        self.card_html = ''
+
+
+def project(queryset, row_class) -> list:
+    """Строки row_class по колонкам row_class.columns одним запросом"""
+    return make_rows(queryset.values_list(*row_class.columns), row_class)
+
+
+async def aproject(queryset, row_class) -> list:
+    """Асинхронная версия project"""
+    return [row_class(*values) async for values in queryset.values_list(*row_class.columns)]
+
+
+def make_rows(rows: Iterable[tuple], row_class) -> list:
+    """Строки row_class из готовых кортежей значений в порядке его __init__"""
+    return [row_class(*values) for values in rows]
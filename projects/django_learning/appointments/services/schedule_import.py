@@ -0,0 +1,200 @@
+# appointments/services/schedule_import.py
+"""
+Потоковый импорт графиков из CSV или NDJSON.
+
+Файл читается построчно, графики пишутся порциями bulk_create, поэтому
+память не зависит от размера файла. Врачи и клиники ищутся по словарям,
+загруженным один раз; даты и время разбираются fromisoformat с кэшем
+(в ростере одни и те же значения повторяются тысячи раз)
+"""
+import csv
+import json
+from dataclasses import dataclass
+from datetime import date, time
+from functools import lru_cache
+from time import perf_counter
+from typing import IO, Callable, Iterable, Iterator, Optional, Union
+
+from django.db import transaction
+
+from ..models import Clinic, Doctor, Schedule
+from .template_service import invalidate_templates
+
+# Порция строк для bulk_create
+IMPORT_BATCH_SIZE = 2000
+
+SCHEDULE_TIME_FIELDS = ('start_time', 'end_time', 'start_break_time', 'end_break_time')
+
+
+@dataclass
+class ImportResult:
+    """Итог импорта графиков"""
+    rows: int = 0
+    created: int = 0
+    skipped: int = 0
+    seconds: float = 0.0
+    date_from: Optional[date] = None
+    date_to: Optional[date] = None
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+class ScheduleRowError(ValueError):
+    """Ошибка в строке импорта, с номером строки"""
+
+    def __init__(self, line: int, message: str):
+        super().__init__(f"Строка {line}: {message}")
+        self.line = line
+
+
+@lru_cache(maxsize=4096)
+def _parse_date(value: str) -> date:
+    return date.fromisoformat(value.strip())
+
+
+@lru_cache(maxsize=4096)
+def _parse_time(value: str) -> time:
+    return time.fromisoformat(value.strip())
+
+
+def iter_rows(file: IO[str], file_format: str) -> Iterator[tuple[int, Union[dict, str]]]:
+    """
+    Строки файла с номером строки, без чтения файла целиком: CSV - словарями,
+    NDJSON - исходным текстом. JSON разбирает ScheduleRowParser.parse, чтобы
+    неверная строка была обычной ошибкой строки (и пропускалась с skip_invalid)
+    """
+    if file_format == 'csv':
+        reader = csv.DictReader(file)
+        for row in reader:
+            yield reader.line_num, row
+    elif file_format == 'ndjson':
+        for line_number, line in enumerate(file, start=1):
+            if line.strip():
+                yield line_number, line
+    else:
+        raise ValueError(f"Неизвестный формат {file_format}, ожидается csv или ndjson")
+
+
+class ScheduleRowParser:
+    """
+    Превращает строку файла в Schedule. Врач задается doctor_id или полным
+    именем doctor, клиника - clinic_id или названием clinic; без клиники
+    берется клиника врача
+    """
+
+    def __init__(self):
+        self.doctor_clinics = {}
+        self.doctors_by_name = {}
+        for doctor_id, full_name, clinic_id in Doctor.objects.values_list('id', 'full_name', 'clinic_id'):
+            self.doctor_clinics[doctor_id] = clinic_id
+            self.doctors_by_name.setdefault(full_name, doctor_id)
+        self.clinics_by_name = {}
+        self.clinic_ids = set()
+        for clinic_id, name in Clinic.objects.values_list('id', 'name'):
+            self.clinics_by_name.setdefault(name, clinic_id)
+            self.clinic_ids.add(clinic_id)
+
+    def _doctor_id(self, row: dict) -> int:
+        if row.get('doctor_id') not in (None, ''):
+            doctor_id = int(row['doctor_id'])
+            if doctor_id not in self.doctor_clinics:
+                raise ValueError(f"Врач с id {doctor_id} не найден")
+            return doctor_id
+        name = (row.get('doctor') or '').strip()
+        if name not in self.doctors_by_name:
+            raise ValueError(f"Врач '{name}' не найден")
+        return self.doctors_by_name[name]
+
+    def _clinic_id(self, row: dict, doctor_id: int) -> int:
+        if row.get('clinic_id') not in (None, ''):
+            clinic_id = int(row['clinic_id'])
+            if clinic_id not in self.clinic_ids:
+                raise ValueError(f"Клиника с id {clinic_id} не найдена")
+            return clinic_id
+        name = (row.get('clinic') or '').strip()
+        if name:
+            if name not in self.clinics_by_name:
+                raise ValueError(f"Клиника '{name}' не найдена")
+            return self.clinics_by_name[name]
+        if self.doctor_clinics[doctor_id] is None:
+            raise ValueError("У врача нет клиники, укажите clinic_id")
+        return self.doctor_clinics[doctor_id]
+
+    def parse(self, line: int, row: Union[dict, str]) -> Schedule:
+        try:
+            if isinstance(row, str):
+                row = json.loads(row)
+                if not isinstance(row, dict):
+                    raise ValueError("ожидается JSON-объект")
+            doctor_id = self._doctor_id(row)
+            times = {name: _parse_time(row[name]) for name in SCHEDULE_TIME_FIELDS}
+            if times['start_time'] >= times['end_time']:
+                raise ValueError("Начало приема должно быть раньше конца")
+            if not times['start_time'] <= times['start_break_time'] <= times['end_break_time'] <= times['end_time']:
+                raise ValueError("Перерыв должен быть внутри рабочего времени")
+            return Schedule(
+                doctor_id=doctor_id,
+                clinic_id=self._clinic_id(row, doctor_id),
+                date=_parse_date(row['date']),
+                **times
+            )
+        except KeyError as e:
+            raise ScheduleRowError(line, f"нет поля {e.args[0]}")
+        except (AttributeError, TypeError, ValueError) as e:
+            raise ScheduleRowError(line, str(e))
+
+
+def import_schedules(
+        rows: Iterable[tuple[int, Union[dict, str]]],
+        batch_size: int = IMPORT_BATCH_SIZE,
+        skip_invalid: bool = False,
+        on_batch: Optional[Callable[[list[Schedule]], None]] = None,
+) -> ImportResult:
+    """
+    Пишет графики из строк порциями по batch_size, каждая порция в своей
+    транзакции. Неверная строка прерывает импорт (строки до нее записываются)
+    или, с skip_invalid, пропускается. on_batch получает созданные графики порции (с id) после ее коммита
+    """
+    started = perf_counter()
+    parser = ScheduleRowParser()
+    result = ImportResult()
+
+    def flush(batch: list[Schedule]) -> None:
+        with transaction.atomic():
+            result.created += len(Schedule.objects.bulk_create(batch))
+            # bulk_create не шлет сигналов, а график отменяет шаблон на свою дату
+            for doctor_id in {schedule.doctor_id for schedule in batch}:
+                invalidate_templates(doctor_id)
+        if on_batch is not None:
+            on_batch(batch)
+
+    batch = []
+    for line, row in rows:
+        result.rows += 1
+        try:
+            schedule = parser.parse(line, row)
+        except ScheduleRowError:
+            if not skip_invalid:
+                # Верные строки до ошибки тоже записываем
+                if batch:
+                    flush(batch)
+                raise
+            result.skipped += 1
+            continue
+
+        batch.append(schedule)
+        if result.date_from is None or schedule.date < result.date_from:
+            result.date_from = schedule.date
+        if result.date_to is None or schedule.date > result.date_to:
+            result.date_to = schedule.date
+
+        if len(batch) == batch_size:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+
+    result.seconds = perf_counter() - started
+    return result
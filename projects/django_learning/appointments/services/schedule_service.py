@@ -1,8 +1,59 @@
 # appointments/services/schedule_service.py
-from datetime import datetime, time, timedelta
-from ..models import Schedule, Talon, Doctor
-from typing import List
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import date, time
+from time import perf_counter
+from ..models import ArchivedTalon, Schedule, Talon, Doctor
+from .interval_index import IntervalIndex
+from .day_grid import DayGrid, to_minutes
+from .availability_cache import invalidate_day
+from .page_cache import invalidate_doctor_pages
+from .read_models import ScheduleRow, TalonRow, project
+from .stats_service import refresh_days
+from .talon_service import insert_talons
+from typing import Iterable, List, Optional
 from django.db import transaction
+from django.db.models import Max, Min
+
+# Где нарезать сетки слотов при пакетной генерации: в текущем потоке,
+# в пуле процессов или в пуле потоков. Нарезка - чистый Python без
+# ввода-вывода, поэтому из-за GIL потоки ее не ускоряют и включаются только явно
+GENERATION_POOLS = ('serial', 'processes', 'threads')
+
+
+def _filter_new_slots(
+        grid: DayGrid,
+        existing_talons: Iterable[tuple[time, time, bool]],
+) -> DayGrid:
+    """
+    Оставляет слоты, которых еще нет среди талонов и которые
+    не пересекаются с занятыми талонами
+    """
+    existing_talons = [
+        (to_minutes(start_time), to_minutes(end_time), is_free)
+        for start_time, end_time, is_free in existing_talons
+    ]
+    busy_index = IntervalIndex(
+        (start, end)
+        for start, end, is_free in existing_talons
+        if not is_free
+    )
+    return grid.without(busy_index, existing=((start, end) for start, end, _ in existing_talons))
+
+
+def _day_talons(doctor_ids: Iterable[int], dates: Iterable[date]):
+    """
+    (doctor_id, date, start_time, end_time, is_free) талонов врачей на даты -
+    горячих и уже перенесенных в архив, одним UNION ALL. Без архива
+    генерация заново создала бы свободные талоны на архивные дни
+    """
+    fields = ('doctor_id', 'date', 'start_time', 'end_time', 'is_free')
+    doctor_ids, dates = set(doctor_ids), set(dates)
+    return Talon.objects.filter(doctor_id__in=doctor_ids, date__in=dates).values_list(*fields).union(
+        ArchivedTalon.objects.filter(doctor_id__in=doctor_ids, date__in=dates).values_list(*fields),
+        all=True,
+    )
 
 
 def split_schedule_to_talons(schedule_id: int) -> List[Talon]:
@@ -10,126 +61,226 @@ def split_schedule_to_talons(schedule_id: int) -> List[Talon]:
     Разбивает график врача на талоны по длительности приема
     Проверяет пересечения с существующими ЗАНЯТЫМИ талонами
     Создает только свободные талоны
+
+    Количество запросов не зависит от числа слотов: расписание с врачом,
+    все талоны врача на дату и один INSERT с пропуском конфликтов.
+    Дубликаты отсекает уникальное ограничение unique_talon_slot, поэтому
+    параллельные генерации одного графика не создают лишних талонов.
+    Возвращает реально созданные талоны
     """
     try:
-        schedule = Schedule.objects.get(id=schedule_id)
+        schedule = Schedule.objects.select_related('doctor').get(id=schedule_id)
     except Schedule.DoesNotExist:
         raise ValueError(f"Расписание с id {schedule_id} не найдено")
 
     doctor = schedule.doctor
-    duration_minutes = doctor.duration
     schedule_date = schedule.date
 
-    # Конвертируем время в datetime
-    start_datetime = datetime.combine(schedule_date, schedule.start_time)
-    end_datetime = datetime.combine(schedule_date, schedule.end_time)
-    start_break_datetime = datetime.combine(schedule_date, schedule.start_break_time)
-    end_break_datetime = datetime.combine(schedule_date, schedule.end_break_time)
-
-    # Генерируем временные слоты
-    time_slots = []
-    current_time = start_datetime
-
-    while current_time < end_datetime:
-        # Проверяем, начинается ли текущий слот в перерыве
-        if start_break_datetime <= current_time < end_break_datetime:
-            # Перескакиваем на конец перерыва
-            current_time = end_break_datetime
-            continue
-
-        # Рассчитываем конец слота
-        slot_end = current_time + timedelta(minutes=duration_minutes)
-
-        # Проверяем, не выходит ли слот за конец рабочего дня
-        if slot_end > end_datetime:
-            break
-
-        # Проверяем, не попадает ли конец слота в перерыв
-        if start_break_datetime < slot_end <= end_break_datetime:
-            # Если слот заканчивается в перерыве, обрезаем его до начала перерыва
-            slot_end = start_break_datetime
-            if slot_end <= current_time:
-                # Если после обрезки ничего не осталось, переходим к следующему
-                current_time = end_break_datetime
-                continue
-
-        # Проверяем, не начинается ли слот до перерыва, а заканчивается после
-        if current_time < start_break_datetime and slot_end > end_break_datetime:
-            # Разбиваем на два слота: до перерыва и после
-            # Создаем слот до перерыва
-            time_slots.append({
-                'start_time': current_time.time(),
-                'end_time': start_break_datetime.time(),
-                'date': schedule_date,
-                'doctor': doctor
-            })
-            # Перескакиваем после перерыва
-            current_time = end_break_datetime
-            continue
-
-        # Проверяем, не пересекается ли слот с перерывом
-        if current_time < end_break_datetime and slot_end > start_break_datetime:
-            # Пропускаем перерыв
-            current_time = end_break_datetime
-            continue
-
-        # Добавляем нормальный слот
-        time_slots.append({
-            'start_time': current_time.time(),
-            'end_time': slot_end.time(),
-            'date': schedule_date,
-            'doctor': doctor
-        })
-
-        current_time = slot_end
-
-    # Получаем занятые талоны для проверки конфликтов
-    busy_talons = Talon.objects.filter(
-        doctor=doctor,
-        date=schedule_date,
-        is_free=False
+    # Нарезаем день на слоты в компактной сетке
+    grid = DayGrid.from_schedule(
+        schedule.start_time,
+        schedule.end_time,
+        schedule.start_break_time,
+        schedule.end_break_time,
+        doctor.duration,
+    )
+
+    # Одним запросом забираем все талоны врача на эту дату (с архивными):
+    # из них получаем и занятые интервалы, и ключи уже существующих слотов
+    existing_talons = [row[2:] for row in _day_talons([doctor.id], [schedule_date])]
+
+    new_talons = _filter_new_slots(grid, existing_talons).to_talons(doctor.id, schedule_date)
+
+    # Создаем все талоны одним INSERT ... ON CONFLICT DO NOTHING RETURNING *
+    with transaction.atomic():
+        created_talons = insert_talons(new_talons)
+        # Массовая вставка не шлет сигналов, поэтому кэши и статистику обновляем сами
+        if created_talons:
+            refresh_days([(doctor.id, schedule_date)])
+            invalidate_day(doctor.id, schedule_date)
+            invalidate_doctor_pages(doctor.id)
+
+    return created_talons
+
+
+def get_schedules(date_from: date, date_to: date) -> List[ScheduleRow]:
+    """Строки графиков за период [date_from, date_to] с именем врача и названием клиники"""
+    return project(
+        Schedule.objects.filter(date__range=(date_from, date_to)).order_by('-date', 'start_time'),
+        ScheduleRow
     )
 
-    # Фильтруем слоты, которые не пересекаются с занятыми талонами
-    available_slots = []
-    for slot in time_slots:
-        slot_start = datetime.combine(schedule_date, slot['start_time'])
-        slot_end = datetime.combine(schedule_date, slot['end_time'])
 
-        has_conflict = False
-        for talon in busy_talons:
-            talon_start = datetime.combine(talon.date, talon.start_time)
-            talon_end = datetime.combine(talon.date, talon.end_time)
+def attach_talons(schedules: List[ScheduleRow]) -> None:
+    """
+    Кладет в schedule.talons талоны врача на дату графика.
+    Талоны всех графиков загружаются одним запросом и раскладываются
+    по (врач, дата) в памяти, поэтому число запросов не зависит от числа графиков
+    """
+    talons_by_day = defaultdict(list)
+    if schedules:
+        talons = Talon.objects.filter(
+            doctor_id__in={schedule.doctor_id for schedule in schedules},
+            date__range=(
+                min(schedule.date for schedule in schedules),
+                max(schedule.date for schedule in schedules)
+            )
+        ).order_by('start_time')
+        for talon in project(talons, TalonRow):
+            talons_by_day[(talon.doctor_id, talon.date)].append(talon)
+
+    for schedule in schedules:
+        schedule.talons = talons_by_day.get((schedule.doctor_id, schedule.date), [])
 
-            # Проверяем пересечение интервалов
-            if not (slot_end <= talon_start or slot_start >= talon_end):
-                has_conflict = True
-                break
 
-        if not has_conflict:
-            available_slots.append(slot)
+def load_schedule_cards(schedules: List[ScheduleRow]) -> None:
+    """
+    Перечитывает поля графиков и кладет в них талоны - для карточек, которые
+    попадут в кэш: список графиков мог прийти с отстающей реплики
+    """
+    fresh = {
+        row.id: row
+        for row in project(Schedule.objects.filter(id__in=[schedule.id for schedule in schedules]), ScheduleRow)
+    }
+    for schedule in schedules:
+        row = fresh.get(schedule.id)
+        if row is not None:
+            for name in ScheduleRow.data_fields:
+                setattr(schedule, name, getattr(row, name))
+    attach_talons(schedules)
 
-    # Создаем талоны
-    created_talons = []
 
-    with transaction.atomic():
-        for slot in available_slots:
-            # Проверяем, нет ли уже такого талона
-            existing_talon = Talon.objects.filter(
-                doctor=doctor,
-                date=schedule_date,
-                start_time=slot['start_time'],
-                end_time=slot['end_time']
-            ).first()
-
-            if not existing_talon:
-                talon = Talon.objects.create(
-                    doctor=doctor,
-                    date=schedule_date,
-                    start_time=slot['start_time'],
-                    end_time=slot['end_time'],
-                    is_free=True
-                )
-                created_talons.append(talon)
-
-    return created_talons
\ No newline at end of file
+def get_schedules_with_talons(date_from: date, date_to: date) -> List[ScheduleRow]:
+    """Графики за период [date_from, date_to] с талонами в schedule.talons"""
+    schedules = get_schedules(date_from, date_to)
+    attach_talons(schedules)
+    return schedules
+
+
+def get_schedule_date_bounds() -> tuple[Optional[date], Optional[date]]:
+    """Самая ранняя и самая поздняя даты графиков одним запросом"""
+    bounds = Schedule.objects.aggregate(first=Min('date'), last=Max('date'))
+    return bounds['first'], bounds['last']
+
+
+@dataclass
+class BatchGenerationResult:
+    """Итог пакетной генерации талонов"""
+    schedules: int = 0
+    doctor_days: int = 0
+    talons_created: int = 0
+    seconds: float = 0.0
+
+    @property
+    def schedules_per_second(self) -> float:
+        return self.schedules / self.seconds if self.seconds else 0.0
+
+    @property
+    def talons_per_second(self) -> float:
+        return self.talons_created / self.seconds if self.seconds else 0.0
+
+
+def _build_doctor_day_grid(schedules: list[tuple]) -> DayGrid:
+    """Сетка слотов всех графиков одного врача на одну дату (выполняется в пуле)"""
+    return DayGrid.union(DayGrid.from_schedule(*schedule) for schedule in schedules)
+
+
+def write_doctor_day_grids(grids: dict[tuple[int, date], DayGrid], chunk_size: int = 100) -> int:
+    """
+    Записывает слоты сеток {(врач, дата): DayGrid} талонами порциями по
+    chunk_size врачо-дней: один запрос существующих талонов и один INSERT
+    на порцию, каждая порция в своей транзакции. Возвращает число талонов
+    """
+    keys = list(grids)
+    talons_created = 0
+    for offset in range(0, len(keys), chunk_size):
+        chunk = keys[offset:offset + chunk_size]
+
+        # Все талоны порции (с архивными) одним запросом - надмножество по врачам и датам
+        existing = defaultdict(list)
+        for doctor_id, talon_date, start_time, end_time, is_free in _day_talons(
+                {doctor_id for doctor_id, _ in chunk},
+                {talon_date for _, talon_date in chunk},
+        ):
+            existing[(doctor_id, talon_date)].append((start_time, end_time, is_free))
+
+        new_talons = [
+            talon
+            for doctor_id, talon_date in chunk
+            for talon in _filter_new_slots(
+                grids[(doctor_id, talon_date)],
+                existing[(doctor_id, talon_date)]
+            ).to_talons(doctor_id, talon_date)
+        ]
+
+        with transaction.atomic():
+            talons_created += len(insert_talons(new_talons))
+            changed_days = {(talon.doctor_id, talon.date) for talon in new_talons}
+            refresh_days(changed_days)
+            for doctor_id, talon_date in changed_days:
+                invalidate_day(doctor_id, talon_date)
+            for doctor_id in {talon.doctor_id for talon in new_talons}:
+                invalidate_doctor_pages(doctor_id)
+    return talons_created
+
+
+def generate_talons_for_schedules(
+        schedule_ids: Optional[Iterable[int]] = None,
+        clinic_id: Optional[int] = None,
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+        workers: int = 4,
+        chunk_size: int = 100,
+        pool: str = 'serial',
+) -> BatchGenerationResult:
+    """
+    Пакетная генерация талонов для множества графиков.
+    Графики выбираются по списку id и/или клинике и диапазону дат.
+
+    Работа делится по (врач, дата): нарезка слотов в DayGrid идет в текущем
+    потоке или, с pool='processes' (или 'threads'), в пуле из workers,
+    а запись - порциями по chunk_size врачо-дней, каждая порция в своей транзакции
+    """
+    if pool not in GENERATION_POOLS:
+        raise ValueError(f"Неизвестный пул {pool}, ожидается одно из: {', '.join(GENERATION_POOLS)}")
+    started = perf_counter()
+
+    schedules = Schedule.objects.all()
+    if schedule_ids is not None:
+        schedules = schedules.filter(id__in=list(schedule_ids))
+    if clinic_id is not None:
+        schedules = schedules.filter(clinic_id=clinic_id)
+    if date_from is not None:
+        schedules = schedules.filter(date__gte=date_from)
+    if date_to is not None:
+        schedules = schedules.filter(date__lte=date_to)
+
+    # Группируем графики по (врач, дата)
+    doctor_days = defaultdict(list)
+    schedule_count = 0
+    for row in schedules.values_list(
+            'doctor_id', 'date', 'start_time', 'end_time',
+            'start_break_time', 'end_break_time', 'doctor__duration'):
+        doctor_id, schedule_date = row[0], row[1]
+        doctor_days[(doctor_id, schedule_date)].append(row[2:])
+        schedule_count += 1
+
+    keys = list(doctor_days)
+    if pool == 'serial':
+        grids = {key: _build_doctor_day_grid(doctor_days[key]) for key in keys}
+    else:
+        executor_class = ProcessPoolExecutor if pool == 'processes' else ThreadPoolExecutor
+        with executor_class(max_workers=workers) as executor:
+            grids = dict(zip(
+                keys,
+                executor.map(_build_doctor_day_grid, [doctor_days[key] for key in keys], chunksize=16)
+            ))
+
+    talons_created = write_doctor_day_grids(grids, chunk_size)
+
+    return BatchGenerationResult(
+        schedules=schedule_count,
+        doctor_days=len(keys),
+        talons_created=talons_created,
+        seconds=perf_counter() - started,
+    )
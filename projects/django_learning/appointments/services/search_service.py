@@ -0,0 +1,116 @@
+# appointments/services/search_service.py
+"""
+Поиск ближайших свободных талонов клиники по всем врачам.
+
+У каждого врача свободные талоны уже отсортированы по (date, start_time)
+индексом talon_doctor_day_idx. Ленивые постраничные итераторы по врачам
+сливаются через heapq.merge, поэтому читается только столько строк,
+сколько нужно для первых K результатов, а не все талоны клиники.
+Слоты недельных шаблонов без талонов вливаются в то же слияние
+(talon_id у них None) и тоже читаются окнами по мере надобности
+"""
+import heapq
+from datetime import date, datetime, time, timedelta
+from itertools import islice
+from typing import Iterator, NamedTuple, Optional
+
+from django.db.models import Q
+from django.utils import timezone
+
+from ..models import Doctor, Talon
+from .template_grids import doctors_with_templates, iter_virtual_slots
+
+# Предел числа результатов поиска
+EARLIEST_MAX_LIMIT = 100
+# Предел размера страницы одного врача; страницы растут вдвое до этого размера
+DOCTOR_PAGE_MAX = 256
+# На сколько дней вперед искать слоты недельных шаблонов
+TEMPLATE_SEARCH_DAYS = 92
+
+
+class FreeSlot(NamedTuple):
+    """Свободный талон или слот шаблона (talon_id None) в порядке слияния: дата, время, врач"""
+    date: date
+    start_time: time
+    doctor_id: int
+    talon_id: Optional[int]
+    end_time: time
+
+
+def _merge_key(slot: FreeSlot) -> tuple[date, time, int]:
+    # Без talon_id: у слотов шаблонов он None и не сравнивается с int
+    return slot.date, slot.start_time, slot.doctor_id
+
+
+def iter_doctor_free_slots(doctor_id: int, after: datetime, first_page: int) -> Iterator[FreeSlot]:
+    """
+    Свободные талоны врача, начинающиеся не раньше after, по возрастанию.
+    Страницы читаются лениво keyset-запросами; следующая страница
+    запрашивается, только если слиянию не хватило текущей
+    """
+    last_date, last_time, last_id = after.date(), after.time(), None
+    page_size = first_page
+    while True:
+        talons = Talon.objects.filter(doctor_id=doctor_id, is_free=True)
+        if last_id is None:
+            # Первая страница: талон, начинающийся ровно в after, тоже подходит
+            keyset = Q(date__gt=last_date) | Q(date=last_date, start_time__gte=last_time)
+        else:
+            keyset = (
+                Q(date__gt=last_date)
+                | Q(date=last_date, start_time__gt=last_time)
+                | Q(date=last_date, start_time=last_time, id__gt=last_id)
+            )
+        rows = list(
+            talons.filter(keyset)
+            .order_by('date', 'start_time', 'id')
+            .values_list('date', 'start_time', 'id', 'end_time')[:page_size]
+        )
+        for talon_date, start_time, talon_id, end_time in rows:
+            yield FreeSlot(talon_date, start_time, doctor_id, talon_id, end_time)
+
+        if len(rows) < page_size:
+            return
+        last_date, last_time, last_id = rows[-1][0], rows[-1][1], rows[-1][2]
+        page_size = min(page_size * 2, DOCTOR_PAGE_MAX)
+
+
+def iter_doctor_template_slots(doctor_id: int, after: datetime) -> Iterator[FreeSlot]:
+    """
+    Слоты недельных шаблонов врача без талонов, начинающиеся не раньше after,
+    по возрастанию, в пределах TEMPLATE_SEARCH_DAYS дней. Окна по неделе
+    строятся лениво, как страницы талонов
+    """
+    first_day = after.date()
+    for _, _, slot_date, start_time, end_time in iter_virtual_slots(
+            first_day, first_day + timedelta(days=TEMPLATE_SEARCH_DAYS - 1), doctor_ids=[doctor_id]
+    ):
+        if slot_date > first_day or start_time >= after.time():
+            yield FreeSlot(slot_date, start_time, doctor_id, None, end_time)
+
+
+def earliest_free_slots(
+        clinic_id: int,
+        after: Optional[datetime] = None,
+        limit: int = 10,
+        doctor_ids: Optional[list[int]] = None,
+) -> list[FreeSlot]:
+    """
+    Первые limit свободных талонов и слотов шаблонов клиники, начинающихся
+    не раньше after. Первая страница каждого врача - около limit / число
+    врачей строк, поэтому объем чтения пропорционален limit, а не числу талонов.
+    Шаблоны читаются только у врачей, у которых они есть (один запрос)
+    """
+    if doctor_ids is None:
+        doctor_ids = list(Doctor.objects.filter(clinic_id=clinic_id).values_list('id', flat=True))
+    if not doctor_ids or limit <= 0:
+        return []
+
+    after = after or timezone.localtime().replace(tzinfo=None)
+    first_page = min(-(-limit // len(doctor_ids)) + 1, limit)
+    slots = [iter_doctor_free_slots(doctor_id, after, first_page) for doctor_id in doctor_ids]
+    slots.extend(
+        iter_doctor_template_slots(doctor_id, after)
+        for doctor_id in sorted(doctors_with_templates(doctor_ids, after.date()))
+    )
+    return list(islice(heapq.merge(*slots, key=_merge_key), limit))
@@ -0,0 +1,258 @@
+# appointments/services/stats_service.py
+"""
+Статистика загрузки врачей по дням (DoctorDayStats).
+
+Таблица ведется инкрементально: одиночные изменения талонов применяют
+дельты счетчиков через F(), пакетные - пересчитывают затронутые врачо-дни.
+Дашборды читают по строке на врачо-день вместо агрегации всех талонов.
+
+Слоты недельных шаблонов, у которых еще нет талонов, в таблице не хранятся:
+при чтении они добавляются к free и total из сеток шаблонов периода
+"""
+import heapq
+from collections import Counter
+from datetime import date
+from itertools import groupby
+from typing import Iterable, Optional
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+
+from ..models import ArchivedTalon, Doctor, DoctorDayStats, Talon
+from .template_grids import virtual_day_grids
+
+# Порция строк при пересчете статистики
+REBUILD_BATCH_SIZE = 1000
+
+STATS_FIELDS = ('free', 'booked', 'total')
+
+
+def apply_delta(doctor_id: int, day: date, free: int = 0, booked: int = 0, total: int = 0) -> None:
+    """
+    Прибавляет дельты к счетчикам врачо-дня одним UPDATE.
+    Если строки еще нет, создает пустую (с пропуском конфликта, на случай
+    параллельной вставки) и повторяет UPDATE
+    """
+    stats = DoctorDayStats.objects.filter(doctor_id=doctor_id, date=day)
+    changes = {'free': F('free') + free, 'booked': F('booked') + booked, 'total': F('total') + total}
+    if not stats.update(**changes):
+        DoctorDayStats.objects.bulk_create(
+            [DoctorDayStats(doctor_id=doctor_id, date=day)],
+            ignore_conflicts=True
+        )
+        stats.update(**changes)
+
+
+def apply_state_changes(talons: Iterable[Talon], is_free: bool) -> None:
+    """Дельты для талонов, перешедших в состояние is_free, по врачо-дням"""
+    sign = 1 if is_free else -1
+    for (doctor_id, day), count in Counter((talon.doctor_id, talon.date) for talon in talons).items():
+        apply_delta(doctor_id, day, free=sign * count, booked=-sign * count)
+
+
+def refresh_days(days: Iterable[tuple[int, date]]) -> None:
+    """
+    Пересчитывает статистику заданных врачо-дней по талонам и архиву: по запросу
+    агрегации на таблицу и один INSERT ... ON CONFLICT DO UPDATE. Используется после
+    bulk_create, где число реально вставленных строк неизвестно.
+
+    Абсолютные счетчики перезаписали бы дельту параллельного бронирования,
+    сделанную между подсчетом и записью, поэтому строки статистики сначала
+    блокируются (в порядке ключа - без взаимных блокировок), а талоны
+    считаются уже под блокировкой: чужая дельта либо попала в подсчет,
+    либо применится после нашей записи
+    """
+    days = set(days)
+    if not days:
+        return
+
+    doctor_ids = {doctor_id for doctor_id, _ in days}
+    dates = {day for _, day in days}
+    with transaction.atomic():
+        list(
+            DoctorDayStats.objects.select_for_update()
+            .filter(doctor_id__in=doctor_ids, date__in=dates)
+            .order_by('doctor_id', 'date')
+            .values_list('id', flat=True)
+        )
+
+        # Прошедшие дни могут быть уже частично или полностью в архиве
+        counts = Counter()
+        for talons in (Talon.objects.all(), ArchivedTalon.objects.all()):
+            for row in talons.filter(
+                    doctor_id__in=doctor_ids,
+                    date__in=dates,
+            ).values('doctor_id', 'date').annotate(
+                total_count=Count('id'),
+                free_count=Count('id', filter=Q(is_free=True)),
+            ).order_by():
+                counts[(row['doctor_id'], row['date'], 'free')] += row['free_count']
+                counts[(row['doctor_id'], row['date'], 'total')] += row['total_count']
+
+        stats = []
+        for doctor_id, day in days:
+            free, total = counts[(doctor_id, day, 'free')], counts[(doctor_id, day, 'total')]
+            stats.append(DoctorDayStats(doctor_id=doctor_id, date=day, free=free, booked=total - free, total=total))
+
+        DoctorDayStats.objects.bulk_create(
+            stats,
+            update_conflicts=True,
+            unique_fields=['doctor', 'date'],
+            update_fields=list(STATS_FIELDS),
+        )
+
+
+def discard_talon(talon: Talon) -> None:
+    """
+    Вычитает удаленный талон из счетчиков его врачо-дня. Строку не создает:
+    при каскадном удалении врача статистика может быть удалена раньше талонов
+    """
+    DoctorDayStats.objects.filter(doctor_id=talon.doctor_id, date=talon.date).update(
+        free=F('free') - int(talon.is_free),
+        booked=F('booked') - int(not talon.is_free),
+        total=F('total') - 1,
+    )
+
+
+def _day_counts(talons, batch_size: int):
+    """(doctor_id, date, free, total) по врачо-дням, по возрастанию врача и даты"""
+    return talons.values('doctor_id', 'date').annotate(
+        free_count=Count('id', filter=Q(is_free=True)),
+        total_count=Count('id'),
+    ).order_by('doctor_id', 'date').values_list(
+        'doctor_id', 'date', 'free_count', 'total_count'
+    ).iterator(chunk_size=batch_size)
+
+
+def rebuild_stats(
+        clinic_id: Optional[int] = None,
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+        batch_size: int = REBUILD_BATCH_SIZE,
+) -> int:
+    """
+    Пересчитывает статистику с нуля по всем талонам (или клиники / периода)
+    в одной транзакции. Прошедшие дни считаются и по архиву: агрегаты
+    Talon и ArchivedTalon сливаются как отсортированные потоки.
+    Возвращает число записанных врачо-дней
+    """
+    sources = [Talon.objects.all(), ArchivedTalon.objects.all()]
+    stats = DoctorDayStats.objects.all()
+    if clinic_id is not None:
+        sources = [talons.filter(doctor__clinic_id=clinic_id) for talons in sources]
+        stats = stats.filter(doctor__clinic_id=clinic_id)
+    if date_from is not None:
+        sources = [talons.filter(date__gte=date_from) for talons in sources]
+        stats = stats.filter(date__gte=date_from)
+    if date_to is not None:
+        sources = [talons.filter(date__lte=date_to) for talons in sources]
+        stats = stats.filter(date__lte=date_to)
+
+    written = 0
+    with transaction.atomic():
+        stats.delete()
+        batch = []
+        merged = heapq.merge(*(_day_counts(talons, batch_size) for talons in sources))
+        for (doctor_id, day), rows in groupby(merged, key=lambda row: row[:2]):
+            free = total = 0
+            for _, _, row_free, row_total in rows:
+                free += row_free
+                total += row_total
+            batch.append(DoctorDayStats(doctor_id=doctor_id, date=day, free=free, booked=total - free, total=total))
+            if len(batch) == batch_size:
+                written += len(DoctorDayStats.objects.bulk_create(batch))
+                batch = []
+        written += len(DoctorDayStats.objects.bulk_create(batch))
+    return written
+
+
+def _utilization(booked: int, total: int) -> float:
+    return round(booked / total, 4) if total else 0.0
+
+
+def _virtual_counts(
+        date_from: date,
+        date_to: date,
+        doctor_id: Optional[int],
+        clinic_id: Optional[int],
+) -> dict[tuple[int, date], int]:
+    """Число слотов шаблонов без талонов по врачо-дням периода"""
+    grids = virtual_day_grids(
+        date_from, date_to,
+        doctor_ids=[doctor_id] if doctor_id is not None else None,
+        clinic_id=clinic_id,
+    )
+    return {key: len(grid) for key, grid in grids.items()}
+
+
+def get_doctor_day_stats(
+        date_from: date,
+        date_to: date,
+        doctor_id: Optional[int] = None,
+        clinic_id: Optional[int] = None,
+) -> list[dict]:
+    """
+    Строки статистики за период по врачу или клинике, с долей занятых.
+    Слоты шаблонов считаются свободными; дни только с ними получают свою строку
+    """
+    stats = DoctorDayStats.objects.filter(date__range=(date_from, date_to))
+    if doctor_id is not None:
+        stats = stats.filter(doctor_id=doctor_id)
+    if clinic_id is not None:
+        stats = stats.filter(doctor__clinic_id=clinic_id)
+
+    rows = {
+        (row['doctor_id'], row['date']): row
+        for row in stats.values('doctor_id', 'date', *STATS_FIELDS)
+    }
+    for key, count in _virtual_counts(date_from, date_to, doctor_id, clinic_id).items():
+        row = rows.setdefault(key, {'doctor_id': key[0], 'date': key[1], 'free': 0, 'booked': 0, 'total': 0})
+        row['free'] += count
+        row['total'] += count
+
+    rows = [rows[key] for key in sorted(rows)]
+    for row in rows:
+        row['utilization'] = _utilization(row['booked'], row['total'])
+    return rows
+
+
+def get_doctor_totals(
+        date_from: date,
+        date_to: date,
+        doctor_id: Optional[int] = None,
+        clinic_id: Optional[int] = None,
+) -> list[dict]:
+    """
+    Итоги по каждому врачу за период - агрегат по строкам статистики
+    плюс слоты шаблонов без талонов (как свободные)
+    """
+    stats = DoctorDayStats.objects.filter(date__range=(date_from, date_to))
+    if doctor_id is not None:
+        stats = stats.filter(doctor_id=doctor_id)
+    if clinic_id is not None:
+        stats = stats.filter(doctor__clinic_id=clinic_id)
+
+    rows = {
+        row['doctor_id']: row
+        for row in stats.values('doctor_id', full_name=F('doctor__full_name'))
+        .annotate(free=Sum('free'), booked=Sum('booked'), total=Sum('total'))
+        .order_by()
+    }
+    virtual = Counter()
+    for (virtual_doctor_id, _), count in _virtual_counts(date_from, date_to, doctor_id, clinic_id).items():
+        virtual[virtual_doctor_id] += count
+    # Имена врачей, у которых за период есть только слоты шаблонов
+    missing = [key for key in virtual if key not in rows]
+    names = dict(Doctor.objects.filter(id__in=missing).values_list('id', 'full_name')) if missing else {}
+    for virtual_doctor_id, count in virtual.items():
+        row = rows.setdefault(virtual_doctor_id, {
+            'doctor_id': virtual_doctor_id, 'full_name': names.get(virtual_doctor_id),
+            'free': 0, 'booked': 0, 'total': 0,
+        })
+        row['free'] += count
+        row['total'] += count
+
+    rows = [rows[key] for key in sorted(rows)]
+    for row in rows:
+        row['utilization'] = _utilization(row['booked'], row['total'])
+    return rows
@@ -0,0 +1,77 @@
+# appointments/services/streaming.py
+import csv
+import json
+import zlib
+from datetime import date, time
+from io import StringIO
+from itertools import islice
+from typing import Iterable, Iterator, Sequence
+
+# Компактный JSON без пробелов
+_encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+
+
+def compact_value(value):
+    """Дата - YYYY-MM-DD, время - HH:MM, остальное как есть"""
+    if isinstance(value, time):
+        return value.strftime('%H:%M')
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+def iter_ndjson(rows: Iterable[Sequence], columns: Sequence[str]) -> Iterator[str]:
+    """Построчный JSON: по одному объекту на строку"""
+    for row in rows:
+        yield _encoder.encode(dict(zip(columns, map(compact_value, row)))) + '\n'
+
+
+def iter_columnar(rows: Iterable[Sequence], columns: Sequence[str], chunk_size: int) -> Iterator[str]:
+    """
+    Колоночный JSON, выдаваемый порциями:
+    {"columns": [...], "chunks": [{"id": [...], "date": [...]}, ...]}.
+    В памяти держится только одна порция из chunk_size строк
+    """
+    yield '{"columns":' + _encoder.encode(list(columns)) + ',"chunks":['
+    rows = iter(rows)
+    first = True
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        columns_data = {
+            name: [compact_value(value) for value in values]
+            for name, values in zip(columns, zip(*chunk))
+        }
+        yield ('' if first else ',') + _encoder.encode(columns_data)
+        first = False
+    yield ']}\n'
+
+
+def iter_csv(rows: Iterable[Sequence], columns: Sequence[str], chunk_size: int = 1000) -> Iterator[str]:
+    """CSV с заголовком, выдаваемый порциями по chunk_size строк"""
+    buffer = StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow(columns)
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        writer.writerows([compact_value(value) for value in row] for row in chunk)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def iter_gzip(chunks: Iterable[str], level: int = 6) -> Iterator[bytes]:
+    """Сжимает поток строк в gzip на лету, не собирая его целиком"""
+    # 16 + MAX_WBITS - заголовок и контрольная сумма формата gzip
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
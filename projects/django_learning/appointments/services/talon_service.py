@@ -1,33 +1,356 @@
 # appointments/services/talon_service.py
-from django.db import transaction
+import asyncio
+import random
+from dataclasses import dataclass
+from time import sleep
+from datetime import date, time
+from typing import Iterable, List, Optional
+from asgiref.sync import sync_to_async
+from django.db import connections, router, transaction
+from django.db.models import BooleanField, F, Q, Value
 from django.core.exceptions import ValidationError
-from ..models import Talon
+from ..models import ArchivedTalon, Talon
+from .availability_cache import invalidate_day
+from .page_cache import invalidate_doctor_pages
+from .read_models import TalonRow, make_rows
+from .stats_service import apply_delta, apply_state_changes
+
+# Сколько раз повторять оптимистичное изменение талона при конфликте версий
+OPTIMISTIC_RETRIES = 5
+# Базовая пауза перед повтором, секунд; растет вдвое с каждой попыткой, со случайным разбросом
+OPTIMISTIC_BACKOFF = 0.005
+
+# Строк в одном INSERT ... RETURNING (число параметров запроса ограничено)
+INSERT_BATCH_SIZE = 500
+
+# Размер страницы списков талонов по умолчанию
+TALONS_PAGE_SIZE = 50
+
+# Колонки строк списка талонов (TalonRow) в порядке его __init__
+TALON_ROW_FIELDS = (*TalonRow.columns, 'doctor_full_name', 'archived')
+
+
+def _invalidate_talon_caches(doctor_id: int, talon_date: date) -> None:
+    """UPDATE не шлет сигналов, поэтому кэши доступности и страниц сбрасываем сами"""
+    invalidate_day(doctor_id, talon_date)
+    invalidate_doctor_pages(doctor_id)
+
+
+# Сброс кэшей обращается к соединению БД (on_commit), поэтому из async - через поток
+_ainvalidate_talon_caches = sync_to_async(_invalidate_talon_caches)
+
+
+def _book_free_talons(talon_ids: List[int]) -> List[Talon]:
+    """
+    UPDATE ... SET is_free = false WHERE id IN (...) AND is_free RETURNING *:
+    бронирует свободные из talon_ids и возвращает их одним запросом.
+    У .update() нет RETURNING, поэтому запрос собирается вручную
+    """
+    alias = router.db_for_write(Talon)
+    quote = connections[alias].ops.quote_name
+    is_free = quote(Talon._meta.get_field('is_free').column)
+    version = quote(Talon._meta.get_field('version').column)
+    sql = (
+        f"UPDATE {quote(Talon._meta.db_table)} SET {is_free} = %s, {version} = {version} + 1 "
+        f"WHERE {quote(Talon._meta.pk.column)} IN ({', '.join(['%s'] * len(talon_ids))}) AND {is_free} = %s "
+        f"RETURNING *"
+    )
+    return list(Talon.objects.db_manager(alias).raw(sql, [False, *talon_ids, True]))
+
+
+def book_talons(talon_ids: Iterable[int]) -> List[Talon]:
+    """
+    Забронировать несколько талонов атомарно: либо все, либо ни одного.
+    Без блокировок строк - один условный UPDATE ... WHERE id IN (...) AND is_free
+    с RETURNING: успех определяется по числу обновленных строк, и они же
+    возвращаются без повторного чтения
+    """
+    talon_ids = list(dict.fromkeys(talon_ids))
+    if not talon_ids:
+        # WHERE id IN () - синтаксическая ошибка в PostgreSQL
+        return []
+
+    with transaction.atomic():
+        talons = _book_free_talons(talon_ids)
+
+        if len(talons) != len(talon_ids):
+            # Выясняем причину; исключение откатит уже обновленные строки
+            found_ids = set(Talon.objects.filter(id__in=talon_ids).values_list('id', flat=True))
+            missing_ids = [talon_id for talon_id in talon_ids if talon_id not in found_ids]
+            if missing_ids:
+                raise ValueError(f"Талоны с id {', '.join(map(str, missing_ids))} не найдены")
+            raise ValidationError("Талон уже забронирован")
+
+        apply_state_changes(talons, is_free=False)
+        for doctor_id, talon_date in {(talon.doctor_id, talon.date) for talon in talons}:
+            _invalidate_talon_caches(doctor_id, talon_date)
+
+    # RETURNING не гарантирует порядок строк - возвращаем в порядке talon_ids
+    positions = {talon_id: position for position, talon_id in enumerate(talon_ids)}
+    talons.sort(key=lambda talon: positions[talon.id])
+    return talons
 
 
 def book_talon(talon_id: int) -> Talon:
     """Забронировать талон"""
     try:
-        with transaction.atomic():
-            talon = Talon.objects.select_for_update().get(id=talon_id)
+        return book_talons([talon_id])[0]
+    except ValueError:
+        raise ValueError(f"Талон с id {talon_id} не найден")
 
-            if not talon.is_free:
-                raise ValidationError(f"Талон уже забронирован")
 
-            talon.is_free = False
-            talon.save()
+async def abook_talon(talon_id: int) -> Talon:
+    """
+    Асинхронно забронировать талон: тот же UPDATE ... RETURNING, что в book_talon,
+    и дельта статистики в одной транзакции - в потоке sync_to_async
+    """
+    return await _abook_talon(talon_id)
 
-            return talon
-    except Talon.DoesNotExist:
-        raise ValueError(f"Талон с id {talon_id} не найден")
+
+def _backoff_delay(attempt: int) -> float:
+    return random.uniform(0, OPTIMISTIC_BACKOFF * 2 ** attempt)
+
+
+def _compare_and_swap(talon: Talon, **changes) -> bool:
+    """
+    UPDATE ... WHERE id = ? AND version = ?: изменения применяются, только если
+    с момента чтения талон никто не менял. При успехе обновляет и сам объект
+    """
+    updated = Talon.objects.filter(id=talon.id, version=talon.version).update(
+        version=F('version') + 1,
+        **changes
+    )
+    if updated:
+        talon.version += 1
+        for name, value in changes.items():
+            setattr(talon, name, value)
+    return bool(updated)
+
+
+def _swap_state(talon: Talon, is_free: bool) -> bool:
+    """Compare-and-swap is_free и дельта статистики врачо-дня в одной транзакции"""
+    with transaction.atomic():
+        if _compare_and_swap(talon, is_free=is_free):
+            apply_state_changes([talon], is_free=is_free)
+            return True
+    return False
+
+
+def _change_talon_state(talon_id: int, is_free: bool) -> tuple[Talon, bool]:
+    """
+    Оптимистично меняет is_free без блокировок: читает талон с версией и
+    делает compare-and-swap, при конфликте повторяет с паузой.
+    Статистика врачо-дня меняется в одной транзакции с талоном.
+    Возвращает талон и признак, что состояние действительно изменилось
+    """
+    for attempt in range(OPTIMISTIC_RETRIES):
+        try:
+            talon = Talon.objects.get(id=talon_id)
+        except Talon.DoesNotExist:
+            raise ValueError(f"Талон с id {talon_id} не найден")
+
+        if talon.is_free == is_free:
+            return talon, False
+        if _swap_state(talon, is_free):
+            return talon, True
+
+        sleep(_backoff_delay(attempt))
+
+    raise ValidationError("Талон одновременно изменяется другим запросом, попробуйте еще раз")
 
 
 def cancel_talon(talon_id: int) -> Talon:
     """Отменить бронирование талона (сделать свободным)"""
-    try:
-        with transaction.atomic():
-            talon = Talon.objects.select_for_update().get(id=talon_id)
-            talon.is_free = True
-            talon.save()
+    talon, changed = _change_talon_state(talon_id, is_free=True)
+    if changed:
+        _invalidate_talon_caches(talon.doctor_id, talon.date)
+    return talon
+
+
+async def acancel_talon(talon_id: int) -> Talon:
+    """
+    Асинхронно отменить бронирование талона, с той же оптимистичной схемой:
+    CAS и статистика - одна транзакция в потоке, пауза между попытками - в event loop
+    """
+    for attempt in range(OPTIMISTIC_RETRIES):
+        try:
+            talon = await Talon.objects.aget(id=talon_id)
+        except Talon.DoesNotExist:
+            raise ValueError(f"Талон с id {talon_id} не найден")
+
+        if talon.is_free:
+            return talon
+        if await _aswap_state(talon, is_free=True):
+            await _ainvalidate_talon_caches(talon.doctor_id, talon.date)
             return talon
-    except Talon.DoesNotExist:
-        raise ValueError(f"Талон с id {talon_id} не найден")
\ No newline at end of file
+
+        await asyncio.sleep(_backoff_delay(attempt))
+
+    raise ValidationError("Талон одновременно изменяется другим запросом, попробуйте еще раз")
+
+
+# Транзакции с ORM выполняются только в синхронном коде
+_abook_talon = sync_to_async(book_talon)
+_aswap_state = sync_to_async(_swap_state)
+
+
+def create_talon(doctor_id: int, talon_date: date, start_time: time, end_time: time) -> Talon:
+    """Создать свободный талон вручную"""
+    with transaction.atomic():
+        talon = Talon.objects.create(
+            doctor_id=doctor_id,
+            date=talon_date,
+            start_time=start_time,
+            end_time=end_time,
+            is_free=True
+        )
+        apply_delta(doctor_id, talon_date, free=1, total=1)
+        invalidate_day(doctor_id, talon_date)
+    return talon
+
+
+def insert_talons(talons: List[Talon], batch_size: int = INSERT_BATCH_SIZE) -> List[Talon]:
+    """
+    Вставляет талоны INSERT ... ON CONFLICT DO NOTHING RETURNING * и
+    возвращает только реально вставленные строки (с id). bulk_create с
+    ignore_conflicts возвращает все переданные объекты без pk, поэтому
+    по нему не видно, сколько строк отсек конфликт с параллельной вставкой
+    """
+    alias = router.db_for_write(Talon)
+    connection = connections[alias]
+    quote = connection.ops.quote_name
+    fields = [field for field in Talon._meta.concrete_fields if not field.primary_key]
+    columns = ', '.join(quote(field.column) for field in fields)
+    row_sql = '(' + ', '.join(['%s'] * len(fields)) + ')'
+
+    created = []
+    for offset in range(0, len(talons), batch_size):
+        batch = talons[offset:offset + batch_size]
+        # Как и в _book_free_talons, RETURNING читается через raw(): строки сразу становятся Talon
+        created.extend(Talon.objects.db_manager(alias).raw(
+            f"INSERT INTO {quote(Talon._meta.db_table)} ({columns}) "
+            f"VALUES {', '.join([row_sql] * len(batch))} "
+            f"ON CONFLICT DO NOTHING RETURNING *",
+            [field.get_db_prep_save(getattr(talon, field.attname), connection) for talon in batch for field in fields]
+        ))
+    return created
+
+
+@dataclass
+class TalonPage:
+    """Страница талонов и курсор следующей страницы"""
+    talons: list
+    next_cursor: Optional[str] = None
+
+
+def encode_cursor(talon_date: date, start_time: time, talon_id: int) -> str:
+    """Курсор - ключ сортировки последнего талона страницы"""
+    return f"{talon_date.isoformat()}_{start_time.isoformat()}_{talon_id}"
+
+
+def decode_cursor(cursor: str) -> tuple[date, time, int]:
+    """Разбирает курсор, при неверном формате - ValueError"""
+    date_str, time_str, id_str = cursor.split('_')
+    return date.fromisoformat(date_str), time.fromisoformat(time_str), int(id_str)
+
+
+def _filter_talons_page(
+        talons,
+        doctor_id: Optional[int],
+        date_from: Optional[date],
+        date_to: Optional[date],
+        is_free: Optional[bool],
+        cursor: Optional[str],
+):
+    """Фильтры и keyset-условие страницы; общие для Talon и ArchivedTalon"""
+    if doctor_id is not None:
+        talons = talons.filter(doctor_id=doctor_id)
+    if date_from is not None:
+        talons = talons.filter(date__gte=date_from)
+    if date_to is not None:
+        talons = talons.filter(date__lte=date_to)
+    if is_free is not None:
+        talons = talons.filter(is_free=is_free)
+
+    if cursor:
+        last_date, last_start_time, last_id = decode_cursor(cursor)
+        talons = talons.filter(
+            Q(date__gt=last_date)
+            | Q(date=last_date, start_time__gt=last_start_time)
+            | Q(date=last_date, start_time=last_start_time, id__gt=last_id)
+        )
+    return talons
+
+
+def _talons_page_queryset(
+        doctor_id: Optional[int],
+        date_from: Optional[date],
+        date_to: Optional[date],
+        is_free: Optional[bool],
+        cursor: Optional[str],
+        limit: int,
+        include_archived: bool = False,
+):
+    """Запрос страницы талонов (limit + 1 кортеж колонок TalonRow) без обращения к БД"""
+    filters = (doctor_id, date_from, date_to, is_free, cursor)
+    talons = _filter_talons_page(Talon.objects.all(), *filters).annotate(
+        doctor_full_name=F('doctor__full_name'),
+        archived=Value(False, BooleanField()),
+    ).values_list(*TALON_ROW_FIELDS)
+
+    if include_archived:
+        # Архив подмешивается объединением запросов с теми же колонками
+        archived = _filter_talons_page(ArchivedTalon.objects.all(), *filters).annotate(
+            doctor_full_name=F('doctor__full_name'),
+            archived=Value(True, BooleanField()),
+        ).values_list(*TALON_ROW_FIELDS)
+        talons = talons.union(archived, all=True)
+
+    talons = talons.order_by('date', 'start_time', 'id')
+
+    # Берем на одну строку больше, чтобы узнать, есть ли следующая страница
+    return talons[:limit + 1]
+
+
+def _make_talons_page(rows: list, limit: int) -> TalonPage:
+    talons = make_rows(rows[:limit], TalonRow)
+    next_cursor = None
+    if len(rows) > limit:
+        last = talons[-1]
+        next_cursor = encode_cursor(last.date, last.start_time, last.id)
+
+    return TalonPage(talons=talons, next_cursor=next_cursor)
+
+
+def get_talons_page(
+        doctor_id: Optional[int] = None,
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+        is_free: Optional[bool] = None,
+        cursor: Optional[str] = None,
+        limit: int = TALONS_PAGE_SIZE,
+        include_archived: bool = False,
+) -> TalonPage:
+    """
+    Страница талонов в порядке (date, start_time, id) с keyset-пагинацией:
+    вместо OFFSET фильтруем по ключу последней строки предыдущей страницы,
+    поэтому глубокие страницы читаются по индексу так же быстро, как первая.
+    Строки - TalonRow из values_list(), без экземпляров модели.
+    include_archived=True добавляет талоны из архива (с archived=True)
+    """
+    talons = _talons_page_queryset(doctor_id, date_from, date_to, is_free, cursor, limit, include_archived)
+    return _make_talons_page(list(talons), limit)
+
+
+async def aget_talons_page(
+        doctor_id: Optional[int] = None,
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+        is_free: Optional[bool] = None,
+        cursor: Optional[str] = None,
+        limit: int = TALONS_PAGE_SIZE,
+        include_archived: bool = False,
+) -> TalonPage:
+    """Асинхронная версия get_talons_page"""
+    talons = _talons_page_queryset(doctor_id, date_from, date_to, is_free, cursor, limit, include_archived)
+    return _make_talons_page([talon async for talon in talons], limit)
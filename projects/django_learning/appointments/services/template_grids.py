@@ -0,0 +1,139 @@
+# appointments/services/template_grids.py
+"""
+Сетки слотов недельных шаблонов (WeeklyTemplate) по врачо-дням.
+
+Только чтение, без кэша и без записи талонов: эти функции нужны
+статистике и поиску ближайших слотов, от которых зависит template_service,
+поэтому они вынесены в отдельный модуль
+"""
+from collections import defaultdict
+from datetime import date, time, timedelta
+from typing import Iterable, Iterator, Optional
+
+from django.db.models import Q
+
+from ..models import ArchivedTalon, Schedule, Talon, WeeklyTemplate
+from .day_grid import DayGrid, from_minutes, to_minutes
+from .interval_index import IntervalIndex
+
+# Сколько дней шаблонов строить за раз при потоковой выдаче слотов
+TEMPLATE_WINDOW_DAYS = 7
+
+
+def build_template_grids(
+        date_from: date,
+        date_to: date,
+        doctor_ids: Optional[Iterable[int]] = None,
+        clinic_id: Optional[int] = None,
+) -> dict[tuple[int, date], DayGrid]:
+    """
+    Сетки слотов по шаблонам для каждого врачо-дня периода.
+    Два запроса на весь период: шаблоны и дни с обычными графиками
+    """
+    templates = WeeklyTemplate.objects.filter(valid_from__lte=date_to).filter(
+        Q(valid_to__isnull=True) | Q(valid_to__gte=date_from)
+    )
+    schedules = Schedule.objects.filter(date__range=(date_from, date_to))
+    if doctor_ids is not None:
+        doctor_ids = list(doctor_ids)
+        templates = templates.filter(doctor_id__in=doctor_ids)
+        schedules = schedules.filter(doctor_id__in=doctor_ids)
+    if clinic_id is not None:
+        templates = templates.filter(clinic_id=clinic_id)
+        schedules = schedules.filter(clinic_id=clinic_id)
+
+    templates_by_weekday = defaultdict(list)
+    for row in templates.values_list(
+            'weekday', 'doctor_id', 'valid_from', 'valid_to', 'start_time', 'end_time',
+            'start_break_time', 'end_break_time', 'doctor__duration'):
+        templates_by_weekday[row[0]].append(row[1:])
+    if not templates_by_weekday:
+        return {}
+
+    scheduled_days = set(schedules.values_list('doctor_id', 'date'))
+
+    day_grids = defaultdict(list)
+    day = date_from
+    while day <= date_to:
+        for doctor_id, valid_from, valid_to, *hours in templates_by_weekday.get(day.weekday(), ()):
+            if valid_from <= day and (valid_to is None or day <= valid_to) \
+                    and (doctor_id, day) not in scheduled_days:
+                day_grids[(doctor_id, day)].append(DayGrid.from_schedule(*hours))
+        day += timedelta(days=1)
+
+    return {key: DayGrid.union(grids) for key, grids in day_grids.items()}
+
+
+def virtual_day_grids(
+        date_from: date,
+        date_to: date,
+        doctor_ids: Optional[Iterable[int]] = None,
+        clinic_id: Optional[int] = None,
+) -> dict[tuple[int, date], DayGrid]:
+    """
+    Виртуальные слоты периода: слоты шаблонов, для которых еще нет талона
+    и которые не пересекаются ни с одним талоном дня (горячим или архивным).
+    Врачо-дни без таких слотов не попадают в результат. Три запроса на период
+    """
+    grids = build_template_grids(date_from, date_to, doctor_ids=doctor_ids, clinic_id=clinic_id)
+    if not grids:
+        return {}
+
+    fields = ('doctor_id', 'date', 'start_time', 'end_time')
+    template_doctor_ids = {doctor_id for doctor_id, _ in grids}
+    template_dates = {day for _, day in grids}
+    taken = defaultdict(list)
+    for doctor_id, day, start_time, end_time in Talon.objects.filter(
+            doctor_id__in=template_doctor_ids, date__in=template_dates,
+    ).values_list(*fields).union(
+        ArchivedTalon.objects.filter(
+            doctor_id__in=template_doctor_ids, date__in=template_dates,
+        ).values_list(*fields),
+        all=True,
+    ):
+        taken[(doctor_id, day)].append((to_minutes(start_time), to_minutes(end_time)))
+
+    virtual = {}
+    for key, grid in grids.items():
+        free = grid.without(IntervalIndex(taken.get(key, ())))
+        if len(free):
+            virtual[key] = free
+    return virtual
+
+
+def iter_virtual_slots(
+        date_from: date,
+        date_to: date,
+        doctor_ids: Optional[Iterable[int]] = None,
+        clinic_id: Optional[int] = None,
+        window_days: int = TEMPLATE_WINDOW_DAYS,
+) -> Iterator[tuple[None, int, date, time, time]]:
+    """
+    Виртуальные слоты периода строками (None, doctor_id, date, start_time, end_time)
+    по возрастанию (date, start_time, doctor_id) - как строки талонов без id.
+    Период читается окнами по window_days дней, следующее окно - только
+    когда потребитель дочитал текущее
+    """
+    doctor_ids = list(doctor_ids) if doctor_ids is not None else None
+    window_from = date_from
+    while window_from <= date_to:
+        window_to = min(window_from + timedelta(days=window_days - 1), date_to)
+        grids = virtual_day_grids(window_from, window_to, doctor_ids=doctor_ids, clinic_id=clinic_id)
+        slots = sorted(
+            (day, start, doctor_id, end)
+            for (doctor_id, day), grid in grids.items()
+            for start, end in zip(grid.starts, grid.ends)
+        )
+        for day, start, doctor_id, end in slots:
+            yield None, doctor_id, day, from_minutes(start), from_minutes(end)
+        window_from = window_to + timedelta(days=1)
+
+
+def doctors_with_templates(doctor_ids: Iterable[int], day: date) -> set[int]:
+    """Врачи из doctor_ids, у которых есть шаблон, действующий на day или позже"""
+    return set(
+        WeeklyTemplate.objects.filter(doctor_id__in=list(doctor_ids))
+        .filter(Q(valid_to__isnull=True) | Q(valid_to__gte=day))
+        .values_list('doctor_id', flat=True)
+        .distinct()
+    )
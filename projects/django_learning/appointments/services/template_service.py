@@ -0,0 +1,150 @@
+# appointments/services/template_service.py
+"""
+Недельные шаблоны графиков (WeeklyTemplate) с ленивыми талонами.
+
+Свободные слоты по шаблону вычисляются на лету в DayGrid и не хранятся.
+Талон создается, только когда слот бронируют (materialize_slot) или когда
+талоны на период запрашивают явно (materialize_templates).
+На даты, где у врача есть обычный Schedule, шаблон не действует.
+
+Виртуальные слоты (id null) отдают доступность врача, API доступности,
+поиск ближайших слотов и статистика загрузки (см. template_grids)
+"""
+from datetime import date, time
+from time import perf_counter
+from typing import Optional
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from ..models import Talon, WeeklyTemplate
+from .availability_cache import AVAILABILITY_TIMEOUT, get_day_availability, invalidate_day
+from .cache_versions import bump_version_on_commit, get_version
+from .day_grid import DayGrid, from_minutes, to_minutes
+from .interval_index import IntervalIndex
+from .schedule_service import BatchGenerationResult, write_doctor_day_grids
+from .stats_service import apply_delta
+from .talon_service import book_talon
+from .template_grids import build_template_grids
+
+
+def template_scope(doctor_id: int) -> str:
+    """Область версии сеток шаблонов врача: меняется с его шаблонами и графиками"""
+    return f"templates:{doctor_id}"
+
+
+def invalidate_templates(doctor_id: int) -> None:
+    bump_version_on_commit(template_scope(doctor_id))
+
+
+def create_weekly_template(**fields) -> WeeklyTemplate:
+    """
+    Создать недельный шаблон. Часы и перерыв проверяются до записи
+    (ValidationError); кэш сеток врача сбрасывает сигнал сохранения
+    """
+    template = WeeklyTemplate(**fields)
+    template.full_clean()
+    template.save()
+    return template
+
+
+def get_template_grid(doctor_id: int, day: date) -> DayGrid:
+    """
+    Сетка шаблона врача на дату из кэша (пустая, если шаблон не действует).
+    Ключ содержит версию шаблонов врача, как ключи кэша доступности
+    """
+    key = f"templates:data:{doctor_id}:{day.isoformat()}:v{get_version(template_scope(doctor_id))}"
+    grid = cache.get(key)
+    if grid is None:
+        grid = build_template_grids(day, day, doctor_ids=[doctor_id]).get((doctor_id, day), DayGrid())
+        cache.set(key, grid, AVAILABILITY_TIMEOUT)
+    return grid
+
+
+def get_virtual_slots(doctor_id: int, day: date) -> DayGrid:
+    """
+    Слоты шаблона на дату, для которых еще нет талонов и которые с ними
+    не пересекаются. Сетка шаблона и талоны дня берутся из кэша
+    """
+    grid = get_template_grid(doctor_id, day)
+    if not len(grid):
+        return grid
+    return grid.without(get_day_availability(doctor_id, day).interval_index())
+
+
+def get_day_slots(doctor_id: int, day: date) -> list[tuple[Optional[int], time, time]]:
+    """
+    Свободные слоты врача на дату: талоны из кэша доступности и слоты
+    шаблона (у них id None), по времени начала
+    """
+    slots = list(get_day_availability(doctor_id, day).free_slots())
+    slots.extend((None, start_time, end_time) for start_time, end_time in get_virtual_slots(doctor_id, day).slots())
+    slots.sort(key=lambda slot: slot[1])
+    return slots
+
+
+def materialize_slot(doctor_id: int, day: date, start_time: time) -> Talon:
+    """Создает свободный талон для слота шаблона (или возвращает уже созданный)"""
+    grid = build_template_grids(day, day, doctor_ids=[doctor_id]).get((doctor_id, day))
+    if grid is None:
+        raise ValueError(f"У врача с id {doctor_id} нет шаблона на {day.isoformat()}")
+
+    start = to_minutes(start_time)
+    try:
+        position = list(grid.starts).index(start)
+    except ValueError:
+        raise ValueError(f"Слот {start_time:%H:%M} не найден в шаблоне врача")
+    start_time, end_time = from_minutes(start), from_minutes(grid.ends[position])
+
+    with transaction.atomic():
+        day_talons = list(Talon.objects.filter(doctor_id=doctor_id, date=day).values_list(
+            'id', 'start_time', 'end_time'
+        ))
+        for talon_id, talon_start, talon_end in day_talons:
+            if (talon_start, talon_end) == (start_time, end_time):
+                return Talon.objects.get(id=talon_id)
+        if IntervalIndex(
+                (to_minutes(talon_start), to_minutes(talon_end)) for _, talon_start, talon_end in day_talons
+        ).overlaps(start, to_minutes(end_time)):
+            raise ValidationError("Слот пересекается с существующим талоном")
+
+        # get_or_create переживает параллельное создание того же слота
+        talon, created = Talon.objects.get_or_create(
+            doctor_id=doctor_id,
+            date=day,
+            start_time=start_time,
+            end_time=end_time,
+            defaults={'is_free': True},
+        )
+        if created:
+            apply_delta(doctor_id, day, free=1, total=1)
+            invalidate_day(doctor_id, day)
+    return talon
+
+
+def book_template_slot(doctor_id: int, day: date, start_time: time) -> Talon:
+    """Забронировать слот шаблона: талон создается в момент бронирования"""
+    return book_talon(materialize_slot(doctor_id, day, start_time).id)
+
+
+def materialize_templates(
+        date_from: date,
+        date_to: date,
+        clinic_id: Optional[int] = None,
+        doctor_id: Optional[int] = None,
+        chunk_size: int = 100,
+) -> BatchGenerationResult:
+    """Явно создает талоны по шаблонам на период, как пакетная генерация по графикам"""
+    started = perf_counter()
+    grids = build_template_grids(
+        date_from,
+        date_to,
+        doctor_ids=[doctor_id] if doctor_id is not None else None,
+        clinic_id=clinic_id,
+    )
+    return BatchGenerationResult(
+        doctor_days=len(grids),
+        talons_created=write_doctor_day_grids(grids, chunk_size),
+        seconds=perf_counter() - started,
+    )
@@ -0,0 +1,81 @@
+# appointments/signals.py
+"""
+Инвалидация кэша страниц, сеток шаблонов и индекса поиска врачей по
+изменениям моделей. Сбрасываются только версии затронутых врачей, клиник и графиков.
+Массовые операции (update, bulk_create) сигналов не шлют - сервисы
+сбрасывают кэш для них сами. Удаление талона (в т.ч. из админки и
+каскадом) вычитается из статистики врачо-дня
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Clinic, Doctor, Schedule, Talon, WeeklyTemplate
+from .services.cache_versions import bump_version_on_commit
+from .services.doctor_search import doctor_index
+from .services.page_cache import (
+    clinic_scope,
+    doctors_scope,
+    invalidate_doctor_pages,
+    schedule_scope,
+)
+from .services.stats_service import discard_talon
+from .services.template_service import invalidate_templates
+
+
+@receiver([post_save, post_delete], sender=Clinic)
+def clinic_changed(sender, instance, **kwargs):
+    bump_version_on_commit(doctors_scope())
+    bump_version_on_commit(clinic_scope(instance.id))
+    # Название клиники выводится на страницах ее врачей
+    for doctor_id in Doctor.objects.filter(clinic_id=instance.id).values_list('id', flat=True):
+        invalidate_doctor_pages(doctor_id)
+
+
+@receiver(post_delete, sender=Clinic)
+def clinic_deleted(sender, instance, **kwargs):
+    # После удаления instance.id станет None - запоминаем id до коммита
+    clinic_id = instance.id
+    transaction.on_commit(lambda: doctor_index.detach_clinic(clinic_id))
+
+
+@receiver([post_save, post_delete], sender=Doctor)
+def doctor_changed(sender, instance, **kwargs):
+    bump_version_on_commit(doctors_scope())
+    invalidate_doctor_pages(instance.id)
+    # Длительность приема задает нарезку слотов шаблона
+    invalidate_templates(instance.id)
+
+
+@receiver(post_save, sender=Doctor)
+def doctor_saved(sender, instance, **kwargs):
+    # Индекс поиска меняем только после коммита, чтобы откат не оставил в нем врача
+    transaction.on_commit(lambda: doctor_index.update(instance))
+
+
+@receiver(post_delete, sender=Doctor)
+def doctor_deleted(sender, instance, **kwargs):
+    doctor_id = instance.id
+    transaction.on_commit(lambda: doctor_index.remove(doctor_id))
+
+
+@receiver([post_save, post_delete], sender=Schedule)
+def schedule_changed(sender, instance, **kwargs):
+    bump_version_on_commit(schedule_scope(instance.id))
+    # Обычный график отменяет шаблон на свою дату
+    invalidate_templates(instance.doctor_id)
+
+
+@receiver([post_save, post_delete], sender=WeeklyTemplate)
+def weekly_template_changed(sender, instance, **kwargs):
+    invalidate_templates(instance.doctor_id)
+
+
+@receiver([post_save, post_delete], sender=Talon)
+def talon_changed(sender, instance, **kwargs):
+    invalidate_doctor_pages(instance.doctor_id)
+
+
+@receiver(post_delete, sender=Talon)
+def talon_deleted(sender, instance, **kwargs):
+    discard_talon(instance)
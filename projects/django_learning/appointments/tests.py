@@ -1,3 +1,1592 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import json
+import pickle
+import tempfile
+from datetime import date, datetime, time
+from threading import Event
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.contrib.messages import get_messages
+from django.contrib.sessions.models import Session
+from django.core.cache import cache, caches
+from django.core.exceptions import ValidationError
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, connection, transaction
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.signals import request_started
+from django.db.models import F
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from appointments.db_router import (
+    CACHE_ALIAS,
+    PIN_COOKIE_NAME,
+    REPLICA_ALIAS,
+    PrimaryReplicaRouter,
+    ReplicaPinMiddleware,
+    pin_to_primary,
+    read_db,
+    read_from_replica,
+    replica_reads,
+)
+from appointments.models import (
+    ArchivedTalon,
+    Clinic,
+    Doctor,
+    DoctorDayStats,
+    Schedule,
+    Talon,
+    TalonGenerationJob,
+    WeeklyTemplate,
+)
+from appointments.services.schedule_service import (
+    generate_talons_for_schedules,
+    get_schedules_with_talons,
+    split_schedule_to_talons,
+)
+from appointments.services import job_service, talon_service
+from appointments.checks import check_shared_cache
+from appointments.services.archive_service import archive_batch
+from appointments.services.availability_cache import get_free_talons, invalidate_day
+from appointments.services import doctor_search
+from appointments.services.day_grid import DayGrid
+from appointments.services.doctor_service import aget_doctor_rows, get_doctor_rows
+from appointments.services.doctor_search import DoctorPrefixIndex, doctor_index, search_doctors
+from appointments.services.export_service import iter_export
+from appointments.services.interval_index import IntervalIndex
+from appointments.services.page_cache import cached_page
+from appointments.services.read_models import ScheduleRow, TalonRow
+from appointments.services.search_service import FreeSlot, earliest_free_slots
+from appointments.services.schedule_import import ScheduleRowError, import_schedules, iter_rows
+from appointments.services.stats_service import get_doctor_day_stats, get_doctor_totals, refresh_days
+from appointments.services.template_service import book_template_slot, get_day_slots
+from appointments.services.talon_service import (
+    abook_talon,
+    acancel_talon,
+    book_talon,
+    book_talons,
+    cancel_talon,
+    create_talon,
+    get_talons_page,
+    insert_talons,
+)
+
+
+class AppointmentsTestCase(TestCase):
+    # Кэш (DatabaseCache) - в своей БД, если Redis не настроен
+    databases = {DEFAULT_DB_ALIAS, CACHE_ALIAS} & set(settings.DATABASES)
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Даже если реплика настроена (DJANGO_REPLICA_DB), читаем с default: второе
+        # соединение SQLite не видит незакоммиченных данных транзакции TestCase.
+        # Маршрутизацию на реплику проверяют отдельно, с подменой replica_configured
+        cls.enterClassContext(mock.patch('appointments.db_router.replica_configured', return_value=False))
+        # Фоновый поток индекса врачей читал бы БД другим соединением, мимо транзакции теста
+        cls.enterClassContext(override_settings(DOCTOR_INDEX_REFRESH_SECONDS=None))
+
+
+def make_doctor(clinic: Clinic = None, last_name: str = 'Петров', duration: int = 15) -> Doctor:
+    return Doctor.objects.create(
+        clinic=clinic,
+        last_name=last_name,
+        first_name='Иван',
+        patronymic='Иванович',
+        full_name=f'{last_name} Иван Иванович',
+        duration=duration,
+    )
+
+
+class AsyncBookingViewTests(AppointmentsTestCase):
+    """Бронирование и отмена через асинхронные представления"""
+
+    def setUp(self):
+        self.doctor = make_doctor(Clinic.objects.create(name='Клиника'))
+        self.talon = Talon.objects.create(
+            doctor=self.doctor, date=date(2025, 3, 3), start_time=time(9), end_time=time(9, 15)
+        )
+
+    async def test_book_talon_view(self):
+        response = await self.async_client.post(f'/async/talons/{self.talon.id}/book/')
+
+        self.assertEqual(response.status_code, 302)
+        messages = [str(message) for message in get_messages(response.asgi_request)]
+        self.assertEqual(messages, [f"Талон #{self.talon.id} успешно забронирован!"])
+        self.assertFalse((await Talon.objects.aget(id=self.talon.id)).is_free)
+
+    async def test_book_taken_talon_view(self):
+        await Talon.objects.filter(id=self.talon.id).aupdate(is_free=False)
+
+        response = await self.async_client.post(f'/async/talons/{self.talon.id}/book/')
+
+        messages = [str(message) for message in get_messages(response.asgi_request)]
+        self.assertEqual(len(messages), 1)
+        self.assertIn("Талон уже забронирован", messages[0])
+
+    async def test_cancel_talon_view(self):
+        await Talon.objects.filter(id=self.talon.id).aupdate(is_free=False)
+
+        response = await self.async_client.post(f'/async/talons/{self.talon.id}/cancel/')
+
+        messages = [str(message) for message in get_messages(response.asgi_request)]
+        self.assertEqual(messages, [f"Бронирование талона #{self.talon.id} отменено"])
+        self.assertTrue((await Talon.objects.aget(id=self.talon.id)).is_free)
+
+
+class TalonGenerationTests(AppointmentsTestCase):
+    """Генерация талонов считает только реально вставленные строки"""
+
+    def setUp(self):
+        self.clinic = Clinic.objects.create(name='Клиника')
+        self.doctor = make_doctor(self.clinic, duration=30)
+        self.schedule = Schedule.objects.create(
+            clinic=self.clinic, doctor=self.doctor, date=date(2025, 3, 3),
+            start_time=time(9), end_time=time(11), start_break_time=time(10), end_break_time=time(10),
+        )
+
+    def test_split_returns_created_talons(self):
+        talons = split_schedule_to_talons(self.schedule.id)
+
+        self.assertEqual([talon.start_time for talon in talons], [time(9), time(9, 30), time(10), time(10, 30)])
+        self.assertTrue(all(talon.id and talon.is_free and talon.date == date(2025, 3, 3) for talon in talons))
+        self.assertEqual(sorted(talon.id for talon in talons),
+                         list(Talon.objects.filter(doctor=self.doctor).order_by('id').values_list('id', flat=True)))
+        self.assertEqual(split_schedule_to_talons(self.schedule.id), [])
+
+    def test_split_skips_busy_intervals(self):
+        Talon.objects.create(
+            doctor=self.doctor, date=date(2025, 3, 3), start_time=time(9, 15), end_time=time(9, 45), is_free=False
+        )
+
+        talons = split_schedule_to_talons(self.schedule.id)
+
+        self.assertEqual([talon.start_time for talon in talons], [time(10), time(10, 30)])
+
+    def test_split_query_count_does_not_depend_on_slots(self):
+        query_counts = []
+        for day, duration in enumerate((60, 5), start=10):
+            doctor = make_doctor(self.clinic, duration=duration)
+            schedule = Schedule.objects.create(
+                clinic=self.clinic, doctor=doctor, date=date(2025, 3, day),
+                start_time=time(8), end_time=time(20), start_break_time=time(13), end_break_time=time(14),
+            )
+            with CaptureQueriesContext(connection) as queries:
+                self.assertTrue(split_schedule_to_talons(schedule.id))
+            query_counts.append(len(queries))
+
+        self.assertEqual(query_counts[0], query_counts[1])
+
+    def test_insert_talons_skips_conflicts(self):
+        existing = Talon.objects.create(
+            doctor=self.doctor, date=date(2025, 3, 3), start_time=time(9), end_time=time(9, 30)
+        )
+        talons = [
+            Talon(doctor=self.doctor, date=date(2025, 3, 3), start_time=time(9), end_time=time(9, 30)),
+            Talon(doctor=self.doctor, date=date(2025, 3, 3), start_time=time(9, 30), end_time=time(10)),
+        ]
+
+        created = insert_talons(talons)
+
+        self.assertEqual(len(created), 1)
+        self.assertNotEqual(created[0].id, existing.id)
+        self.assertEqual(created[0].start_time, time(9, 30))
+        self.assertEqual(Talon.objects.get(id=created[0].id).start_time, time(9, 30))
+
+
+class BatchGenerationTests(AppointmentsTestCase):
+    """Пакетная генерация талонов по клинике, периоду и списку графиков"""
+
+    def setUp(self):
+        self.clinic = Clinic.objects.create(name='Клиника')
+        other_clinic = Clinic.objects.create(name='Другая клиника')
+        self.doctor = make_doctor(self.clinic, duration=30)
+        other = make_doctor(other_clinic, last_name='Сидоров', duration=30)
+        self.schedules = [
+            Schedule.objects.create(
+                clinic=clinic, doctor=doctor, date=day,
+                start_time=time(9), end_time=time(10), start_break_time=time(10), end_break_time=time(10),
+            )
+            for clinic, doctor, day in (
+                (self.clinic, self.doctor, date(2025, 3, 3)),
+                (self.clinic, self.doctor, date(2025, 3, 4)),
+                (self.clinic, self.doctor, date(2025, 3, 10)),
+                (other_clinic, other, date(2025, 3, 3)),
+            )
+        ]
+
+    def test_clinic_and_date_range(self):
+        result = generate_talons_for_schedules(
+            clinic_id=self.clinic.id, date_from=date(2025, 3, 1), date_to=date(2025, 3, 7)
+        )
+
+        self.assertEqual((result.schedules, result.doctor_days, result.talons_created), (2, 2, 4))
+        self.assertEqual(sorted(set(Talon.objects.values_list('doctor_id', 'date'))),
+                         [(self.doctor.id, date(2025, 3, 3)), (self.doctor.id, date(2025, 3, 4))])
+        self.assertEqual(DoctorDayStats.objects.get(doctor=self.doctor, date=date(2025, 3, 3)).free, 2)
+
+    def test_schedule_ids_and_repeat(self):
+        schedule_ids = [self.schedules[2].id, self.schedules[3].id]
+
+        self.assertEqual(generate_talons_for_schedules(schedule_ids=schedule_ids).talons_created, 4)
+        self.assertEqual(generate_talons_for_schedules(schedule_ids=schedule_ids).talons_created, 0)
+        self.assertEqual(Talon.objects.count(), 4)
+
+    def test_pools_build_same_talons(self):
+        generate_talons_for_schedules(schedule_ids=[self.schedules[0].id], pool='threads', workers=2)
+        generate_talons_for_schedules(schedule_ids=[self.schedules[1].id])
+
+        self.assertEqual(
+            sorted(Talon.objects.filter(date=date(2025, 3, 3)).values_list('start_time', 'end_time')),
+            sorted(Talon.objects.filter(date=date(2025, 3, 4)).values_list('start_time', 'end_time')),
+        )
+
+    def test_unknown_pool(self):
+        with self.assertRaises(ValueError):
+            generate_talons_for_schedules(clinic_id=self.clinic.id, pool='greenlets')
+
+    def test_command_reports_throughput(self):
+        stdout = io.StringIO()
+
+        call_command('generate_talons', f'--clinic-id={self.clinic.id}', stdout=stdout)
+
+        self.assertIn('создано талонов: 6', stdout.getvalue())
+        self.assertIn('талонов/с', stdout.getvalue())
+
+
+class IntervalIndexTests(SimpleTestCase):
+    """Пересечения полуоткрытых интервалов"""
+
+    def test_touching_intervals_do_not_overlap(self):
+        index = IntervalIndex([(540, 600)])
+
+        self.assertFalse(index.overlaps(480, 540))
+        self.assertFalse(index.overlaps(600, 660))
+        self.assertTrue(index.overlaps(599, 660))
+        self.assertTrue(index.overlaps(480, 541))
+
+    def test_merges_touching_and_nested_intervals(self):
+        index = IntervalIndex([(600, 660), (540, 600), (550, 560), (700, 720)])
+
+        self.assertEqual(len(index), 2)
+        self.assertTrue(index.overlaps(650, 700))
+        self.assertFalse(index.overlaps(660, 700))
+        self.assertTrue(index.overlaps(500, 800))
+
+    def test_empty_intervals_are_ignored(self):
+        index = IntervalIndex([(600, 600), (660, 650)])
+
+        self.assertFalse(index)
+        self.assertFalse(index.overlaps(0, 24 * 60))
+
+    def test_time_bounds(self):
+        index = IntervalIndex([(time(13), time(14))])
+
+        self.assertTrue(index.overlaps(time(12, 45), time(13, 15)))
+        self.assertFalse(index.overlaps(time(14), time(14, 30)))
+
+
+class SchedulesViewTests(AppointmentsTestCase):
+    """Страница графиков загружает талоны одним запросом на все графики"""
+
+    def setUp(self):
+        cache.clear()
+        self.clinic = Clinic.objects.create(name='Клиника')
+        self.doctors = [make_doctor(self.clinic, last_name=name, duration=30) for name in ('Петров', 'Сидоров')]
+
+    def add_schedules(self, day: date):
+        for doctor in self.doctors:
+            schedule = Schedule.objects.create(
+                clinic=self.clinic, doctor=doctor, date=day,
+                start_time=time(9), end_time=time(10), start_break_time=time(10), end_break_time=time(10),
+            )
+            split_schedule_to_talons(schedule.id)
+
+    def get_page(self):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/schedules/', {'date_to': '2025-03-07'})
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_query_count_does_not_depend_on_schedules(self):
+        self.add_schedules(date(2025, 3, 3))
+        _, few = self.get_page()
+        for day in (4, 5, 6):
+            self.add_schedules(date(2025, 3, day))
+
+        response, many = self.get_page()
+
+        self.assertEqual(few, many)
+        self.assertEqual(len(response.context['schedules']), 8)
+
+    def test_cards_show_talons_of_their_day(self):
+        self.add_schedules(date(2025, 3, 3))
+        self.add_schedules(date(2025, 3, 4))
+
+        response, _ = self.get_page()
+
+        for schedule in response.context['schedules']:
+            talons = Talon.objects.filter(doctor_id=schedule.doctor_id, date=schedule.date)
+            self.assertEqual(
+                sorted(talon.id for talon in schedule.talons),
+                sorted(talons.values_list('id', flat=True)),
+            )
+
+
+class SharedCacheTests(AppointmentsTestCase):
+    """Версии кэша, увеличенные в другом процессе, видны всем читателям"""
+
+    def setUp(self):
+        cache.clear()
+        self.doctor = make_doctor(Clinic.objects.create(name='Клиника'))
+        self.talon = Talon.objects.create(
+            doctor=self.doctor, date=date(2025, 3, 3), start_time=time(9), end_time=time(9, 15)
+        )
+
+    def test_bump_from_other_connection(self):
+        self.assertEqual(len(get_free_talons(self.doctor.id, date(2025, 3, 3))), 1)
+
+        # Отдельный экземпляр бэкенда - как кэш другого процесса (воркера или команды)
+        other_process_cache = caches.create_connection('default')
+        Talon.objects.filter(id=self.talon.id).update(is_free=False)
+        with mock.patch('appointments.services.cache_versions.cache', other_process_cache), \
+                self.captureOnCommitCallbacks(execute=True):
+            invalidate_day(self.doctor.id, date(2025, 3, 3))
+
+        self.assertEqual(get_free_talons(self.doctor.id, date(2025, 3, 3)), [])
+
+    def test_process_local_cache_is_rejected(self):
+        self.assertEqual(check_shared_cache(), [])
+
+        locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        with override_settings(CACHES=locmem):
+            self.assertEqual([error.id for error in check_shared_cache()], ['appointments.E001'])
+        with override_settings(CACHES=locmem, CACHE_SINGLE_PROCESS=True):
+            self.assertEqual(check_shared_cache(), [])
+
+
+class PageCacheTests(AppointmentsTestCase):
+    """Кэш страниц врачей и карточек графиков со сбросом по сигналам моделей"""
+
+    def setUp(self):
+        cache.clear()
+        self.clinic = Clinic.objects.create(name='Клиника')
+        self.doctor = make_doctor(self.clinic)
+        self.talon = Talon.objects.create(
+            doctor=self.doctor, date=date(2025, 3, 3), start_time=time(9), end_time=time(9, 15)
+        )
+
+    def test_doctors_list_is_served_from_cache(self):
+        first = self.client.get('/doctors/')
+
+        with self.assertNumQueries(0):
+            second = self.client.get('/doctors/')
+        self.assertEqual(second.content, first.content)
+
+    def test_doctor_save_resets_list(self):
+        self.client.get('/doctors/')
+        self.doctor.full_name = 'Петров Петр Петрович'
+        self.doctor.save()
+
+        self.assertContains(self.client.get('/doctors/'), 'Петров Петр Петрович')
+
+    def test_clinic_rename_resets_doctor_pages(self):
+        self.client.get(f'/doctors/{self.doctor.id}/')
+        self.clinic.name = 'Новая клиника'
+        self.clinic.save()
+
+        self.assertContains(self.client.get(f'/doctors/{self.doctor.id}/'), 'Новая клиника')
+
+    def test_booking_resets_doctor_detail(self):
+        self.assertContains(self.client.get(f'/doctors/{self.doctor.id}/'), 'Свободен')
+
+        book_talon(self.talon.id)
+
+        self.assertNotContains(self.client.get(f'/doctors/{self.doctor.id}/'), 'Свободен')
+
+    def test_booking_in_other_process_resets_doctor_detail(self):
+        self.assertContains(self.client.get(f'/doctors/{self.doctor.id}/'), 'Свободен')
+
+        # Сигнал талона сработает в процессе, который бронирует, - со своим соединением кэша
+        with mock.patch('appointments.services.cache_versions.cache', caches.create_connection('default')), \
+                self.captureOnCommitCallbacks(execute=True):
+            book_talon(self.talon.id)
+
+        self.assertNotContains(self.client.get(f'/doctors/{self.doctor.id}/'), 'Свободен')
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_process_local_cache_is_bypassed(self):
+        schedule = Schedule.objects.create(
+            clinic=self.clinic, doctor=self.doctor, date=date(2025, 3, 3),
+            start_time=time(9), end_time=time(10), start_break_time=time(10), end_break_time=time(10),
+        )
+        self.client.get(f'/doctors/{self.doctor.id}/')
+        self.client.get('/schedules/', {'date_to': '2025-03-03'})
+        # Изменение без сигналов - так выглядит запись другого процесса
+        Talon.objects.filter(id=self.talon.id).update(is_free=False)
+        Schedule.objects.filter(id=schedule.id).update(end_time=time(12))
+
+        self.assertNotContains(self.client.get(f'/doctors/{self.doctor.id}/'), 'Свободен')
+        self.assertContains(self.client.get('/schedules/', {'date_to': '2025-03-03'}), '09:00 - 12:00')
+
+    def test_other_doctor_page_stays_cached(self):
+        other = make_doctor(self.clinic, last_name='Сидоров')
+        self.client.get(f'/doctors/{other.id}/')
+
+        book_talon(self.talon.id)
+
+        with self.assertNumQueries(0):
+            self.client.get(f'/doctors/{other.id}/')
+
+    def test_schedule_save_resets_its_card(self):
+        schedule = Schedule.objects.create(
+            clinic=self.clinic, doctor=self.doctor, date=date(2025, 3, 3),
+            start_time=time(9), end_time=time(10), start_break_time=time(10), end_break_time=time(10),
+        )
+        self.assertContains(self.client.get('/schedules/', {'date_to': '2025-03-03'}), '09:00 - 10:00')
+
+        schedule.end_time = time(12)
+        schedule.save()
+
+        self.assertContains(self.client.get('/schedules/', {'date_to': '2025-03-03'}), '09:00 - 12:00')
+
+
+class DayGridTests(SimpleTestCase):
+    """Нарезка дня на слоты и операции над компактной сеткой"""
+
+    def slots(self, *hours, duration=30):
+        grid = DayGrid.from_schedule(*hours, duration)
+        return list(zip(grid.starts, grid.ends))
+
+    def test_empty_break(self):
+        self.assertEqual(self.slots(time(9), time(11), time(10), time(10)),
+                         [(540, 570), (570, 600), (600, 630), (630, 660)])
+
+    def test_break_at_day_edges(self):
+        self.assertEqual(self.slots(time(9), time(11), time(9), time(9, 30)),
+                         [(570, 600), (600, 630), (630, 660)])
+        self.assertEqual(self.slots(time(9), time(11), time(10, 30), time(11)),
+                         [(540, 570), (570, 600), (600, 630)])
+
+    def test_slot_longer_than_remaining_time(self):
+        self.assertEqual(self.slots(time(9), time(10), time(10), time(10), duration=40), [(540, 580)])
+
+    def test_slot_cut_by_break(self):
+        self.assertEqual(self.slots(time(9), time(11), time(9, 45), time(10)),
+                         [(540, 570), (570, 585), (600, 630), (630, 660)])
+        self.assertEqual(self.slots(time(9), time(11), time(9, 40), time(9, 50)),
+                         [(540, 570), (570, 580), (590, 620), (620, 650)])
+
+    def test_from_talons_keeps_free_bitmap(self):
+        grid = DayGrid.from_talons([
+            (3, time(10), time(10, 30), True),
+            (1, time(9), time(9, 30), False),
+            (2, time(9, 30), time(10), True),
+        ])
+
+        self.assertEqual(list(grid.talon_ids), [1, 2, 3])
+        self.assertEqual([grid.is_free(position) for position in range(len(grid))], [False, True, True])
+        self.assertEqual(list(grid.free_slots()), [(2, time(9, 30), time(10)), (3, time(10), time(10, 30))])
+
+    def test_bitmap_past_first_byte(self):
+        grid = DayGrid(range(0, 600, 30), range(30, 630, 30))
+        grid.set_free(9, False)
+
+        self.assertEqual([position for position in range(len(grid)) if not grid.is_free(position)], [9])
+
+    def test_without_busy_and_existing(self):
+        grid = DayGrid.from_schedule(time(9), time(11), time(11), time(11), 30)
+
+        rest = grid.without(IntervalIndex([(550, 560)]), existing=[(600, 630)])
+
+        self.assertEqual(list(zip(rest.starts, rest.ends)), [(570, 600), (630, 660)])
+        self.assertTrue(all(rest.is_free(position) for position in range(len(rest))))
+
+    def test_union_and_pickle(self):
+        grid = DayGrid.union([
+            DayGrid([540, 600], [570, 630]),
+            DayGrid([570, 600], [600, 630]),
+        ])
+
+        restored = pickle.loads(pickle.dumps(grid))
+        self.assertEqual(list(restored.slots()), [(time(9), time(9, 30)), (time(9, 30), time(10)), (time(10), time(10, 30))])
+        self.assertEqual(list(restored.free_slots()), [(0, start, end) for start, end in restored.slots()])
+
+
+class TalonsPageTests(AppointmentsTestCase):
+    """Keyset-пагинация списка талонов"""
+
+    def setUp(self):
+        self.doctor = make_doctor()
+        other = make_doctor(last_name='Сидоров')
+        # Одинаковые (date, start_time) у разных врачей - порядок решает id
+        for day in (date(2025, 3, 4), date(2025, 3, 3)):
+            for hour in (11, 9, 10):
+                for doctor in (self.doctor, other):
+                    Talon.objects.create(doctor=doctor, date=day, start_time=time(hour), end_time=time(hour, 30))
+
+    def _all_pages(self, **filters):
+        talons, cursor = [], None
+        while True:
+            page = get_talons_page(cursor=cursor, limit=4, **filters)
+            talons.extend(page.talons)
+            if page.next_cursor is None:
+                return talons
+            cursor = page.next_cursor
+
+    def test_pages_cover_all_talons_in_order(self):
+        keys = [(talon.date, talon.start_time, talon.id) for talon in self._all_pages()]
+
+        self.assertEqual(keys, sorted(keys))
+        self.assertEqual(len(set(keys)), Talon.objects.count())
+
+    def test_filters_apply_to_every_page(self):
+        Talon.objects.filter(doctor=self.doctor, start_time=time(10)).update(is_free=False)
+
+        talons = self._all_pages(doctor_id=self.doctor.id, is_free=True, date_from=date(2025, 3, 4))
+
+        self.assertEqual([(talon.date, talon.start_time) for talon in talons],
+                         [(date(2025, 3, 4), time(9)), (date(2025, 3, 4), time(11))])
+
+    def test_last_full_page_has_no_cursor(self):
+        page = get_talons_page(limit=Talon.objects.count())
+
+        self.assertIsNone(page.next_cursor)
+
+    def test_invalid_cursor(self):
+        with self.assertRaises(ValueError):
+            get_talons_page(cursor='not-a-cursor')
+
+    def test_page_links_keep_filters(self):
+        cursor = get_talons_page(limit=1).next_cursor
+
+        response = self.client.get(
+            f'/doctors/{self.doctor.id}/talons/', {'is_free': '1', 'date_from': '2025-03-03', 'cursor': cursor}
+        )
+
+        self.assertEqual(response.context['first_query'], 'is_free=1&date_from=2025-03-03')
+        self.assertContains(response, 'href="?is_free=1&amp;date_from=2025-03-03">В начало')
+
+    def test_invalid_cursor_is_bad_request(self):
+        for url in ('/talons/', f'/doctors/{self.doctor.id}/talons/'):
+            response = self.client.get(url, {'cursor': '2025-03-03_xx_1'})
+            self.assertEqual(response.status_code, 400, url)
+
+    async def test_async_invalid_cursor_is_bad_request(self):
+        response = await self.async_client.get('/async/talons/', {'cursor': 'not-a-cursor'})
+
+        self.assertEqual(response.status_code, 400)
+
+
+class ReadModelTests(AppointmentsTestCase):
+    """Страницы-списки читают легкие строки вместо экземпляров моделей"""
+
+    def setUp(self):
+        self.clinic = Clinic.objects.create(name='Клиника')
+        self.doctor = make_doctor(self.clinic, duration=30)
+        self.no_clinic = make_doctor(last_name='Сидоров')
+        self.schedule = Schedule.objects.create(
+            clinic=self.clinic, doctor=self.doctor, date=date(2025, 3, 3),
+            start_time=time(9), end_time=time(10), start_break_time=time(10), end_break_time=time(10),
+        )
+        split_schedule_to_talons(self.schedule.id)
+        ArchivedTalon.objects.create(
+            id=Talon.objects.latest('id').id + 1, doctor=self.doctor, date=date(2025, 3, 2),
+            start_time=time(9), end_time=time(9, 30), is_free=False,
+        )
+
+    def test_doctor_rows(self):
+        with self.assertNumQueries(1):
+            rows = get_doctor_rows()
+
+        self.assertEqual(
+            [(row.id, row.full_name, row.duration, row.clinic_name) for row in rows],
+            [(self.doctor.id, 'Петров Иван Иванович', 30, 'Клиника'), (self.no_clinic.id, 'Сидоров Иван Иванович', 15, None)],
+        )
+        self.assertFalse(hasattr(rows[0], '__dict__'))
+
+    async def test_async_doctor_rows(self):
+        rows = await aget_doctor_rows()
+
+        self.assertEqual([(row.id, row.clinic_name) for row in rows], [(self.doctor.id, 'Клиника'), (self.no_clinic.id, None)])
+
+    def test_talon_page_rows(self):
+        with self.assertNumQueries(1):
+            talons = get_talons_page(include_archived=True).talons
+
+        self.assertTrue(all(isinstance(talon, TalonRow) for talon in talons))
+        self.assertEqual(
+            [(talon.date, talon.start_time, talon.is_free, talon.archived, talon.doctor_full_name) for talon in talons],
+            [(date(2025, 3, 2), time(9), False, True, 'Петров Иван Иванович'),
+             (date(2025, 3, 3), time(9), True, False, 'Петров Иван Иванович'),
+             (date(2025, 3, 3), time(9, 30), True, False, 'Петров Иван Иванович')],
+        )
+
+    def test_schedule_rows_with_talons(self):
+        with self.assertNumQueries(2):
+            schedules = get_schedules_with_talons(date(2025, 3, 1), date(2025, 3, 31))
+
+        schedule = schedules[0]
+        self.assertIsInstance(schedule, ScheduleRow)
+        self.assertEqual(
+            (schedule.id, schedule.date, schedule.doctor_full_name, schedule.clinic_name),
+            (self.schedule.id, date(2025, 3, 3), 'Петров Иван Иванович', 'Клиника'),
+        )
+        self.assertEqual([talon.start_time for talon in schedule.talons], [time(9), time(9, 30)])
+        self.assertTrue(all(isinstance(talon, TalonRow) for talon in schedule.talons))
+
+    def test_list_pages(self):
+        for url, text in (('/doctors/', 'Клиника'), ('/talons/', 'Петров Иван Иванович'),
+                          ('/schedules/', 'Петров Иван Иванович')):
+            response = self.client.get(url)
+            self.assertContains(response, text, msg_prefix=url)
+
+
+class DoctorAvailabilityViewTests(AppointmentsTestCase):
+
+    def test_free_talons_of_day(self):
+        doctor = make_doctor()
+        Talon.objects.create(doctor=doctor, date=date(2025, 3, 3), start_time=time(9), end_time=time(9, 15))
+        Talon.objects.create(doctor=doctor, date=date(2025, 3, 3), start_time=time(10), end_time=time(10, 15),
+                             is_free=False)
+
+        response = self.client.get(f'/doctors/{doctor.id}/availability/', {'date': '2025-03-03'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([talon['start_time'] for talon in response.json()['talons']], ['09:00'])
+
+    def test_unknown_doctor(self):
+        response = self.client.get('/doctors/999/availability/', {'date': '2025-03-03'})
+
+        self.assertEqual(response.status_code, 404)
+
+
+class EarliestFreeSlotsTests(AppointmentsTestCase):
+    """Слияние свободных талонов врачей клиники по времени"""
+
+    def setUp(self):
+        self.clinic = Clinic.objects.create(name='Клиника')
+        self.first = make_doctor(self.clinic, last_name='Петров')
+        self.second = make_doctor(self.clinic, last_name='Сидоров')
+        outsider = make_doctor(Clinic.objects.create(name='Другая клиника'), last_name='Иванов')
+        for doctor, day, hour, is_free in (
+                (self.first, 3, 9, True),
+                (self.first, 3, 11, False),
+                (self.first, 4, 10, True),
+                (self.first, 5, 9, True),
+                (self.second, 3, 10, True),
+                (self.second, 3, 12, True),
+                (self.second, 4, 8, True),
+                (outsider, 3, 8, True),
+        ):
+            Talon.objects.create(
+                doctor=doctor, date=date(2025, 3, day), start_time=time(hour), end_time=time(hour, 15), is_free=is_free
+            )
+
+    def keys(self, slots: list[FreeSlot]):
+        return [(slot.date.day, slot.start_time.hour, slot.doctor_id) for slot in slots]
+
+    def test_merges_doctors_in_time_order(self):
+        slots = earliest_free_slots(self.clinic.id, after=datetime(2025, 3, 1), limit=10)
+
+        self.assertEqual(self.keys(slots), [
+            (3, 9, self.first.id), (3, 10, self.second.id), (3, 12, self.second.id),
+            (4, 8, self.second.id), (4, 10, self.first.id), (5, 9, self.first.id),
+        ])
+        self.assertTrue(all(slot.end_time == time(slot.start_time.hour, 15) for slot in slots))
+
+    def test_after_is_inclusive(self):
+        slots = earliest_free_slots(self.clinic.id, after=datetime(2025, 3, 3, 10), limit=2)
+
+        self.assertEqual(self.keys(slots), [(3, 10, self.second.id), (3, 12, self.second.id)])
+
+    def test_limit_with_pages_crossing_days(self):
+        # При малых limit первая страница врача - 1-2 строки, следующие читаются через границу дня
+        for limit in range(1, 8):
+            slots = earliest_free_slots(self.clinic.id, after=datetime(2025, 3, 3), limit=limit)
+            self.assertEqual(len(slots), min(limit, 6))
+            self.assertEqual(slots, sorted(slots))
+
+    def test_talon_and_template_slot_at_same_time(self):
+        # Слот шаблона, совпавший с талоном по дате, времени и врачу (например, талон создан
+        # между чтениями): сравнение не должно доходить до talon_id None
+        virtual = [(None, self.first.id, date(2025, 3, 3), time(9), time(9, 15))]
+        with mock.patch('appointments.services.search_service.doctors_with_templates', return_value={self.first.id}), \
+                mock.patch('appointments.services.search_service.iter_virtual_slots', return_value=iter(virtual)):
+            slots = earliest_free_slots(self.clinic.id, after=datetime(2025, 3, 3), limit=3)
+
+        self.assertEqual(self.keys(slots), [(3, 9, self.first.id), (3, 9, self.first.id), (3, 10, self.second.id)])
+        self.assertEqual({slot.talon_id is None for slot in slots[:2]}, {True, False})
+
+    def test_reads_pages_lazily(self):
+        with CaptureQueriesContext(connection) as queries:
+            earliest_free_slots(self.clinic.id, after=datetime(2025, 3, 3), limit=1,
+                                doctor_ids=[self.first.id, self.second.id])
+
+        # По странице на врача и запрос врачей с шаблонами
+        self.assertEqual(len(queries), 3)
+
+    def test_api(self):
+        response = self.client.get(f'/api/clinics/{self.clinic.id}/earliest/', {'after': '2025-03-04T09:00', 'limit': 2})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(talon['date'], talon['start_time'], talon['doctor_full_name']) for talon in response.json()['talons']],
+            [('2025-03-04', '10:00:00', self.first.full_name), ('2025-03-05', '09:00:00', self.first.full_name)],
+        )
+        self.assertEqual(self.client.get('/api/clinics/999/earliest/').status_code, 404)
+        self.assertEqual(self.client.get(f'/api/clinics/{self.clinic.id}/earliest/', {'after': 'x'}).status_code, 400)
+
+
+class WeeklyTemplateSlotsTests(AppointmentsTestCase):
+    """Виртуальные слоты шаблона в доступности, поиске и статистике"""
+
+    def setUp(self):
+        cache.clear()
+        self.clinic = Clinic.objects.create(name='Клиника')
+        self.doctor = make_doctor(self.clinic, duration=30)
+        # 2025-03-03 - понедельник
+        self.day = date(2025, 3, 3)
+        self.template = WeeklyTemplate.objects.create(
+            clinic=self.clinic, doctor=self.doctor, weekday=0, valid_from=date(2025, 1, 1),
+            start_time=time(9), end_time=time(10), start_break_time=time(10), end_break_time=time(10),
+        )
+        self.talon = create_talon(self.doctor.id, self.day, time(9), time(9, 30))
+
+    def test_create_template_view(self):
+        form = {
+            'doctor_id': self.doctor.id, 'clinic_id': self.clinic.id, 'weekday': 1,
+            'start_time': '12:00', 'end_time': '13:00', 'start_break_time': '12:30', 'end_break_time': '12:30',
+            'valid_from': '2025-03-01', 'valid_to': '',
+        }
+        # Сетка вторника уже в кэше - шаблон должен ее сбросить
+        self.assertEqual(get_day_slots(self.doctor.id, date(2025, 3, 4)), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/schedules/templates/create/', form)
+
+        self.assertRedirects(response, '/schedules/', fetch_redirect_response=False)
+        self.assertEqual(
+            get_day_slots(self.doctor.id, date(2025, 3, 4)),
+            [(None, time(12), time(12, 30)), (None, time(12, 30), time(13))],
+        )
+
+        response = self.client.post('/schedules/templates/create/', {**form, 'start_break_time': '14:00', 'end_break_time': '14:30'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(WeeklyTemplate.objects.count(), 2)
+        self.assertIn("Перерыв должен быть внутри рабочего времени", str(list(get_messages(response.wsgi_request))[-1]))
+
+    def test_admin_registered(self):
+        self.assertTrue(admin.site.is_registered(WeeklyTemplate))
+
+    def test_virtual_slots_are_cached(self):
+        slots = get_day_slots(self.doctor.id, self.day)
+        self.assertEqual([(slot[0] is None, slot[1]) for slot in slots], [(False, time(9)), (True, time(9, 30))])
+
+        with self.assertNumQueries(0):
+            self.assertEqual(get_day_slots(self.doctor.id, self.day), slots)
+
+    def test_schedule_overrides_cached_template(self):
+        get_day_slots(self.doctor.id, self.day)
+        Schedule.objects.create(
+            clinic=self.clinic, doctor=self.doctor, date=self.day,
+            start_time=time(9), end_time=time(10), start_break_time=time(10), end_break_time=time(10),
+        )
+
+        self.assertEqual(len(get_day_slots(self.doctor.id, self.day)), 1)
+
+    def test_book_virtual_slot(self):
+        talon = book_template_slot(self.doctor.id, self.day, time(9, 30))
+
+        self.assertFalse(talon.is_free)
+        self.assertEqual(len(get_day_slots(self.doctor.id, self.day)), 1)
+        stats = DoctorDayStats.objects.get(doctor=self.doctor, date=self.day)
+        self.assertEqual((stats.free, stats.booked, stats.total), (1, 1, 2))
+
+    def test_break_validation(self):
+        self.template.start_break_time, self.template.end_break_time = time(9, 45), time(9, 15)
+        with self.assertRaisesMessage(ValidationError, 'Перерыв должен быть внутри рабочего времени'):
+            self.template.full_clean()
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            self.template.save()
+
+        self.template.start_break_time, self.template.end_break_time = time(8), time(8, 30)
+        with self.assertRaises(ValidationError):
+            self.template.full_clean()
+
+    def test_availability_api(self):
+        response = self.client.get('/api/availability/', {
+            'doctor_id': self.doctor.id, 'date_from': '2025-03-03', 'date_to': '2025-03-10'
+        })
+
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(
+            [(row['id'], row['date'], row['start_time']) for row in rows],
+            [(self.talon.id, '2025-03-03', '09:00'), (None, '2025-03-03', '09:30'),
+             (None, '2025-03-10', '09:00'), (None, '2025-03-10', '09:30')],
+        )
+
+    def test_availability_api_clinic_columnar(self):
+        response = self.client.get('/api/availability/', {
+            'clinic_id': self.clinic.id, 'date_from': '2025-03-03', 'date_to': '2025-03-04', 'format': 'columnar'
+        })
+
+        data = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(data['chunks'], [{
+            'id': [self.talon.id, None],
+            'doctor_id': [self.doctor.id, self.doctor.id],
+            'date': ['2025-03-03', '2025-03-03'],
+            'start_time': ['09:00', '09:30'],
+            'end_time': ['09:30', '10:00'],
+        }])
+
+    def test_earliest_free_slots(self):
+        slots = earliest_free_slots(self.clinic.id, after=datetime(2025, 3, 3, 9, 10), limit=3)
+
+        self.assertEqual(
+            [(slot.date, slot.start_time, slot.talon_id) for slot in slots],
+            [(self.day, time(9, 30), None), (date(2025, 3, 10), time(9), None), (date(2025, 3, 10), time(9, 30), None)],
+        )
+
+    def test_stats(self):
+        days = get_doctor_day_stats(self.day, date(2025, 3, 10), doctor_id=self.doctor.id)
+        self.assertEqual(
+            [(row['date'], row['free'], row['booked'], row['total']) for row in days],
+            [(self.day, 2, 0, 2), (date(2025, 3, 10), 2, 0, 2)],
+        )
+
+        book_talon(self.talon.id)
+
+        totals = get_doctor_totals(self.day, date(2025, 3, 10), clinic_id=self.clinic.id)
+        self.assertEqual(
+            [(row['full_name'], row['free'], row['booked'], row['total'], row['utilization']) for row in totals],
+            [(self.doctor.full_name, 3, 1, 4, 0.25)],
+        )
+
+
+class BookTalonsTests(AppointmentsTestCase):
+    """Пакетное бронирование одним UPDATE ... RETURNING"""
+
+    def setUp(self):
+        doctor = make_doctor()
+        self.talons = [
+            Talon.objects.create(doctor=doctor, date=date(2025, 3, 3), start_time=time(9, minute), end_time=time(9, minute + 15))
+            for minute in (0, 15, 30)
+        ]
+
+    def test_books_with_single_talon_statement(self):
+        talon_ids = [self.talons[2].id, self.talons[0].id]
+
+        with CaptureQueriesContext(connection) as queries:
+            booked = book_talons(talon_ids)
+
+        talon_queries = [query['sql'] for query in queries if 'appointments_talon"' in query['sql']]
+        self.assertEqual(len(talon_queries), 1)
+        self.assertTrue(talon_queries[0].startswith('UPDATE'))
+        self.assertEqual([talon.id for talon in booked], talon_ids)
+        self.assertEqual([talon.is_free for talon in booked], [False, False])
+        self.assertEqual(booked[0].date, date(2025, 3, 3))
+        self.assertEqual(Talon.objects.filter(is_free=False).count(), 2)
+
+    def test_all_or_nothing(self):
+        book_talon(self.talons[1].id)
+
+        with self.assertRaises(ValidationError):
+            book_talons([talon.id for talon in self.talons])
+
+        self.assertEqual(list(Talon.objects.filter(is_free=False).values_list('id', flat=True)), [self.talons[1].id])
+
+    def test_missing_talon(self):
+        with self.assertRaisesMessage(ValueError, 'Талоны с id 999 не найдены'):
+            book_talons([self.talons[0].id, 999])
+
+    def test_no_ids(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(book_talons([]), [])
+
+
+class AvailabilityApiTests(AppointmentsTestCase):
+
+    def setUp(self):
+        self.doctor = make_doctor(Clinic.objects.create(name='Клиника'))
+        for hour in (9, 10):
+            Talon.objects.create(doctor=self.doctor, date=date(2025, 3, 3), start_time=time(hour), end_time=time(hour, 30))
+
+    def test_streams_free_talons(self):
+        response = self.client.get('/api/availability/', {
+            'clinic_id': self.doctor.clinic_id, 'date_from': '2025-03-03', 'date_to': '2025-03-03'
+        })
+
+        self.assertEqual(response.status_code, 200)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row['start_time'] for row in rows], ['09:00', '10:00'])
+
+    def test_invalid_ids(self):
+        for params in ({'clinic_id': 'x'}, {'doctor_id': '1.5'}, {}):
+            response = self.client.get('/api/availability/', params)
+            self.assertEqual(response.status_code, 400, params)
+
+
+@override_settings(PERF_HEADERS=True)
+class PerformanceMiddlewareTests(AppointmentsTestCase):
+
+    def setUp(self):
+        doctor = make_doctor()
+        Talon.objects.create(doctor=doctor, date=date(2025, 3, 3), start_time=time(9), end_time=time(9, 15))
+
+    def test_sync_view_queries(self):
+        response = self.client.get('/talons/')
+
+        self.assertEqual(response['X-DB-Query-Count'], '1')
+        self.assertIn('X-Non-DB-Time-Ms', response)
+
+    async def test_async_view_queries_from_thread_pool(self):
+        # Асинхронный ORM выполняет запросы в потоке sync_to_async
+        response = await self.async_client.get('/async/talons/')
+
+        self.assertEqual(response['X-DB-Query-Count'], '1')
+
+    def test_middleware_is_async_capable(self):
+        from appointments.middleware import PerformanceMiddleware
+
+        async def get_response(request):
+            return None
+
+        self.assertTrue(iscoroutinefunction(PerformanceMiddleware(get_response)))
+
+
+class OptimisticTalonChangeTests(AppointmentsTestCase):
+    """Compare-and-swap по version при отмене бронирования"""
+
+    def setUp(self):
+        self.talon = Talon.objects.create(
+            doctor=make_doctor(), date=date(2025, 3, 3), start_time=time(9), end_time=time(9, 15), is_free=False
+        )
+
+    def test_stale_version_is_rejected(self):
+        stale = Talon.objects.get(id=self.talon.id)
+        Talon.objects.filter(id=self.talon.id).update(version=F('version') + 1)
+
+        self.assertFalse(talon_service._compare_and_swap(stale, is_free=True))
+        self.assertFalse(Talon.objects.get(id=self.talon.id).is_free)
+
+    def test_cancel_bumps_version(self):
+        talon = cancel_talon(self.talon.id)
+
+        stored = Talon.objects.get(id=self.talon.id)
+        self.assertTrue(stored.is_free)
+        self.assertEqual(stored.version, self.talon.version + 1)
+        self.assertEqual(talon.version, stored.version)
+
+    def test_cancel_retries_after_concurrent_change(self):
+        real_compare_and_swap = talon_service._compare_and_swap
+        calls = []
+
+        def concurrent_writer(talon, **changes):
+            calls.append(talon.version)
+            if len(calls) == 1:
+                # Другой запрос успел изменить талон между чтением и UPDATE
+                Talon.objects.filter(id=talon.id).update(version=F('version') + 1)
+            return real_compare_and_swap(talon, **changes)
+
+        with mock.patch.object(talon_service, '_compare_and_swap', concurrent_writer):
+            cancel_talon(self.talon.id)
+
+        self.assertEqual(calls, [0, 1])
+        stored = Talon.objects.get(id=self.talon.id)
+        self.assertEqual((stored.is_free, stored.version), (True, 2))
+
+    def test_cancel_gives_up_after_retries(self):
+        with mock.patch.object(talon_service, '_compare_and_swap', return_value=False), \
+                mock.patch.object(talon_service, 'sleep'):
+            with self.assertRaises(ValidationError):
+                cancel_talon(self.talon.id)
+
+        self.assertFalse(Talon.objects.get(id=self.talon.id).is_free)
+
+
+class DoctorDayStatsTests(AppointmentsTestCase):
+    """Счетчики врачо-дня вслед за изменениями талонов"""
+
+    def setUp(self):
+        self.day = date(2025, 3, 3)
+        self.doctor = make_doctor(Clinic.objects.create(name='Клиника'))
+        self.talon = create_talon(self.doctor.id, self.day, time(9), time(9, 15))
+
+    def counters(self):
+        stats = DoctorDayStats.objects.get(doctor=self.doctor, date=self.day)
+        return stats.free, stats.booked, stats.total
+
+    def test_create_book_cancel(self):
+        self.assertEqual(self.counters(), (1, 0, 1))
+        book_talon(self.talon.id)
+        self.assertEqual(self.counters(), (0, 1, 1))
+        cancel_talon(self.talon.id)
+        self.assertEqual(self.counters(), (1, 0, 1))
+
+    async def test_async_book_cancel(self):
+        stats = DoctorDayStats.objects.filter(doctor=self.doctor, date=self.day)
+
+        await abook_talon(self.talon.id)
+        self.assertTrue(await stats.filter(free=0, booked=1, total=1).aexists())
+        await acancel_talon(self.talon.id)
+        self.assertTrue(await stats.filter(free=1, booked=0, total=1).aexists())
+
+    def test_failed_booking_keeps_counters(self):
+        book_talon(self.talon.id)
+        with self.assertRaises(ValidationError):
+            book_talon(self.talon.id)
+        self.assertEqual(self.counters(), (0, 1, 1))
+
+    def test_split_refreshes_day(self):
+        schedule = Schedule.objects.create(
+            clinic=self.doctor.clinic, doctor=self.doctor, date=self.day,
+            start_time=time(9), end_time=time(10), start_break_time=time(10), end_break_time=time(10),
+        )
+        book_talon(self.talon.id)
+
+        split_schedule_to_talons(schedule.id)
+
+        self.assertEqual(self.counters(), (3, 1, 4))
+
+    def test_refresh_days_counts_current_state(self):
+        DoctorDayStats.objects.filter(doctor=self.doctor).update(free=10, booked=10, total=20)
+        Talon.objects.filter(id=self.talon.id).update(is_free=False)
+
+        refresh_days([(self.doctor.id, self.day)])
+
+        self.assertEqual(self.counters(), (0, 1, 1))
+
+    def test_delete_talon(self):
+        book_talon(self.talon.id)
+        create_talon(self.doctor.id, self.day, time(9, 15), time(9, 30))
+
+        Talon.objects.get(id=self.talon.id).delete()
+        self.assertEqual(self.counters(), (1, 0, 1))
+        Talon.objects.filter(doctor=self.doctor).delete()
+        self.assertEqual(self.counters(), (0, 0, 0))
+
+    def test_delete_doctor_cascades(self):
+        self.doctor.delete()
+
+        self.assertFalse(DoctorDayStats.objects.exists())
+        self.assertFalse(Talon.objects.exists())
+
+
+class GenerationJobTests(AppointmentsTestCase):
+    """Выполнение задач генерации воркером"""
+
+    def setUp(self):
+        clinic = Clinic.objects.create(name='Клиника')
+        self.doctor = make_doctor(clinic, duration=30)
+        job_service.create_schedule_with_job(
+            clinic=clinic, doctor=self.doctor, date=date(2025, 3, 3),
+            start_time=time(9), end_time=time(10), start_break_time=time(10), end_break_time=time(10),
+        )
+        self.jobs = job_service.claim_jobs('worker-1')
+
+    def test_run_jobs(self):
+        self.assertEqual(job_service.run_jobs(self.jobs, 'worker-1'), (1, 0))
+
+        job = TalonGenerationJob.objects.get()
+        self.assertEqual((job.status, job.talons_created), (TalonGenerationJob.STATUS_DONE, 2))
+
+    def test_heartbeat_during_long_job(self):
+        beat = Event()
+
+        def long_job(schedule_id):
+            # Задача не завершится, пока таймер не продлит ее хотя бы раз
+            self.assertTrue(beat.wait(timeout=5))
+            return []
+
+        with mock.patch.object(job_service, 'heartbeat', side_effect=lambda worker_id: beat.set()) as heartbeat, \
+                mock.patch.object(job_service, 'split_schedule_to_talons', long_job):
+            self.assertEqual(job_service.run_jobs(self.jobs, 'worker-1', heartbeat_interval=0.01), (1, 0))
+
+        heartbeat.assert_called_with('worker-1')
+
+    def test_worker_resets_web_caches(self):
+        job_service.release_jobs('worker-1')
+        availability = f'/doctors/{self.doctor.id}/availability/'
+        self.assertEqual(self.client.get(availability, {'date': '2025-03-03'}).json()['talons'], [])
+        self.assertNotContains(self.client.get(f'/doctors/{self.doctor.id}/'), 'Свободен')
+
+        # Воркер - отдельный процесс со своим соединением кэша
+        with mock.patch('appointments.services.cache_versions.cache', caches.create_connection('default')), \
+                self.captureOnCommitCallbacks(execute=True):
+            call_command('run_generation_worker', '--once', stdout=io.StringIO())
+
+        self.assertEqual(len(self.client.get(availability, {'date': '2025-03-03'}).json()['talons']), 2)
+        self.assertContains(self.client.get(f'/doctors/{self.doctor.id}/'), 'Свободен')
+
+
+class InvertedBreakTests(AppointmentsTestCase):
+    """Перевернутый перерыв не доходит до очереди, а если дошел - задача падает, а не зависает"""
+
+    def setUp(self):
+        self.clinic = Clinic.objects.create(name='Клиника')
+        self.doctor = make_doctor(self.clinic, duration=30)
+        self.hours = {
+            'start_time': time(9), 'end_time': time(12), 'start_break_time': time(11), 'end_break_time': time(10),
+        }
+
+    def test_day_grid_rejects_inverted_break(self):
+        with self.assertRaises(ValueError):
+            DayGrid.from_schedule(*self.hours.values(), 30)
+        with self.assertRaises(ValueError):
+            DayGrid.from_schedule(time(9), time(12), time(10), time(10), 0)
+
+    def test_create_schedule_with_job_rejects_invalid_hours(self):
+        for hours in (self.hours, {**self.hours, 'start_break_time': time(12), 'end_break_time': time(13)}):
+            with self.assertRaises(ValidationError):
+                job_service.create_schedule_with_job(clinic=self.clinic, doctor=self.doctor, date=date(2025, 3, 3), **hours)
+
+        self.assertFalse(Schedule.objects.exists())
+        self.assertFalse(TalonGenerationJob.objects.exists())
+
+    def test_create_view_rejects_inverted_break(self):
+        response = self.client.post('/schedules/create/', {
+            'doctor_id': self.doctor.id, 'clinic_id': self.clinic.id, 'date': '2025-03-03',
+            'start_time': '09:00', 'end_time': '12:00', 'start_break_time': '11:00', 'end_break_time': '10:00',
+        })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [str(message) for message in get_messages(response.wsgi_request)],
+            ["Ошибка при создании графика: Перерыв должен быть внутри рабочего времени"],
+        )
+        self.assertFalse(TalonGenerationJob.objects.exists())
+
+    def test_job_with_inverted_break_fails(self):
+        # График, записанный в обход проверки (например, до нее)
+        schedule = Schedule.objects.create(clinic=self.clinic, doctor=self.doctor, date=date(2025, 3, 3), **self.hours)
+        job_service.enqueue_generation(schedule.id)
+
+        self.assertEqual(job_service.run_jobs(job_service.claim_jobs('worker-1'), 'worker-1'), (0, 1))
+
+        job = TalonGenerationJob.objects.get()
+        self.assertEqual(job.status, TalonGenerationJob.STATUS_FAILED)
+        self.assertIn('перерыва', job.error)
+        self.assertFalse(Talon.objects.exists())
+
+
+class ScheduleImportTests(AppointmentsTestCase):
+    """Потоковый импорт графиков"""
+
+    def setUp(self):
+        self.clinic = Clinic.objects.create(name='Клиника')
+        self.doctor = make_doctor(self.clinic, duration=30)
+
+    def row(self, day: str, **fields) -> str:
+        return json.dumps({
+            'doctor_id': self.doctor.id, 'date': day, 'start_time': '09:00', 'end_time': '10:00',
+            'start_break_time': '10:00', 'end_break_time': '10:00', **fields,
+        }) + '\n'
+
+    def ndjson(self, *lines: str):
+        return iter_rows(io.StringIO(''.join(lines)), 'ndjson')
+
+    def test_skip_malformed_json(self):
+        result = import_schedules(
+            self.ndjson(self.row('2025-03-03'), '{"doctor_id": \n', '[1, 2]\n', self.row('2025-03-04')),
+            skip_invalid=True,
+        )
+
+        self.assertEqual((result.rows, result.created, result.skipped), (4, 2, 2))
+
+    def test_error_flushes_valid_rows(self):
+        with self.assertRaises(ScheduleRowError) as error:
+            import_schedules(self.ndjson(self.row('2025-03-03'), 'not json\n', self.row('2025-03-04')))
+
+        self.assertEqual(error.exception.line, 2)
+        self.assertEqual(list(Schedule.objects.values_list('date', flat=True)), [date(2025, 3, 3)])
+
+    def test_break_outside_working_hours(self):
+        with self.assertRaises(ScheduleRowError):
+            import_schedules(self.ndjson(self.row('2025-03-03', start_break_time='08:00', end_break_time='08:30')))
+        self.assertFalse(Schedule.objects.exists())
+
+    def test_generate_talons_for_imported_schedules_only(self):
+        Schedule.objects.create(
+            clinic=self.clinic, doctor=self.doctor, date=date(2025, 3, 4),
+            start_time=time(12), end_time=time(13), start_break_time=time(13), end_break_time=time(13),
+        )
+        with tempfile.NamedTemporaryFile('w', suffix='.ndjson', encoding='utf-8') as file:
+            file.write(self.row('2025-03-03') + self.row('2025-03-05'))
+            file.flush()
+            call_command('import_schedules', file.name, '--generate-talons', '--workers=1', stdout=io.StringIO())
+
+        self.assertEqual(
+            sorted(Talon.objects.values_list('date', 'start_time')),
+            [(date(2025, 3, 3), time(9)), (date(2025, 3, 3), time(9, 30)),
+             (date(2025, 3, 5), time(9)), (date(2025, 3, 5), time(9, 30))],
+        )
+
+
+class ExportTests(AppointmentsTestCase):
+    """Потоковая выгрузка талонов и графиков"""
+
+    def setUp(self):
+        self.clinic = Clinic.objects.create(name='Клиника')
+        self.doctor = make_doctor(self.clinic)
+        other_doctor = make_doctor(Clinic.objects.create(name='Другая'), 'Сидоров')
+        self.talons = [
+            Talon.objects.create(doctor=self.doctor, date=date(2025, 3, day), start_time=time(9), end_time=time(9, 15))
+            for day in (3, 4, 5)
+        ]
+        self.other = Talon.objects.create(
+            doctor=other_doctor, date=date(2025, 3, 4), start_time=time(8), end_time=time(8, 15), is_free=False,
+        )
+        self.archived = ArchivedTalon.objects.create(
+            id=self.other.id + 1, doctor=self.doctor, date=date(2025, 3, 2),
+            start_time=time(9), end_time=time(9, 15), is_free=False,
+        )
+
+    def ids(self, **options) -> list[int]:
+        lines = ''.join(iter_export('talons', 'ndjson', **options)).splitlines()
+        return [json.loads(line)['id'] for line in lines]
+
+    def test_csv(self):
+        rows = list(csv.reader(io.StringIO(''.join(iter_export('talons', chunk_size=2)))))
+
+        self.assertEqual(rows[0], ['id', 'doctor_id', 'clinic_id', 'date', 'start_time', 'end_time', 'is_free'])
+        self.assertEqual(rows[1], [
+            str(self.talons[0].id), str(self.doctor.id), str(self.clinic.id), '2025-03-03', '09:00', '09:15', 'True',
+        ])
+        self.assertEqual(len(rows), 5)
+
+    def test_ndjson_gzip(self):
+        data = gzip.decompress(b''.join(iter_export('talons', 'ndjson', compress=True)))
+
+        rows = [json.loads(line) for line in data.decode('utf-8').splitlines()]
+        self.assertEqual(rows[0], {
+            'id': self.talons[0].id, 'doctor_id': self.doctor.id, 'clinic_id': self.clinic.id,
+            'date': '2025-03-03', 'start_time': '09:00', 'end_time': '09:15', 'is_free': True,
+        })
+        self.assertEqual([row['id'] for row in rows], [self.talons[0].id, self.other.id, self.talons[1].id, self.talons[2].id])
+
+    def test_date_and_clinic_filters(self):
+        self.assertEqual(
+            self.ids(date_from=date(2025, 3, 4), date_to=date(2025, 3, 4)), [self.other.id, self.talons[1].id]
+        )
+        self.assertEqual(self.ids(clinic_id=self.clinic.id), [talon.id for talon in self.talons])
+
+    def test_include_archived(self):
+        self.assertEqual(
+            self.ids(clinic_id=self.clinic.id, include_archived=True),
+            [self.archived.id] + [talon.id for talon in self.talons],
+        )
+        self.assertEqual(self.ids(date_to=date(2025, 3, 2), include_archived=True), [self.archived.id])
+
+    def test_schedules(self):
+        Schedule.objects.create(
+            clinic=self.clinic, doctor=self.doctor, date=date(2025, 3, 3),
+            start_time=time(9), end_time=time(12), start_break_time=time(10), end_break_time=time(10, 30),
+        )
+
+        rows = list(csv.reader(io.StringIO(''.join(iter_export('schedules', include_archived=True)))))
+
+        self.assertEqual(rows[1][3:], ['2025-03-03', '09:00', '12:00', '10:00', '10:30'])
+        self.assertEqual(len(rows), 2)
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            iter_export('doctors')
+        with self.assertRaises(ValueError):
+            iter_export('talons', 'xml')
+
+    def test_view(self):
+        response = self.client.get(f'/api/export/talons/?format=ndjson&gzip=1&clinic_id={self.clinic.id}&include_archived=1')
+
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="talons.ndjson.gz"')
+        lines = gzip.decompress(b''.join(response.streaming_content)).decode('utf-8').splitlines()
+        self.assertEqual(
+            [json.loads(line)['id'] for line in lines], [self.archived.id] + [talon.id for talon in self.talons]
+        )
+
+        self.assertEqual(self.client.get('/api/export/doctors/').status_code, 400)
+        self.assertEqual(self.client.get('/api/export/talons/?date_from=03.03.2025').status_code, 400)
+
+    def test_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = f'{directory}/talons.csv.gz'
+            call_command(
+                'export_data', 'talons', '--gzip', '--output', path, '--date-from', '2025-03-04',
+                f'--clinic-id={self.clinic.id}', stderr=io.StringIO(),
+            )
+            with gzip.open(path, 'rt', encoding='utf-8', newline='') as file:
+                rows = list(csv.reader(file))
+
+        self.assertEqual([row[0] for row in rows], ['id', str(self.talons[1].id), str(self.talons[2].id)])
+
+
+class DoctorPrefixIndexTests(SimpleTestCase):
+    """Префиксный индекс врачей без БД"""
+
+    def setUp(self):
+        self.index = DoctorPrefixIndex()
+        self.index.build([
+            (1, 'Семёнов Петр Ильич', 'Семёнов', 'Петр', 10),
+            (2, 'Семенова Анна Олеговна', 'Семенова', 'Анна', 20),
+            (3, 'Петров  Семен Иванович', 'Петров', 'Семен', 10),
+            (4, 'Сидоров Иван Петрович', 'Сидоров', 'Иван', 20),
+        ])
+
+    def ids(self, prefix: str, **options) -> list[int]:
+        return [doctor.id for doctor in self.index.search(prefix, **options)]
+
+    def test_prefix(self):
+        self.assertEqual(self.ids('Сид'), [4])
+        self.assertEqual(self.ids('Петров Сем'), [3])
+        self.assertEqual(self.ids('Иванович'), [])
+        self.assertEqual(self.ids('  '), [])
+
+    def test_yo_and_case(self):
+        # Врач 3 находится по имени "семен" - оно по алфавиту раньше фамилий
+        self.assertEqual(self.ids('СЕМЁ'), [3, 1, 2])
+        self.assertEqual(self.ids('семёнова'), [2])
+        self.assertEqual(self.ids('ПЕТРОВ   сЕмЕн'), [3])
+
+    def test_clinic_filter(self):
+        self.assertEqual(self.ids('сем', clinic_id=10), [3, 1])
+        self.assertEqual(self.ids('сем', clinic_id=30), [])
+
+    def test_limit(self):
+        self.assertEqual(self.ids('с', limit=2), [3, 1])
+        self.assertEqual(self.ids('с', clinic_id=20, limit=1), [2])
+
+    def test_single_rebuild(self):
+        with self.index._rebuild_lock:
+            self.assertFalse(self.index.refresh())
+
+    def test_changes_during_rebuild_are_replayed(self):
+        new_doctor = Doctor(id=5, full_name='Соколов Олег Ильич', last_name='Соколов', first_name='Олег', clinic_id=10)
+
+        def rows():
+            # Сигналы пришли после чтения БД перестройкой
+            self.index.update(new_doctor)
+            self.index.remove(4)
+            self.index.detach_clinic(20)
+            return [(2, 'Семенова Анна Олеговна', 'Семенова', 'Анна', 20),
+                    (4, 'Сидоров Иван Петрович', 'Сидоров', 'Иван', 20)]
+
+        with mock.patch.object(DoctorPrefixIndex, '_rows', side_effect=rows):
+            self.assertTrue(self.index.refresh())
+
+        self.assertEqual(self.ids('с'), [2, 5])
+        self.assertEqual([doctor.clinic_id for doctor in self.index.search('с')], [None, 10])
+
+    def test_background_refresh(self):
+        refreshed = Event()
+        calls = []
+
+        def refresh(index):
+            calls.append(index)
+            if len(calls) == 2:
+                refreshed.set()
+            return True
+
+        with mock.patch.object(DoctorPrefixIndex, 'refresh', autospec=True, side_effect=refresh):
+            self.assertTrue(doctor_search.start_refresher(0.01))
+            self.assertFalse(doctor_search.start_refresher(0.01))
+            try:
+                self.assertTrue(refreshed.wait(5))
+            finally:
+                doctor_search.stop_refresher()
+
+        self.assertIs(calls[0], doctor_index)
+
+    def test_warm_up_starts_refresher_once(self):
+        request_started.connect(doctor_search.warm_up, dispatch_uid='doctor_index_warm_up')
+        with override_settings(DOCTOR_INDEX_REFRESH_SECONDS=60), \
+                mock.patch('appointments.services.doctor_search.start_refresher') as start_refresher:
+            request_started.send(sender=None)
+            request_started.send(sender=None)
+
+        start_refresher.assert_called_once_with(60)
+
+
+class DoctorSearchTests(AppointmentsTestCase):
+    """Поиск врачей: индекс процесса следует за сигналами Doctor и Clinic"""
+
+    def setUp(self):
+        self.clinic = Clinic.objects.create(name='Клиника')
+        self.doctor = make_doctor(self.clinic, 'Семёнов')
+        make_doctor(Clinic.objects.create(name='Другая'), 'Семенова')
+        doctor_index.load()
+
+    def names(self, prefix: str, **options) -> list[str]:
+        return [doctor.full_name for doctor in search_doctors(prefix, **options)]
+
+    def test_search(self):
+        self.assertEqual(self.names('семе'), ['Семёнов Иван Иванович', 'Семенова Иван Иванович'])
+        self.assertEqual(self.names('семе', clinic_id=self.clinic.id), ['Семёнов Иван Иванович'])
+
+    def test_signals_update_index(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            added = make_doctor(self.clinic, 'Сидоров')
+        self.assertEqual(self.names('сид'), ['Сидоров Иван Иванович'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.doctor.last_name = 'Орлов'
+            self.doctor.full_name = 'Орлов Иван Иванович'
+            self.doctor.save()
+        self.assertEqual(self.names('семе'), ['Семенова Иван Иванович'])
+        self.assertEqual(self.names('орл', clinic_id=self.clinic.id), ['Орлов Иван Иванович'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            added.delete()
+        self.assertEqual(self.names('сид'), [])
+
+    def test_clinic_delete_detaches_doctors(self):
+        clinic_id = self.clinic.id
+        with self.captureOnCommitCallbacks(execute=True):
+            self.clinic.delete()
+
+        self.assertEqual(self.names('семёнов', clinic_id=clinic_id), [])
+        self.assertEqual([doctor.clinic_id for doctor in search_doctors('семёнов', limit=1)], [None])
+
+    def test_api(self):
+        response = self.client.get('/api/doctors/search/', {'q': 'СЕМЁ', 'limit': 1})
+
+        self.assertEqual(response.json(), {
+            'success': True,
+            'doctors': [{'id': self.doctor.id, 'full_name': 'Семёнов Иван Иванович', 'clinic_id': self.clinic.id}],
+        })
+        self.assertEqual(self.client.get('/api/doctors/search/', {'q': 'с', 'limit': 'x'}).status_code, 400)
+
+
+class FakeDataCommandTests(AppointmentsTestCase):
+    """Команда generate_fake_data"""
+
+    def test_rejects_no_clinics(self):
+        with self.assertRaises(CommandError):
+            call_command('generate_fake_data', clinics=0, stdout=io.StringIO())
+        self.assertFalse(Doctor.objects.exists())
+
+    def test_resets_cached_pages(self):
+        cache.clear()
+        self.assertNotContains(self.client.get('/doctors/'), 'Клиника №1')
+
+        call_command(
+            'generate_fake_data', clinics=1, doctors=2, days=1, start_date=date(2025, 3, 3),
+            booking_density=1, stdout=io.StringIO(),
+        )
+
+        self.assertContains(self.client.get('/doctors/'), 'Клиника №1', count=2)
+        self.assertFalse(Talon.objects.filter(is_free=True).exists())
+        doctor_id = Doctor.objects.values_list('id', flat=True)[0]
+        self.assertEqual(get_free_talons(doctor_id, date(2025, 3, 3)), [])
+
+
+class ArchiveTests(AppointmentsTestCase):
+    """Перенос прошедших талонов в архив и генерация по архивным дням"""
+
+    def setUp(self):
+        self.day = date(2025, 3, 3)
+        clinic = Clinic.objects.create(name='Клиника')
+        self.doctor = make_doctor(clinic, duration=30)
+        self.schedule = Schedule.objects.create(
+            clinic=clinic, doctor=self.doctor, date=self.day,
+            start_time=time(9), end_time=time(10), start_break_time=time(10), end_break_time=time(10),
+        )
+        split_schedule_to_talons(self.schedule.id)
+        self.booked = book_talon(Talon.objects.get(start_time=time(9)).id)
+
+    def counters(self):
+        stats = DoctorDayStats.objects.get(doctor=self.doctor, date=self.day)
+        return stats.free, stats.booked, stats.total
+
+    def test_archive_batch(self):
+        self.assertEqual(archive_batch(date(2025, 3, 4), batch_size=1), 1)
+        self.assertEqual(archive_batch(date(2025, 3, 4)), 1)
+        self.assertEqual(archive_batch(date(2025, 3, 4)), 0)
+
+        self.assertFalse(Talon.objects.exists())
+        self.assertEqual(
+            sorted(ArchivedTalon.objects.values_list('start_time', 'is_free')),
+            [(time(9), False), (time(9, 30), True)],
+        )
+        self.assertEqual(ArchivedTalon.objects.get(id=self.booked.id).version, self.booked.version)
+        self.assertEqual(self.counters(), (1, 1, 2))
+
+    def test_archive_conflict_keeps_talons(self):
+        ArchivedTalon.objects.create(
+            id=self.booked.id, doctor=self.doctor, date=date(2025, 2, 3),
+            start_time=time(9), end_time=time(9, 30), is_free=False,
+        )
+
+        with self.assertRaises(IntegrityError):
+            archive_batch(date(2025, 3, 4))
+
+        self.assertEqual(Talon.objects.count(), 2)
+        self.assertEqual(ArchivedTalon.objects.count(), 1)
+
+    def test_archived_day_is_not_regenerated(self):
+        archive_batch(date(2025, 3, 4))
+
+        self.assertEqual(split_schedule_to_talons(self.schedule.id), [])
+        self.assertEqual(generate_talons_for_schedules(schedule_ids=[self.schedule.id], workers=1).talons_created, 0)
+        self.assertFalse(Talon.objects.exists())
+        self.assertEqual(self.counters(), (1, 1, 2))
+
+    def test_refresh_days_counts_archive(self):
+        archive_batch(date(2025, 3, 4), batch_size=1)
+        DoctorDayStats.objects.update(free=0, booked=0, total=0)
+
+        refresh_days([(self.doctor.id, self.day)])
+
+        self.assertEqual(self.counters(), (1, 1, 2))
+
+
+@mock.patch('appointments.db_router.replica_configured', return_value=True)
+class ReplicaRoutingTests(AppointmentsTestCase):
+
+    def test_only_appointments_models_read_from_replica(self, _):
+        router = PrimaryReplicaRouter()
+        with replica_reads():
+            self.assertEqual(router.db_for_read(Talon), REPLICA_ALIAS)
+            self.assertEqual(router.db_for_read(Session), DEFAULT_DB_ALIAS)
+            self.assertEqual(router.db_for_read(User), DEFAULT_DB_ALIAS)
+        self.assertEqual(router.db_for_read(Talon), DEFAULT_DB_ALIAS)
+
+    def test_cache_fill_reads_primary(self, _):
+        seen = []
+
+        @cached_page(lambda request: 'test:replica-page')
+        @read_from_replica
+        def view(request):
+            seen.append(read_db())
+            return HttpResponse('ok')
+
+        request = RequestFactory().get('/')
+        view(request)
+        view(request)
+        cache.delete('test:replica-page')
+
+        self.assertEqual(seen, [DEFAULT_DB_ALIAS])
+
+    def test_pinned_user_reads_primary(self, _):
+        request = RequestFactory().get('/')
+        request.COOKIES[PIN_COOKIE_NAME] = '1'
+        seen = []
+
+        def get_response(request):
+            with replica_reads():
+                seen.append(read_db())
+            pin_to_primary(request)
+            return HttpResponse('ok')
+
+        response = ReplicaPinMiddleware(get_response)(request)
+
+        self.assertEqual(seen, [DEFAULT_DB_ALIAS])
+        self.assertIn(PIN_COOKIE_NAME, response.cookies)
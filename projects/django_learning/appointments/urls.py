@@ -1,7 +1,7 @@
 from django.urls import path
 
 from appointments import views
-from appointments.views import schedule_views, talon_views, doctor_views
+from appointments.views import schedule_views, talon_views, doctor_views, api_views, async_views, debug_views
 from appointments.views.doctor_views import doctors_list_view, doctor_detail_view
 from appointments.views.home_view import home_view
 
@@ -12,16 +12,41 @@ urlpatterns = [
     path('doctors/', doctor_views.doctors_list_view, name='doctors_list'),
     path('doctors/<int:doctor_id>/', doctor_views.doctor_detail_view, name='doctor_detail'),
     path('doctors/<int:doctor_id>/talons/', talon_views.doctor_talons_view, name='doctor_talons'),
+    path('doctors/<int:doctor_id>/availability/', doctor_views.doctor_availability_view, name='doctor_availability'),
+    path('doctors/<int:doctor_id>/slots/book/', talon_views.book_template_slot_view, name='book_template_slot'),
 
     # Schedule URLs
     path('schedules/', schedule_views.schedules_view, name='schedules'),
     path('schedules/create/', schedule_views.create_schedule_view, name='create_schedule'),
+    path('schedules/templates/create/', schedule_views.create_weekly_template_view, name='create_weekly_template'),
     path('schedules/<int:schedule_id>/generate-talons/', schedule_views.generate_talons_view, name='generate_talons'),
+    path('schedules/jobs/<int:job_id>/', schedule_views.generation_job_status_view, name='generation_job_status'),
 
     # Talon URLs
     path('talons/', talon_views.talons_view, name='talons'),
     path('talons/create/', talon_views.create_talon_view, name='create_talon'),
+    path('talons/book/', talon_views.book_talons_view, name='book_talons'),
     path('talons/<int:talon_id>/', talon_views.talon_detail_view, name='talon_detail'),
     path('talons/<int:talon_id>/book/', talon_views.book_talon_view, name='book_talon'),
     path('talons/<int:talon_id>/cancel/', talon_views.cancel_talon_view, name='cancel_talon'),
+
+    # Async (ASGI) URLs
+    path('async/doctors/', async_views.doctors_list_view, name='async_doctors_list'),
+    path('async/doctors/<int:doctor_id>/', async_views.doctor_detail_view, name='async_doctor_detail'),
+    path('async/doctors/<int:doctor_id>/talons/', async_views.doctor_talons_view, name='async_doctor_talons'),
+    path('async/talons/', async_views.talons_view, name='async_talons'),
+    path('async/talons/<int:talon_id>/', async_views.talon_detail_view, name='async_talon_detail'),
+    path('async/talons/<int:talon_id>/book/', async_views.book_talon_view, name='async_book_talon'),
+    path('async/talons/<int:talon_id>/cancel/', async_views.cancel_talon_view, name='async_cancel_talon'),
+
+    # API URLs
+    path('api/availability/', api_views.availability_api_view, name='api_availability'),
+    path('api/stats/doctors/', api_views.doctor_stats_api_view, name='api_doctor_stats'),
+    path('api/doctors/search/', api_views.doctor_search_api_view, name='api_doctor_search'),
+    path('api/export/<str:kind>/', api_views.export_view, name='api_export'),
+    path('api/clinics/<int:clinic_id>/earliest/', api_views.clinic_earliest_api_view, name='api_clinic_earliest'),
+
+    # Debug URLs
+    path('debug/cache/', debug_views.cache_stats_view, name='debug_cache'),
+    path('debug/perf/', debug_views.perf_stats_view, name='debug_perf'),
 ]
\ No newline at end of file
@@ -0,0 +1,222 @@
+# appointments/views/api_views.py
+import heapq
+from datetime import date, datetime, timedelta
+
+from django.http import JsonResponse, StreamingHttpResponse
+
+from ..db_router import read_db, read_from_replica, replica_reads
+from ..models import Clinic, Doctor, Talon
+from ..services.doctor_search import DOCTOR_SEARCH_MAX_LIMIT, search_doctors
+from ..services.export_service import EXPORT_FORMATS, EXPORTS, iter_export
+from ..services.search_service import EARLIEST_MAX_LIMIT, earliest_free_slots
+from ..services.stats_service import get_doctor_day_stats, get_doctor_totals
+from ..services.streaming import iter_columnar, iter_ndjson
+from ..services.template_grids import iter_virtual_slots
+
+# Период по умолчанию и предел периода для API доступности, дней
+AVAILABILITY_DEFAULT_DAYS = 30
+AVAILABILITY_MAX_DAYS = 92
+
+AVAILABILITY_COLUMNS = ('id', 'doctor_id', 'date', 'start_time', 'end_time')
+
+# Период по умолчанию и предел периода для статистики загрузки, дней
+STATS_DEFAULT_DAYS = 30
+STATS_MAX_DAYS = 366
+
+
+def _parse_date(value: str, default: date) -> date:
+    if not value:
+        return default
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def availability_api_view(request):
+    """
+    Свободные талоны клиники или врача за период потоком JSON -
+    GET /api/availability/?clinic_id=|doctor_id=&date_from=&date_to=&format=ndjson|columnar
+    Слоты недельных шаблонов без талонов идут в том же порядке с id null
+    """
+    output_format = request.GET.get('format', 'ndjson')
+
+    try:
+        clinic_id = int(request.GET['clinic_id']) if request.GET.get('clinic_id') else None
+        doctor_id = int(request.GET['doctor_id']) if request.GET.get('doctor_id') else None
+        if clinic_id is None and doctor_id is None:
+            raise ValueError("Укажите clinic_id или doctor_id")
+        if output_format not in ('ndjson', 'columnar'):
+            raise ValueError("format должен быть ndjson или columnar")
+        date_from = _parse_date(request.GET.get('date_from'), date.today())
+        date_to = _parse_date(
+            request.GET.get('date_to'),
+            date_from + timedelta(days=AVAILABILITY_DEFAULT_DAYS - 1)
+        )
+        if not timedelta(0) <= date_to - date_from < timedelta(days=AVAILABILITY_MAX_DAYS):
+            raise ValueError(f"Период должен быть от 1 до {AVAILABILITY_MAX_DAYS} дней")
+        chunk_size = min(max(int(request.GET.get('chunk_size', 2000)), 100), 10000)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+
+    # Ответ читается после выхода из view, поэтому алиас реплики фиксируем сразу
+    with replica_reads():
+        talons = Talon.objects.using(read_db()).filter(is_free=True, date__range=(date_from, date_to))
+    if doctor_id is not None:
+        talons = talons.filter(doctor_id=doctor_id)
+    if clinic_id is not None:
+        talons = talons.filter(doctor__clinic_id=clinic_id)
+
+    # values_list + iterator: без экземпляров моделей и без кэша queryset,
+    # строки читаются из курсора порциями по chunk_size
+    rows = talons.order_by('date', 'start_time', 'id').values_list(
+        *AVAILABILITY_COLUMNS
+    ).iterator(chunk_size=chunk_size)
+    # Виртуальные слоты строятся окнами по неделе по мере чтения ответа
+    # и вливаются в поток талонов по (date, start_time)
+    rows = heapq.merge(
+        rows,
+        iter_virtual_slots(
+            date_from, date_to,
+            doctor_ids=[doctor_id] if doctor_id is not None else None,
+            clinic_id=clinic_id,
+        ),
+        key=lambda row: (row[2], row[3]),
+    )
+
+    if output_format == 'columnar':
+        return StreamingHttpResponse(
+            iter_columnar(rows, AVAILABILITY_COLUMNS, chunk_size),
+            content_type='application/json'
+        )
+    return StreamingHttpResponse(
+        iter_ndjson(rows, AVAILABILITY_COLUMNS),
+        content_type='application/x-ndjson'
+    )
+
+
+@read_from_replica
+def doctor_stats_api_view(request):
+    """
+    Загрузка врачей по дням из DoctorDayStats и слотов недельных шаблонов -
+    GET /api/stats/doctors/?clinic_id=|doctor_id=&date_from=&date_to=&days=1
+    Без days=1 отдаются только итоги по врачам за период
+    """
+    clinic_id = request.GET.get('clinic_id')
+    doctor_id = request.GET.get('doctor_id')
+
+    try:
+        date_to = _parse_date(request.GET.get('date_to'), date.today())
+        date_from = _parse_date(
+            request.GET.get('date_from'),
+            date_to - timedelta(days=STATS_DEFAULT_DAYS - 1)
+        )
+        if not timedelta(0) <= date_to - date_from < timedelta(days=STATS_MAX_DAYS):
+            raise ValueError(f"Период должен быть от 1 до {STATS_MAX_DAYS} дней")
+        filters = {
+            'doctor_id': int(doctor_id) if doctor_id else None,
+            'clinic_id': int(clinic_id) if clinic_id else None,
+        }
+    except ValueError as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+
+    data = {
+        'success': True,
+        'date_from': date_from.isoformat(),
+        'date_to': date_to.isoformat(),
+        'doctors': get_doctor_totals(date_from, date_to, **filters),
+    }
+    if request.GET.get('days') == '1':
+        data['days'] = [
+            {**row, 'date': row['date'].isoformat()}
+            for row in get_doctor_day_stats(date_from, date_to, **filters)
+        ]
+    return JsonResponse(data)
+
+
+@read_from_replica
+def clinic_earliest_api_view(request, clinic_id: int):
+    """
+    Ближайшие свободные талоны клиники по всем врачам -
+    GET /api/clinics/{id}/earliest/?after=YYYY-MM-DDTHH:MM&limit=10
+    Слоты недельных шаблонов без талонов отдаются с id null
+    """
+    try:
+        after = request.GET.get('after')
+        after = datetime.fromisoformat(after).replace(tzinfo=None) if after else None
+        limit = min(max(int(request.GET.get('limit', 10)), 1), EARLIEST_MAX_LIMIT)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+
+    if not Clinic.objects.filter(id=clinic_id).exists():
+        return JsonResponse({'success': False, 'message': f"Клиника с id {clinic_id} не найдена"}, status=404)
+
+    doctor_names = dict(Doctor.objects.filter(clinic_id=clinic_id).values_list('id', 'full_name'))
+    slots = earliest_free_slots(clinic_id, after=after, limit=limit, doctor_ids=list(doctor_names))
+    return JsonResponse({
+        'success': True,
+        'talons': [
+            {
+                'id': slot.talon_id,
+                'doctor_id': slot.doctor_id,
+                'doctor_full_name': doctor_names[slot.doctor_id],
+                'date': slot.date.isoformat(),
+                'start_time': slot.start_time.isoformat(),
+                'end_time': slot.end_time.isoformat(),
+            }
+            for slot in slots
+        ],
+    })
+
+
+def export_view(request, kind: str):
+    """
+    Выгрузка талонов или графиков потоком -
+    GET /api/export/{talons|schedules}/?format=csv|ndjson&date_from=&date_to=&clinic_id=&gzip=1&include_archived=1
+    """
+    output_format = request.GET.get('format', 'csv')
+    compress = request.GET.get('gzip') == '1'
+
+    try:
+        if kind not in EXPORTS:
+            raise ValueError(f"Неизвестная выгрузка {kind}")
+        if output_format not in EXPORT_FORMATS:
+            raise ValueError("format должен быть csv или ndjson")
+        date_from = _parse_date(request.GET.get('date_from'), None)
+        date_to = _parse_date(request.GET.get('date_to'), None)
+        clinic_id = int(request.GET['clinic_id']) if request.GET.get('clinic_id') else None
+    except ValueError as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+
+    # Как и в API доступности, алиас реплики фиксируем до выхода из view
+    with replica_reads():
+        chunks = iter_export(
+            kind, output_format, compress,
+            date_from=date_from, date_to=date_to, clinic_id=clinic_id, using=read_db(),
+            include_archived=request.GET.get('include_archived') == '1',
+        )
+
+    filename = f"{kind}.{output_format}"
+    if compress:
+        filename += '.gz'
+        content_type = 'application/gzip'
+    else:
+        content_type = 'text/csv; charset=utf-8' if output_format == 'csv' else 'application/x-ndjson'
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def doctor_search_api_view(request):
+    """
+    Поиск врачей по началу ФИО, фамилии или имени -
+    GET /api/doctors/search/?q=&clinic_id=&limit=10
+    """
+    try:
+        clinic_id = int(request.GET['clinic_id']) if request.GET.get('clinic_id') else None
+        limit = min(max(int(request.GET.get('limit', 10)), 1), DOCTOR_SEARCH_MAX_LIMIT)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+
+    doctors = search_doctors(request.GET.get('q', ''), clinic_id=clinic_id, limit=limit)
+    return JsonResponse({
+        'success': True,
+        'doctors': [doctor._asdict() for doctor in doctors],
+    })
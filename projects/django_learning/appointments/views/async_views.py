@@ -0,0 +1,115 @@
+# appointments/views/async_views.py
+"""
+Асинхронные версии страниц списков, деталей и бронирования для ASGI.
+Запросы идут через асинхронный ORM (aget, aupdate, async for), поэтому
+медленный запрос не занимает поток воркера. Все связанные объекты,
+нужные шаблонам, загружаются заранее через select_related: ленивая
+подгрузка в асинхронном контексте запрещена
+"""
+from django.contrib import messages
+from django.http import Http404, HttpResponseBadRequest
+from django.shortcuts import render, redirect
+
+from ..db_router import pin_to_primary, read_from_replica
+from ..models import Doctor, Talon
+from ..services.doctor_service import aget_doctor_rows
+from ..services.talon_service import abook_talon, acancel_talon, aget_talons_page
+from .talon_views import page_queries, parse_talon_filters
+
+
+async def _render_talons_page(request, page_title: str, doctor: Doctor = None):
+    filters = parse_talon_filters(request)
+    try:
+        page = await aget_talons_page(doctor_id=doctor.id if doctor else None, **filters)
+    except ValueError:
+        return HttpResponseBadRequest("Неверный курсор страницы")
+
+    first_query, next_query = page_queries(request, page.next_cursor)
+
+    return render(request, 'talons/index.html', {
+        'talons': page.talons,
+        'doctor': doctor,
+        'filters': filters,
+        'first_query': first_query,
+        'next_query': next_query,
+        'page_title': page_title
+    })
+
+
+async def _aget_doctor(doctor_id: int) -> Doctor:
+    try:
+        return await Doctor.objects.select_related('clinic').aget(id=doctor_id)
+    except Doctor.DoesNotExist:
+        raise Http404("Doctor not found")
+
+
+@read_from_replica
+async def talons_view(request):
+    """Список талонов постранично - GET /async/talons/"""
+    return await _render_talons_page(request, 'Талоны')
+
+
+@read_from_replica
+async def doctor_talons_view(request, doctor_id: int):
+    """Талоны конкретного врача постранично - GET /async/doctors/{id}/talons/"""
+    doctor = await _aget_doctor(doctor_id)
+    return await _render_talons_page(request, f'Талоны врача {doctor.full_name}', doctor=doctor)
+
+
+@read_from_replica
+async def doctors_list_view(request):
+    """Список врачей - GET /async/doctors/"""
+    doctors = await aget_doctor_rows()
+    return render(request, 'doctors/index.html', {
+        'doctors': doctors,
+        'total_count': len(doctors),
+        'page_title': 'Список врачей',
+    })
+
+
+@read_from_replica
+async def doctor_detail_view(request, doctor_id: int):
+    """Детали врача - GET /async/doctors/{id}/"""
+    doctor = await _aget_doctor(doctor_id)
+    page = await aget_talons_page(doctor_id=doctor.id)
+    return render(request, 'doctors/detail.html', {
+        'doctor': doctor,
+        'talons': page.talons,
+        'has_more_talons': page.next_cursor is not None,
+        'page_title': f'Доктор {doctor.full_name}',
+    })
+
+
+async def talon_detail_view(request, talon_id: int):
+    """Детали талона - GET /async/talons/{id}/"""
+    try:
+        talon = await Talon.objects.select_related('doctor').aget(id=talon_id)
+    except Talon.DoesNotExist:
+        raise Http404("Talon not found")
+
+    return render(request, 'talons/detail.html', {
+        'talon': talon,
+        'page_title': f'Талон #{talon.id}'
+    })
+
+
+async def book_talon_view(request, talon_id: int):
+    """Забронировать талон - POST /async/talons/{id}/book/"""
+    try:
+        await abook_talon(talon_id)
+        pin_to_primary(request)
+        messages.success(request, f"Талон #{talon_id} успешно забронирован!")
+    except Exception as e:
+        messages.error(request, str(e))
+    return redirect('talon_detail', talon_id=talon_id)
+
+
+async def cancel_talon_view(request, talon_id: int):
+    """Отменить бронирование талона - POST /async/talons/{id}/cancel/"""
+    try:
+        await acancel_talon(talon_id)
+        pin_to_primary(request)
+        messages.success(request, f"Бронирование талона #{talon_id} отменено")
+    except Exception as e:
+        messages.error(request, str(e))
+    return redirect('talon_detail', talon_id=talon_id)
@@ -0,0 +1,26 @@
+# appointments/views/debug_views.py
+from django.conf import settings
+from django.http import Http404, JsonResponse
+
+from ..services.availability_cache import get_cache_stats
+from ..services.page_cache import get_page_cache_stats
+from ..middleware import get_perf_stats
+
+
+def cache_stats_view(request):
+    """Статистика кэшей этого процесса - GET /debug/cache/ (только при DEBUG)"""
+    if not settings.DEBUG:
+        raise Http404()
+
+    return JsonResponse({
+        'availability': get_cache_stats(),
+        'pages': get_page_cache_stats(),
+    })
+
+
+def perf_stats_view(request):
+    """Скользящие перцентили по URL из PerformanceMiddleware - GET /debug/perf/ (только при DEBUG)"""
+    if not settings.DEBUG:
+        raise Http404()
+
+    return JsonResponse(get_perf_stats())
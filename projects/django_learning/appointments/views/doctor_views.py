@@ -1,13 +1,19 @@
 # appointments/views/doctor_views.py
 from django.shortcuts import render, get_object_or_404
-from django.http import Http404
-from ..models import Doctor, Talon
-from ..services.doctor_service import get_doctors, get_doctor_by_id
+from django.http import Http404, JsonResponse
+from ..models import Doctor
+from ..services.doctor_service import get_doctor_rows, get_doctor_by_id
+from ..services.talon_service import get_talons_page
+from ..services.template_service import get_day_slots
+from ..services.page_cache import cached_page, versioned_key, doctors_scope, doctor_scope
+from datetime import datetime
 
 
+# Кэшируемые страницы заполняются с основной БД, поэтому без read_from_replica
+@cached_page(lambda request: versioned_key('page:doctors_list', [doctors_scope()]))
 def doctors_list_view(request):
     """Список врачей - GET /doctors/"""
-    doctors = get_doctors()
+    doctors = get_doctor_rows()
     context = {
         'doctors': doctors,
         'total_count': len(doctors),
@@ -16,18 +22,50 @@ def doctors_list_view(request):
     return render(request, 'doctors/index.html', context)
 
 
+@cached_page(lambda request, doctor_id: versioned_key('page:doctor_detail', [doctor_scope(doctor_id)], doctor_id))
 def doctor_detail_view(request, doctor_id: int):
     """Детали врача - GET /doctors/{id}/"""
     doctor = get_doctor_by_id(doctor_id)
     if not doctor:
         raise Http404("Doctor not found")
 
-    # Получаем талоны врача
-    talons = Talon.objects.filter(doctor=doctor).order_by('date', 'start_time')
+    # Только первая страница талонов, остальные - на странице талонов врача
+    page = get_talons_page(doctor_id=doctor.id)
 
     context = {
         'doctor': doctor,
-        'talons': talons,
+        'talons': page.talons,
+        'has_more_talons': page.next_cursor is not None,
         'page_title': f'Доктор {doctor.full_name}',
     }
-    return render(request, 'doctors/detail.html', context)
\ No newline at end of file
+    return render(request, 'doctors/detail.html', context)
+
+
+def doctor_availability_view(request, doctor_id: int):
+    """
+    Свободные талоны врача на дату - GET /doctors/{id}/availability/?date=YYYY-MM-DD
+    Слоты недельного шаблона, для которых талона еще нет, отдаются с id null
+    """
+    get_object_or_404(Doctor, id=doctor_id)
+    try:
+        day = datetime.strptime(request.GET.get('date', ''), '%Y-%m-%d').date()
+    except ValueError:
+        return JsonResponse({
+            'success': False,
+            'message': 'Укажите дату в формате YYYY-MM-DD'
+        }, status=400)
+
+    free_talons = get_day_slots(doctor_id, day)
+    return JsonResponse({
+        'success': True,
+        'doctor_id': doctor_id,
+        'date': day.isoformat(),
+        'talons': [
+            {
+                'id': talon_id,
+                'start_time': start_time.strftime('%H:%M'),
+                'end_time': end_time.strftime('%H:%M'),
+            }
+            for talon_id, start_time, end_time in free_talons
+        ]
+    })
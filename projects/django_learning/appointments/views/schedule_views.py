@@ -2,24 +2,70 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.http import JsonResponse
 from django.contrib import messages
-from ..models import Schedule, Doctor, Clinic, Talon
-from ..services.schedule_service import split_schedule_to_talons
-from datetime import datetime
-
-
+from django.core.exceptions import ValidationError
+from ..models import Doctor, Clinic, WeeklyTemplate
+from ..db_router import read_from_replica
+from django.utils.safestring import mark_safe
+from ..services.schedule_service import (
+    split_schedule_to_talons,
+    get_schedules,
+    load_schedule_cards,
+    get_schedule_date_bounds,
+)
+from ..services.job_service import create_schedule_with_job, get_job_status
+from ..services.read_models import ScheduleRow
+from ..services.template_service import create_weekly_template
+from ..services.page_cache import (
+    render_cached_fragments,
+    versioned_key,
+    schedule_scope,
+    doctor_scope,
+    clinic_scope,
+)
+from datetime import date, datetime, timedelta
+
+# Сколько дней графиков показывать на одной странице
+SCHEDULES_PAGE_DAYS = 7
+
+
+def schedule_card_key(schedule: ScheduleRow) -> str:
+    return versioned_key(
+        'fragment:schedule_card',
+        [schedule_scope(schedule.id), doctor_scope(schedule.doctor_id), clinic_scope(schedule.clinic_id)],
+        schedule.id
+    )
+
+
+@read_from_replica
 def schedules_view(request):
-    """Список всех графиков - GET /schedules/"""
-    schedules = Schedule.objects.all().select_related('doctor', 'clinic').order_by('-date', 'start_time')
+    """Список графиков постранично по SCHEDULES_PAGE_DAYS дней - GET /schedules/?date_to=YYYY-MM-DD"""
+    first_date, last_date = get_schedule_date_bounds()
 
-    # Для каждого расписания получаем талоны
-    for schedule in schedules:
-        schedule.talons = Talon.objects.filter(
-            doctor=schedule.doctor,
-            date=schedule.date
-        ).order_by('start_time')
+    try:
+        date_to = datetime.strptime(request.GET['date_to'], '%Y-%m-%d').date()
+    except (KeyError, ValueError):
+        date_to = last_date or date.today()
+    date_from = date_to - timedelta(days=SCHEDULES_PAGE_DAYS - 1)
+
+    # Карточки графиков кэшируются по версиям графика, врача и клиники;
+    # графики без кэша перечитываются с основной БД вместе с талонами (одним запросом)
+    schedules = get_schedules(date_from, date_to)
+    fragments = render_cached_fragments(
+        'schedules/_card.html',
+        schedules,
+        'schedule',
+        key_func=schedule_card_key,
+        prepare=load_schedule_cards,
+    )
+    for schedule, html in zip(schedules, fragments):
+        schedule.card_html = mark_safe(html)
 
     return render(request, 'schedules/index.html', {
         'schedules': schedules,
+        'date_from': date_from,
+        'date_to': date_to,
+        'newer_date_to': date_to + timedelta(days=SCHEDULES_PAGE_DAYS) if last_date and date_to < last_date else None,
+        'older_date_to': date_from - timedelta(days=1) if first_date and date_from > first_date else None,
         'page_title': 'Расписания'
     })
 
@@ -46,8 +92,8 @@ def create_schedule_view(request):
             doctor = get_object_or_404(Doctor, id=doctor_id)
             clinic = get_object_or_404(Clinic, id=clinic_id)
 
-            # Создаем график
-            schedule = Schedule.objects.create(
+            # Создаем график, а талоны генерирует воркер очереди
+            schedule, job = create_schedule_with_job(
                 clinic=clinic,
                 doctor=doctor,
                 date=date,
@@ -57,15 +103,14 @@ def create_schedule_view(request):
                 end_break_time=end_break_time
             )
 
-            # Автоматически создаем талоны из графика
-            created_talons = split_schedule_to_talons(schedule.id)
-
             messages.success(
                 request,
-                f"График создан успешно! Создано {len(created_talons)} талонов."
+                f"График создан успешно! Талоны создаются в фоне, задача #{job.id}."
             )
             return redirect('schedules')
 
+        except ValidationError as e:
+            messages.error(request, f"Ошибка при создании графика: {' '.join(e.messages)}")
         except Exception as e:
             messages.error(request, f"Ошибка при создании графика: {str(e)}")
 
@@ -79,17 +124,66 @@ def create_schedule_view(request):
     })
 
 
+def create_weekly_template_view(request):
+    """Создание недельного шаблона графика - GET/POST /schedules/templates/create/"""
+    if request.method == 'POST':
+        try:
+            doctor = get_object_or_404(Doctor, id=request.POST.get('doctor_id'))
+            clinic = get_object_or_404(Clinic, id=request.POST.get('clinic_id'))
+            valid_to = request.POST.get('valid_to')
+
+            template = create_weekly_template(
+                clinic=clinic,
+                doctor=doctor,
+                weekday=int(request.POST.get('weekday')),
+                start_time=datetime.strptime(request.POST.get('start_time'), '%H:%M').time(),
+                end_time=datetime.strptime(request.POST.get('end_time'), '%H:%M').time(),
+                start_break_time=datetime.strptime(request.POST.get('start_break_time'), '%H:%M').time(),
+                end_break_time=datetime.strptime(request.POST.get('end_break_time'), '%H:%M').time(),
+                valid_from=datetime.strptime(request.POST.get('valid_from'), '%Y-%m-%d').date(),
+                valid_to=datetime.strptime(valid_to, '%Y-%m-%d').date() if valid_to else None,
+            )
+
+            messages.success(
+                request,
+                f"Шаблон #{template.id} создан: слоты появятся в доступности врача без генерации талонов."
+            )
+            return redirect('schedules')
+
+        except ValidationError as e:
+            messages.error(request, f"Ошибка при создании шаблона: {' '.join(e.messages)}")
+        except Exception as e:
+            messages.error(request, f"Ошибка при создании шаблона: {str(e)}")
+
+    return render(request, 'schedules/create_template.html', {
+        'doctors': Doctor.objects.all(),
+        'clinics': Clinic.objects.all(),
+        'weekdays': WeeklyTemplate.WEEKDAY_CHOICES,
+    })
+
+
 def generate_talons_view(request, schedule_id):
     """Создание талонов из графика - POST /schedules/{id}/generate-talons/"""
     try:
-        created_talons = split_schedule_to_talons(schedule_id)
+        talons_created = len(split_schedule_to_talons(schedule_id))
         return JsonResponse({
             'success': True,
-            'message': f'Создано {len(created_talons)} талонов',
-            'talon_count': len(created_talons)
+            'message': f'Создано {talons_created} талонов',
+            'talon_count': talons_created
         })
     except Exception as e:
         return JsonResponse({
             'success': False,
             'message': str(e)
-        }, status=400)
\ No newline at end of file
+        }, status=400)
+
+
+def generation_job_status_view(request, job_id):
+    """Состояние задачи генерации талонов - GET /schedules/jobs/{id}/"""
+    job = get_job_status(job_id)
+    if job is None:
+        return JsonResponse({
+            'success': False,
+            'message': f'Задача с id {job_id} не найдена'
+        }, status=404)
+    return JsonResponse({'success': True, 'job': job})
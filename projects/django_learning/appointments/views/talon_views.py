@@ -1,32 +1,75 @@
 # appointments/views/talon_views.py
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import JsonResponse
+from django.http import HttpResponseBadRequest, JsonResponse
 from django.contrib import messages
+from django.core.exceptions import ValidationError
 from ..models import Talon, Doctor
-from ..services.talon_service import book_talon, cancel_talon
+from ..db_router import pin_to_primary, read_from_replica
+from ..services.talon_service import book_talon, book_talons, cancel_talon, create_talon, get_talons_page
+from ..services.template_service import book_template_slot
 from datetime import datetime
+from typing import Optional
 
 
-def talons_view(request):
-    """Список всех талонов - GET /talons/"""
-    talons = Talon.objects.all().select_related('doctor').order_by('date', 'start_time')
+def parse_talon_filters(request) -> dict:
+    """Фильтры и курсор списков талонов из GET-параметров"""
+    filters = {
+        'cursor': request.GET.get('cursor') or None,
+        'include_archived': request.GET.get('include_archived') == '1',
+    }
+    for name in ('date_from', 'date_to'):
+        try:
+            filters[name] = datetime.strptime(request.GET[name], '%Y-%m-%d').date()
+        except (KeyError, ValueError):
+            filters[name] = None
+    filters['is_free'] = {'1': True, '0': False}.get(request.GET.get('is_free'))
+    return filters
+
+
+def page_queries(request, next_cursor: Optional[str]) -> tuple[str, Optional[str]]:
+    """Строки запроса первой и следующей страницы с текущими фильтрами"""
+    query = request.GET.copy()
+    query.pop('cursor', None)
+    first_query = query.urlencode()
+    next_query = None
+    if next_cursor:
+        query['cursor'] = next_cursor
+        next_query = query.urlencode()
+    return first_query, next_query
+
+
+def render_talons_page(request, page_title: str, doctor: Doctor = None):
+    """Общий рендер страницы списка талонов с keyset-пагинацией"""
+    filters = parse_talon_filters(request)
+    try:
+        page = get_talons_page(doctor_id=doctor.id if doctor else None, **filters)
+    except ValueError:
+        # Курсор приходит от клиента - это ошибка запроса, а не отсутствующая страница
+        return HttpResponseBadRequest("Неверный курсор страницы")
+
+    first_query, next_query = page_queries(request, page.next_cursor)
 
     return render(request, 'talons/index.html', {
-        'talons': talons,
-        'page_title': 'Талоны'
+        'talons': page.talons,
+        'doctor': doctor,
+        'filters': filters,
+        'first_query': first_query,
+        'next_query': next_query,
+        'page_title': page_title
     })
 
 
+@read_from_replica
+def talons_view(request):
+    """Список талонов постранично - GET /talons/?date_from=&date_to=&is_free=&cursor=&include_archived="""
+    return render_talons_page(request, 'Талоны')
+
+
+@read_from_replica
 def doctor_talons_view(request, doctor_id):
-    """Талоны конкретного врача - GET /doctors/{id}/talons/"""
+    """Талоны конкретного врача постранично - GET /doctors/{id}/talons/"""
     doctor = get_object_or_404(Doctor, id=doctor_id)
-    talons = Talon.objects.filter(doctor=doctor).select_related('doctor').order_by('date', 'start_time')
-
-    return render(request, 'talons/index.html', {
-        'talons': talons,
-        'doctor': doctor,
-        'page_title': f'Талоны врача {doctor.full_name}'
-    })
+    return render_talons_page(request, f'Талоны врача {doctor.full_name}', doctor=doctor)
 
 
 def talon_detail_view(request, talon_id):
@@ -42,7 +85,8 @@ def talon_detail_view(request, talon_id):
 def book_talon_view(request, talon_id):
     """Забронировать талон - POST /talons/{id}/book/"""
     try:
-        talon = book_talon(talon_id)
+        book_talon(talon_id)
+        pin_to_primary(request)
         messages.success(request, f"Талон #{talon_id} успешно забронирован!")
         return redirect('talon_detail', talon_id=talon_id)
     except Exception as e:
@@ -50,10 +94,59 @@ def book_talon_view(request, talon_id):
         return redirect('talon_detail', talon_id=talon_id)
 
 
+def book_talons_view(request):
+    """Забронировать несколько талонов сразу - POST /talons/book/ talon_ids=1&talon_ids=2"""
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'message': 'Метод не поддерживается'}, status=405)
+
+    try:
+        talon_ids = [int(talon_id) for talon_id in request.POST.getlist('talon_ids')]
+        if not talon_ids:
+            raise ValueError("Не переданы talon_ids")
+        talons = book_talons(talon_ids)
+        pin_to_primary(request)
+        return JsonResponse({
+            'success': True,
+            'message': f'Забронировано {len(talons)} талонов',
+            'talon_ids': [talon.id for talon in talons]
+        })
+    except Exception as e:
+        return JsonResponse({
+            'success': False,
+            'message': ' '.join(e.messages) if isinstance(e, ValidationError) else str(e)
+        }, status=400)
+
+
+def book_template_slot_view(request, doctor_id):
+    """
+    Забронировать слот недельного шаблона, у которого еще нет талона -
+    POST /doctors/{id}/slots/book/ date=YYYY-MM-DD&start_time=HH:MM
+    """
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'message': 'Метод не поддерживается'}, status=405)
+
+    try:
+        day = datetime.strptime(request.POST.get('date', ''), '%Y-%m-%d').date()
+        start_time = datetime.strptime(request.POST.get('start_time', ''), '%H:%M').time()
+        talon = book_template_slot(doctor_id, day, start_time)
+        pin_to_primary(request)
+        return JsonResponse({
+            'success': True,
+            'message': f'Талон #{talon.id} забронирован',
+            'talon_id': talon.id
+        })
+    except Exception as e:
+        return JsonResponse({
+            'success': False,
+            'message': ' '.join(e.messages) if isinstance(e, ValidationError) else str(e)
+        }, status=400)
+
+
 def cancel_talon_view(request, talon_id):
     """Отменить бронирование талона - POST /talons/{id}/cancel/"""
     try:
-        talon = cancel_talon(talon_id)
+        cancel_talon(talon_id)
+        pin_to_primary(request)
         messages.success(request, f"Бронирование талона #{talon_id} отменено")
         return redirect('talon_detail', talon_id=talon_id)
     except Exception as e:
@@ -80,13 +173,7 @@ def create_talon_view(request):
             doctor = Doctor.objects.get(id=doctor_id)
 
             # Создаем талон
-            talon = Talon.objects.create(
-                doctor=doctor,
-                date=date,
-                start_time=start_time,
-                end_time=end_time,
-                is_free=True
-            )
+            talon = create_talon(doctor.id, date, start_time, end_time)
 
             messages.success(request, "Талон создан успешно!")
             return redirect('talon_detail', talon_id=talon.id)
@@ -0,0 +1,52 @@
+# benchmarks/_django.py
+"""
+Общая подготовка для бенчмарков: настройка Django и отдельная тестовая БД,
+чтобы замеры не трогали рабочий db.sqlite3.
+
+Запуск из каталога проекта:
+    python -m benchmarks.<имя_модуля>
+"""
+import atexit
+import os
+import time
+from contextlib import contextmanager
+
+
+def setup_django(file_db: bool = False):
+    """
+    Инициализирует Django и создает чистую тестовую БД с миграциями.
+    file_db=True - тестовая SQLite в файле, а не в памяти: нужно для
+    многопоточных замеров, где важны настоящие блокировки БД
+    """
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'django_learning.settings')
+
+    import django
+    django.setup()
+
+    from django.conf import settings
+    from django.db import connection
+    from django.test.utils import setup_databases, setup_test_environment, teardown_databases
+
+    if file_db and connection.vendor == 'sqlite':
+        settings.DATABASES['default'].setdefault('TEST', {})['NAME'] = str(
+            settings.BASE_DIR / 'benchmark.sqlite3'
+        )
+
+    setup_test_environment()
+    # setup_databases, как и тест-раннер, настраивает и зеркала (реплику)
+    old_config = setup_databases(verbosity=0, interactive=False)
+    atexit.register(teardown_databases, old_config, verbosity=0)
+
+
+@contextmanager
+def measure():
+    """Замеряет время выполнения и количество SQL-запросов блока"""
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    result = {}
+    with CaptureQueriesContext(connection) as queries:
+        started = time.perf_counter()
+        yield result
+        result['seconds'] = time.perf_counter() - started
+    result['queries'] = len(queries)
@@ -0,0 +1,72 @@
+# benchmarks/bench_availability_cache.py
+"""
+Бенчмарк вопроса "какие талоны свободны у врача X на дату D":
+прямой запрос к Talon против кэша доступности.
+
+    python -m benchmarks.bench_availability_cache
+"""
+import random
+from datetime import date, time, timedelta
+
+from benchmarks._django import setup_django, measure
+
+DOCTORS = 20
+DAYS = 30
+LOOKUPS = 5_000
+
+
+def run():
+    from appointments.models import Clinic, Doctor, Schedule, Talon
+    from appointments.services.availability_cache import (
+        get_free_talons, get_cache_stats, reset_cache_stats,
+    )
+    from appointments.services.schedule_service import generate_talons_for_schedules
+    from appointments.services.talon_service import book_talon
+
+    clinic = Clinic.objects.create(name='Бенчмарк')
+    doctors = Doctor.objects.bulk_create([
+        Doctor(clinic=clinic, last_name=f'Врач{i}', first_name='Иван', patronymic='Иванович',
+               full_name=f'Врач{i} Иван Иванович', duration=15)
+        for i in range(DOCTORS)
+    ])
+    days = [date(2025, 3, 1) + timedelta(days=i) for i in range(DAYS)]
+    Schedule.objects.bulk_create([
+        Schedule(clinic=clinic, doctor=doctor, date=day, start_time=time(8), end_time=time(20),
+                 start_break_time=time(13), end_break_time=time(14))
+        for doctor in doctors for day in days
+    ])
+    generate_talons_for_schedules(clinic_id=clinic.id)
+
+    random.seed(1)
+    lookups = [(random.choice(doctors).id, random.choice(days)) for _ in range(LOOKUPS)]
+
+    def uncached(doctor_id, day):
+        return list(Talon.objects.filter(
+            doctor_id=doctor_id, date=day, is_free=True
+        ).order_by('start_time').values_list('id', 'start_time', 'end_time'))
+
+    with measure() as direct:
+        for doctor_id, day in lookups:
+            uncached(doctor_id, day)
+
+    reset_cache_stats()
+    with measure() as cached:
+        for doctor_id, day in lookups:
+            get_free_talons(doctor_id, day)
+
+    # Бронирование сбрасывает ровно один врачо-день, и следующий ответ уже без этого талона
+    doctor_id, day = lookups[0]
+    talon_id = get_free_talons(doctor_id, day)[0][0]
+    book_talon(talon_id)
+    assert talon_id not in {row[0] for row in get_free_talons(doctor_id, day)}
+
+    print(f"{'путь':>10} {'запросов':>9} {'время, мс':>10} {'мкс/запрос':>11}")
+    for name, result in (('без кэша', direct), ('с кэшем', cached)):
+        print(f"{name:>10} {result['queries']:>9} {result['seconds'] * 1000:>10.1f} "
+              f"{result['seconds'] / LOOKUPS * 1e6:>11.1f}")
+    print(get_cache_stats())
+
+
+if __name__ == '__main__':
+    setup_django()
+    run()
@@ -0,0 +1,185 @@
+# benchmarks/bench_booking_contention.py
+"""
+Конкурентные бронирования и отмены горячих талонов из нескольких потоков:
+  - блокировки: select_for_update, как было раньше;
+  - CAS: и бронирование, и отмена через compare-and-swap по version
+    (_change_talon_state - путь cancel_talon) с повторами;
+  - сервис: как в приложении - условный UPDATE при бронировании (book_talon)
+    и CAS при отмене (cancel_talon).
+Считаются пропускная способность, доля отказов (ошибки БД и исчерпанные
+повторы) и доля неудачных попыток CAS - конфликтов версий, после которых
+оптимистичная схема повторяет чтение. Бронирование уже занятого талона -
+обычный исход, а не отказ.
+
+    python -m benchmarks.bench_booking_contention --threads 8 --operations 200
+"""
+import argparse
+import random
+import threading
+import time
+from datetime import date, time as day_time
+
+from benchmarks._django import setup_django
+
+
+# Горячие талоны идут по минуте подряд с 08:00 до конца суток
+DAY_START_MINUTES = 8 * 60
+MAX_HOT_TALONS = 24 * 60 - 1 - DAY_START_MINUTES
+
+
+def _minutes_to_time(minutes: int) -> day_time:
+    return day_time(minutes // 60, minutes % 60)
+
+
+def locking_book(talon_id: int):
+    """Бронирование в прежнем виде: блокировка строки, проверка и save()"""
+    from django.core.exceptions import ValidationError
+    from django.db import transaction
+    from appointments.models import Talon
+
+    with transaction.atomic():
+        talon = Talon.objects.select_for_update().get(id=talon_id)
+        if not talon.is_free:
+            raise ValidationError("Талон уже забронирован")
+        talon.is_free = False
+        talon.save()
+
+
+def locking_cancel(talon_id: int):
+    from django.db import transaction
+    from appointments.models import Talon
+
+    with transaction.atomic():
+        talon = Talon.objects.select_for_update().get(id=talon_id)
+        talon.is_free = True
+        talon.save()
+
+
+def cas_book(talon_id: int):
+    """Бронирование тем же compare-and-swap по version, что и отмена"""
+    from django.core.exceptions import ValidationError
+    from appointments.services.talon_service import _change_talon_state
+
+    _, changed = _change_talon_state(talon_id, is_free=False)
+    if not changed:
+        raise ValidationError("Талон уже забронирован")
+
+
+def count_cas_attempts(counters: dict, lock: threading.Lock):
+    """Подменяет _compare_and_swap оберткой, считающей попытки и конфликты версий"""
+    from appointments.services import talon_service
+
+    compare_and_swap = talon_service._compare_and_swap
+
+    def counted(talon, **changes):
+        swapped = compare_and_swap(talon, **changes)
+        with lock:
+            counters['attempts'] += 1
+            counters['conflicts'] += not swapped
+        return swapped
+
+    talon_service._compare_and_swap = counted
+    return compare_and_swap
+
+
+def run_workload(name: str, book, cancel, talon_ids: list[int], threads: int, operations: int) -> dict:
+    from django.core.exceptions import ValidationError
+    from django.db import connection, DatabaseError
+
+    from appointments.services import talon_service
+
+    counters = {'ok': 0, 'already_booked': 0, 'aborted': 0}
+    lock = threading.Lock()
+    start_barrier = threading.Barrier(threads)
+    cas = {'attempts': 0, 'conflicts': 0}
+    original_cas = count_cas_attempts(cas, lock)
+
+    def worker(seed: int):
+        rng = random.Random(seed)
+        local = {'ok': 0, 'already_booked': 0, 'aborted': 0}
+        start_barrier.wait()
+        try:
+            for _ in range(operations):
+                talon_id = rng.choice(talon_ids)
+                try:
+                    if rng.random() < 0.5:
+                        book(talon_id)
+                    else:
+                        cancel(talon_id)
+                    local['ok'] += 1
+                except ValidationError as e:
+                    key = 'already_booked' if 'уже забронирован' in str(e) else 'aborted'
+                    local[key] += 1
+                except DatabaseError:
+                    local['aborted'] += 1
+        finally:
+            connection.close()
+            with lock:
+                for key, value in local.items():
+                    counters[key] += value
+
+    workers = [threading.Thread(target=worker, args=(seed,)) for seed in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    seconds = time.perf_counter() - started
+    talon_service._compare_and_swap = original_cas
+
+    total = threads * operations
+    return {
+        'name': name,
+        'ops_per_second': total / seconds,
+        'abort_rate': counters['aborted'] / total,
+        'cas_attempts': cas['attempts'],
+        'cas_conflict_rate': cas['conflicts'] / cas['attempts'] if cas['attempts'] else 0.0,
+        **counters,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--operations', type=int, default=200, help="Операций на поток")
+    parser.add_argument('--hot-talons', type=int, default=5, help="Сколько талонов делят все потоки")
+    args = parser.parse_args()
+    if not 1 <= args.hot_talons <= MAX_HOT_TALONS:
+        parser.error(f"--hot-talons должно быть от 1 до {MAX_HOT_TALONS}")
+
+    setup_django(file_db=True)
+
+    from appointments.models import Clinic, Doctor, Talon
+    from appointments.services.talon_service import book_talon, cancel_talon
+
+    clinic = Clinic.objects.create(name='Бенчмарк')
+    doctor = Doctor.objects.create(
+        clinic=clinic, last_name='Популярный', first_name='Иван', patronymic='Иванович',
+        full_name='Популярный Иван Иванович', duration=15,
+    )
+    # Минутные талоны подряд с 08:00; время считаем от смещения в минутах
+    talon_ids = [
+        Talon.objects.create(
+            doctor=doctor, date=date(2025, 1, 1),
+            start_time=_minutes_to_time(DAY_START_MINUTES + offset),
+            end_time=_minutes_to_time(DAY_START_MINUTES + offset + 1),
+        ).id
+        for offset in range(args.hot_talons)
+    ]
+
+    print(f"{'подход':>12} {'оп/с':>8} {'отказов':>8} {'успешно':>8} {'уже занят':>10} "
+          f"{'попыток CAS':>12} {'конфликтов CAS':>15}")
+    for name, book, cancel in (
+            ('блокировки', locking_book, locking_cancel),
+            ('CAS', cas_book, cancel_talon),
+            ('сервис', book_talon, cancel_talon),
+    ):
+        Talon.objects.filter(id__in=talon_ids).update(is_free=True)
+        result = run_workload(name, book, cancel, talon_ids, args.threads, args.operations)
+        print(f"{result['name']:>12} {result['ops_per_second']:>8.1f} {result['abort_rate']:>8.1%} "
+              f"{result['ok']:>8} {result['already_booked']:>10} "
+              f"{result['cas_attempts']:>12} {result['cas_conflict_rate']:>15.1%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+# benchmarks/bench_doctor_search.py
+"""
+Бенчмарк type-ahead поиска врачей: icontains по таблице Doctor против
+префиксного индекса в памяти процесса (bisect по отсортированным ключам).
+
+    python -m benchmarks.bench_doctor_search
+"""
+import random
+import time
+
+from benchmarks._django import setup_django, measure
+
+DOCTORS = 30_000
+LOOKUPS = 2_000
+
+LAST_NAMES = ['Иванов', 'Петров', 'Сидоров', 'Смирнов', 'Кузнецов', 'Попов', 'Васильев', 'Соколов',
+              'Михайлов', 'Новиков', 'Федоров', 'Морозов', 'Волков', 'Алексеев', 'Лебедев', 'Семенов']
+FIRST_NAMES = ['Иван', 'Петр', 'Алексей', 'Дмитрий', 'Сергей', 'Андрей', 'Михаил', 'Николай', 'Павел', 'Олег']
+
+
+def run():
+    from django.db.models import Q
+
+    from appointments.models import Clinic, Doctor
+    from appointments.services.doctor_search import doctor_index, search_doctors
+
+    random.seed(1)
+    clinics = Clinic.objects.bulk_create([Clinic(name=f'Клиника {i}') for i in range(20)])
+    doctors = []
+    for i in range(DOCTORS):
+        last_name = f"{random.choice(LAST_NAMES)}{random.choice(['', 'а'])}{i % 97 or ''}"
+        first_name = random.choice(FIRST_NAMES)
+        doctors.append(Doctor(clinic=random.choice(clinics), last_name=last_name, first_name=first_name,
+                              patronymic='Иванович', full_name=f'{last_name} {first_name} Иванович', duration=15))
+    Doctor.objects.bulk_create(doctors, batch_size=2000)
+
+    queries = [name[:random.randint(1, 5)] for name in random.choices(LAST_NAMES + FIRST_NAMES, k=LOOKUPS)]
+    clinic_ids = [random.choice(clinics).id if random.random() < 0.5 else None for _ in range(LOOKUPS)]
+
+    def scan(prefix, clinic_id):
+        doctors = Doctor.objects.filter(
+            Q(full_name__istartswith=prefix) | Q(last_name__istartswith=prefix) | Q(first_name__istartswith=prefix)
+        )
+        if clinic_id is not None:
+            doctors = doctors.filter(clinic_id=clinic_id)
+        return list(doctors.order_by('full_name').values_list('id', 'full_name', 'clinic_id')[:10])
+
+    with measure() as direct:
+        for prefix, clinic_id in zip(queries, clinic_ids):
+            scan(prefix, clinic_id)
+
+    started = time.perf_counter()
+    doctor_index.load()
+    build_seconds = time.perf_counter() - started
+
+    with measure() as indexed:
+        for prefix, clinic_id in zip(queries, clinic_ids):
+            search_doctors(prefix, clinic_id=clinic_id)
+
+    print(f"врачей: {DOCTORS}, построение индекса: {build_seconds * 1000:.0f} мс, ключей на врача: 3")
+    print(f"{'путь':>10} {'запросов':>9} {'время, мс':>10} {'мкс/поиск':>10}")
+    for name, result in (('icontains', direct), ('индекс', indexed)):
+        print(f"{name:>10} {result['queries']:>9} {result['seconds'] * 1000:>10.1f} "
+              f"{result['seconds'] / LOOKUPS * 1e6:>10.1f}")
+
+
+if __name__ == '__main__':
+    setup_django()
+    run()
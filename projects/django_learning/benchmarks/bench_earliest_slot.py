@@ -0,0 +1,76 @@
+# benchmarks/bench_earliest_slot.py
+"""
+Бенчмарк поиска ближайших свободных талонов клиники:
+загрузка всех свободных талонов с сортировкой в Python против
+слияния ленивых постраничных итераторов врачей (heapq.merge).
+
+    python -m benchmarks.bench_earliest_slot
+"""
+import random
+from datetime import date, datetime, time, timedelta
+
+from benchmarks._django import setup_django, measure
+
+DOCTORS = 30
+DAYS = 60
+LIMITS = (1, 10, 100)
+BOOKING_DENSITY = 0.7
+
+
+def run():
+    from appointments.models import Clinic, Doctor, Schedule, Talon
+    from appointments.services.schedule_service import generate_talons_for_schedules
+    from appointments.services.search_service import earliest_free_slots
+
+    clinic = Clinic.objects.create(name='Бенчмарк')
+    doctors = Doctor.objects.bulk_create([
+        Doctor(clinic=clinic, last_name=f'Врач{i}', first_name='Иван', patronymic='Иванович',
+               full_name=f'Врач{i} Иван Иванович', duration=15)
+        for i in range(DOCTORS)
+    ])
+    days = [date(2025, 3, 1) + timedelta(days=i) for i in range(DAYS)]
+    Schedule.objects.bulk_create([
+        Schedule(clinic=clinic, doctor=doctor, date=day, start_time=time(8), end_time=time(20),
+                 start_break_time=time(13), end_break_time=time(14))
+        for doctor in doctors for day in days
+    ])
+    generate_talons_for_schedules(clinic_id=clinic.id)
+
+    # Занятость плотнее в начале периода, как в реальной записи
+    random.seed(1)
+    talon_ids = list(Talon.objects.order_by('date', 'start_time').values_list('id', flat=True))
+    booked = [
+        talon_id for position, talon_id in enumerate(talon_ids)
+        if random.random() < BOOKING_DENSITY * (1 - position / len(talon_ids))
+    ]
+    for offset in range(0, len(booked), 500):
+        Talon.objects.filter(id__in=booked[offset:offset + 500]).update(is_free=False)
+
+    after = datetime(2025, 3, 1, 10)
+
+    def naive(limit):
+        rows = sorted(
+            (talon_date, start_time, doctor_id, talon_id)
+            for talon_id, doctor_id, talon_date, start_time in Talon.objects.filter(
+                doctor__clinic_id=clinic.id, is_free=True
+            ).values_list('id', 'doctor_id', 'date', 'start_time')
+            if (talon_date, start_time) >= (after.date(), after.time())
+        )
+        return [row[3] for row in rows[:limit]]
+
+    print(f"талонов: {len(talon_ids)}, свободных: {len(talon_ids) - len(booked)}")
+    print(f"{'K':>5} {'путь':>10} {'запросов':>9} {'время, мс':>10}")
+    for limit in LIMITS:
+        with measure() as full:
+            expected = naive(limit)
+        with measure() as merged:
+            slots = earliest_free_slots(clinic.id, after=after, limit=limit)
+        assert [slot.talon_id for slot in slots] == expected
+
+        for name, result in (('все', full), ('слияние', merged)):
+            print(f"{limit:>5} {name:>10} {result['queries']:>9} {result['seconds'] * 1000:>10.1f}")
+
+
+if __name__ == '__main__':
+    setup_django()
+    run()
@@ -0,0 +1,48 @@
+# benchmarks/bench_interval_index.py
+"""
+Микробенчмарк проверки пересечений слотов с занятыми интервалами:
+попарное сравнение против IntervalIndex.
+
+    python -m benchmarks.bench_interval_index
+"""
+import random
+import timeit
+
+from appointments.services.interval_index import IntervalIndex
+
+
+def naive_overlaps(busy, start, end):
+    for busy_start, busy_end in busy:
+        if not (end <= busy_start or start >= busy_end):
+            return True
+    return False
+
+
+def run():
+    random.seed(42)
+    day_minutes = 24 * 60 * 30  # месяц в минутах, чтобы уместить тысячи интервалов
+
+    print(f"{'занятых':>8} {'слотов':>7} {'попарно, мс':>12} {'индекс, мс':>11} {'ускорение':>10}")
+    for busy_count in (100, 1_000, 5_000, 10_000):
+        busy = []
+        for _ in range(busy_count):
+            start = random.randrange(0, day_minutes - 30)
+            busy.append((start, start + random.choice((10, 15, 20, 30))))
+        slots = [(start, start + 15) for start in range(0, day_minutes, 15)][:2_000]
+
+        def run_naive():
+            return [slot for slot in slots if not naive_overlaps(busy, *slot)]
+
+        def run_index():
+            index = IntervalIndex(busy)
+            return [slot for slot in slots if not index.overlaps(*slot)]
+
+        assert run_naive() == run_index()
+
+        naive_ms = min(timeit.repeat(run_naive, number=1, repeat=3)) * 1000
+        index_ms = min(timeit.repeat(run_index, number=1, repeat=3)) * 1000
+        print(f"{busy_count:>8} {len(slots):>7} {naive_ms:>12.1f} {index_ms:>11.2f} {naive_ms / index_ms:>9.0f}x")
+
+
+if __name__ == '__main__':
+    run()
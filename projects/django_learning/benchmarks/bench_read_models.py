@@ -0,0 +1,96 @@
+# benchmarks/bench_read_models.py
+"""
+Бенчмарк страниц-списков на 10k строк: экземпляры моделей против легких
+строк с __slots__ из values_list() (read-модели). Замеряются время
+загрузки, пик памяти (tracemalloc) и время рендера того же шаблона.
+
+    python -m benchmarks.bench_read_models
+"""
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+from benchmarks._django import setup_django
+
+ROWS = 10_000
+DOCTORS = 50
+
+
+def _measure(load, template_name: str, context_name: str) -> dict:
+    """
+    Время загрузки и рендера - без трассировки памяти; память - отдельным
+    прогоном: сколько занимают загруженные строки и пик за загрузку и рендер
+    """
+    from django.template.loader import render_to_string
+
+    started = time.perf_counter()
+    rows = load()
+    loaded = time.perf_counter()
+    html = render_to_string(template_name, {context_name: rows, 'filters': {}})
+    rendered = time.perf_counter()
+    del rows
+
+    tracemalloc.start()
+    rows = load()
+    rows_size, _ = tracemalloc.get_traced_memory()
+    render_to_string(template_name, {context_name: rows, 'filters': {}})
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'rows': len(rows),
+        'load_ms': (loaded - started) * 1000,
+        'render_ms': (rendered - loaded) * 1000,
+        'rows_mb': rows_size / 2 ** 20,
+        'peak_mb': peak / 2 ** 20,
+        'html': html,
+    }
+
+
+def run():
+    from django.db.models import F
+
+    from appointments.models import Clinic, Doctor, Talon
+    from appointments.services.doctor_service import get_doctor_rows
+    from appointments.services.talon_service import get_talons_page
+
+    clinic = Clinic.objects.create(name='Бенчмарк')
+    Doctor.objects.bulk_create([
+        Doctor(clinic=clinic, last_name=f'Врач{i}', first_name='Иван', patronymic='Иванович',
+               full_name=f'Врач{i} Иван Иванович', duration=15)
+        for i in range(ROWS)
+    ], batch_size=2000)
+    doctors = list(Doctor.objects.order_by('id')[:DOCTORS])
+    day = date(2025, 3, 1)
+    Talon.objects.bulk_create([
+        Talon(doctor=doctors[i % DOCTORS], date=day + timedelta(days=i // (DOCTORS * 40)),
+              start_time=f'{8 + i // DOCTORS % 40 // 4:02}:{i // DOCTORS % 4 * 15:02}',
+              end_time=f'{8 + (i // DOCTORS % 40 + 1) // 4:02}:{(i // DOCTORS % 40 + 1) % 4 * 15:02}')
+        for i in range(ROWS)
+    ], batch_size=2000)
+
+    # "модели" - прежняя загрузка страниц: экземпляры с аннотацией имени врача
+    talons = Talon.objects.annotate(doctor_full_name=F('doctor__full_name')).order_by('date', 'start_time', 'id')
+    cases = [
+        ('талоны', 'talons/index.html', 'talons', {
+            'модели': lambda: list(talons[:ROWS]),
+            'строки': lambda: get_talons_page(limit=ROWS).talons,
+        }),
+        ('врачи', 'doctors/index.html', 'doctors', {
+            'модели': lambda: list(Doctor.objects.order_by('id').annotate(clinic_name=F('clinic__name'))),
+            'строки': get_doctor_rows,
+        }),
+    ]
+
+    print(f"{'список':>8} {'путь':>8} {'строк':>6} {'загрузка, мс':>13} {'рендер, мс':>11} "
+          f"{'строки, МБ':>11} {'пик, МБ':>8}")
+    for title, template_name, context_name, loaders in cases:
+        results = {name: _measure(load, template_name, context_name) for name, load in loaders.items()}
+        assert results['модели']['html'] == results['строки']['html']
+        for name, result in results.items():
+            print(f"{title:>8} {name:>8} {result['rows']:>6} {result['load_ms']:>13.1f} {result['render_ms']:>11.1f} "
+                  f"{result['rows_mb']:>11.2f} {result['peak_mb']:>8.2f}")
+
+
+if __name__ == '__main__':
+    setup_django()
+    run()
@@ -0,0 +1,47 @@
+# benchmarks/bench_talon_generation.py
+"""
+Бенчмарк split_schedule_to_talons: количество запросов и время
+в зависимости от числа слотов в дне врача.
+
+    python -m benchmarks.bench_talon_generation
+"""
+from datetime import date, time
+
+from benchmarks._django import setup_django, measure
+
+
+def run():
+    from appointments.models import Clinic, Doctor, Schedule
+    from appointments.services.schedule_service import split_schedule_to_talons
+
+    clinic = Clinic.objects.create(name='Бенчмарк')
+
+    print(f"{'длительность':>12} {'талонов':>8} {'запросов':>9} {'время, мс':>10}")
+    for day, duration in enumerate([60, 30, 15, 10, 5, 2], start=1):
+        doctor = Doctor.objects.create(
+            clinic=clinic,
+            last_name='Иванов',
+            first_name='Иван',
+            patronymic='Иванович',
+            full_name='Иванов Иван Иванович',
+            duration=duration,
+        )
+        schedule = Schedule.objects.create(
+            clinic=clinic,
+            doctor=doctor,
+            date=date(2025, 1, day),
+            start_time=time(8, 0),
+            end_time=time(20, 0),
+            start_break_time=time(13, 0),
+            end_break_time=time(14, 0),
+        )
+
+        with measure() as result:
+            talons_created = len(split_schedule_to_talons(schedule.id))
+
+        print(f"{duration:>12} {talons_created:>8} {result['queries']:>9} {result['seconds'] * 1000:>10.1f}")
+
+
+if __name__ == '__main__':
+    setup_django()
+    run()
@@ -0,0 +1,85 @@
+# benchmarks/bench_wsgi_vs_asgi.py
+"""
+Нагрузочное сравнение WSGI и ASGI: запросы в секунду и задержки p50/p99
+при большом числе одновременных соединений. Клиент на asyncio без
+сторонних зависимостей, серверы запускаются отдельно, например:
+
+    gunicorn django_learning.wsgi -w 4 --threads 8 -b 127.0.0.1:8001
+    uvicorn django_learning.asgi:application --workers 4 --port 8002
+
+    python -m benchmarks.bench_wsgi_vs_asgi \\
+        --target wsgi=http://127.0.0.1:8001/talons/ \\
+        --target asgi=http://127.0.0.1:8002/async/talons/ \\
+        --concurrency 200 --requests 5000
+"""
+import argparse
+import asyncio
+import time
+from urllib.parse import urlsplit
+
+
+async def _fetch(host: str, port: int, path: str) -> float:
+    """Один GET без keep-alive, возвращает задержку в секундах"""
+    started = time.perf_counter()
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(
+        f"GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode()
+    )
+    await writer.drain()
+    status_line = await reader.readline()
+    await reader.read()
+    writer.close()
+    if b' 200 ' not in status_line:
+        raise RuntimeError(status_line.decode(errors='replace').strip())
+    return time.perf_counter() - started
+
+
+async def run_load(url: str, concurrency: int, total: int) -> dict:
+    parts = urlsplit(url)
+    path = parts.path + (f"?{parts.query}" if parts.query else '')
+    latencies = []
+    errors = 0
+    remaining = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            try:
+                latencies.append(await _fetch(parts.hostname, parts.port or 80, path))
+            except (OSError, RuntimeError):
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else 0.0
+
+    return {
+        'rps': len(latencies) / elapsed,
+        'p50_ms': percentile(0.50),
+        'p99_ms': percentile(0.99),
+        'errors': errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--target', action='append', required=True, help="имя=URL, можно несколько")
+    parser.add_argument('--concurrency', type=int, default=100)
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{'сервер':>8} {'rps':>8} {'p50, мс':>8} {'p99, мс':>8} {'ошибок':>7}")
+    for target in args.target:
+        name, url = target.split('=', 1)
+        result = asyncio.run(run_load(url, args.concurrency, args.requests))
+        print(f"{name:>8} {result['rps']:>8.1f} {result['p50_ms']:>8.1f} "
+              f"{result['p99_ms']:>8.1f} {result['errors']:>7}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+# benchmarks/run_suite.py
+"""
+Набор замеров приложения appointments на нескольких объемах данных:
+split_schedule_to_talons, book_talon и каждый URL из appointments/urls.py.
+Для каждого замера пишутся число запросов, время и пиковая память
+(tracemalloc) в JSON, чтобы сравнивать прогоны между собой.
+
+    python -m benchmarks.run_suite --sizes 2x10x30 5x50x90 --output bench.json
+
+Размер - КЛИНИКИxВРАЧЕЙxДНЕЙ для команды generate_fake_data.
+"""
+import argparse
+import json
+import platform
+import time
+import tracemalloc
+from datetime import date, datetime, time as day_time, timedelta
+from io import StringIO
+
+from benchmarks._django import setup_django
+
+# Даты синтетических данных фиксированы, чтобы прогоны были сравнимы
+DATA_START = date(2025, 1, 6)
+
+# Маршруты, которые меняют данные, замеряются POST-запросом
+POST_ROUTES = {'book_talon', 'cancel_talon', 'generate_talons', 'book_talons', 'async_book_talon', 'async_cancel_talon',
+               'book_template_slot'}
+
+
+def _measure(func) -> dict:
+    """Время, число SQL-запросов и пиковая память вызова func"""
+    from django.core.cache import cache
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    # Холодный кэш, чтобы прогоны не зависели от порядка замеров
+    cache.clear()
+    tracemalloc.start()
+    with CaptureQueriesContext(connection) as queries:
+        started = time.perf_counter()
+        extra = func() or {}
+        seconds = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'queries': len(queries), 'seconds': seconds, 'peak_kb': peak / 1024, **extra}
+
+
+def _url_cases(ids: dict) -> list[tuple[str, str, str, dict]]:
+    """(имя маршрута, метод, url, данные) для каждого маршрута приложения"""
+    from django.urls import URLPattern, reverse
+    import appointments.urls
+
+    kwargs_by_name = {
+        'doctor_id': ids['doctor_id'],
+        'talon_id': ids['talon_id'],
+        'clinic_id': ids['clinic_id'],
+        'schedule_id': ids['schedule_id'],
+        'job_id': ids['job_id'],
+        'kind': 'talons',
+    }
+    query_by_name = {
+        'api_availability': f"?clinic_id={ids['clinic_id']}&date_from={DATA_START}",
+        'doctor_availability': f"?date={ids['date']}",
+        'api_doctor_search': "?q=%D0%98",
+        'api_export': f"?clinic_id={ids['clinic_id']}&gzip=1",
+        'api_clinic_earliest': f"?after={DATA_START}T12:00&limit=20",
+        'api_doctor_stats': f"?clinic_id={ids['clinic_id']}&date_from={DATA_START}&date_to={DATA_START + timedelta(days=89)}&days=1",
+    }
+    data_by_name = {'book_talons': {'talon_ids': [ids['free_talon_id']]}}
+
+    cases = []
+    for pattern in appointments.urls.urlpatterns:
+        if not isinstance(pattern, URLPattern) or not pattern.name:
+            continue
+        kwargs = {name: kwargs_by_name[name] for name in pattern.pattern.converters}
+        url = reverse(pattern.name, kwargs=kwargs) + query_by_name.get(pattern.name, '')
+        method = 'post' if pattern.name in POST_ROUTES else 'get'
+        cases.append((pattern.name, method, url, data_by_name.get(pattern.name, {})))
+    return cases
+
+
+def run_size(size: str) -> list[dict]:
+    from django.core.management import call_command
+    from django.test import Client
+
+    from appointments.models import Clinic, Doctor, Schedule, Talon
+    from appointments.services.job_service import enqueue_generation
+    from appointments.services.schedule_service import split_schedule_to_talons
+    from appointments.services.talon_service import book_talon
+
+    clinics, doctors, days = (int(part) for part in size.split('x'))
+    call_command('flush', interactive=False, verbosity=0)
+    call_command(
+        'generate_fake_data', clinics=clinics, doctors=doctors, days=days,
+        start_date=DATA_START, booking_density=0.3, stdout=StringIO(),
+    )
+
+    results = []
+
+    def record(name: str, measurement: dict):
+        results.append({'size': size, 'name': name, **measurement})
+        print(f"{size:>12} {name:<28} {measurement['queries']:>7} "
+              f"{measurement['seconds'] * 1000:>10.1f} {measurement['peak_kb']:>10.0f}")
+
+    # Генерация талонов для нового графика
+    doctor = Doctor.objects.order_by('id').first()
+    schedule = Schedule.objects.create(
+        clinic_id=doctor.clinic_id, doctor=doctor, date=date(2030, 1, 1),
+        start_time=day_time(8), end_time=day_time(20),
+        start_break_time=day_time(13), end_break_time=day_time(14),
+    )
+    record('split_schedule_to_talons', _measure(
+        lambda: {'talons': len(split_schedule_to_talons(schedule.id))}
+    ))
+
+    free_talon_id = Talon.objects.filter(is_free=True).order_by('id').values_list('id', flat=True)[0]
+    record('book_talon', _measure(lambda: book_talon(free_talon_id) and None))
+
+    talon = Talon.objects.filter(is_free=True).order_by('id')[0]
+    ids = {
+        'clinic_id': Clinic.objects.order_by('id').values_list('id', flat=True)[0],
+        'doctor_id': talon.doctor_id,
+        'talon_id': talon.id,
+        'free_talon_id': Talon.objects.filter(is_free=True).order_by('-id').values_list('id', flat=True)[0],
+        'schedule_id': schedule.id,
+        'job_id': enqueue_generation(schedule.id).id,
+        'date': talon.date,
+    }
+
+    # Ошибка во view записывается статусом 500, а не прерывает прогон
+    client = Client(raise_request_exception=False)
+    for name, method, url, data in _url_cases(ids):
+        def request():
+            response = getattr(client, method)(url, data)
+            size_bytes = (
+                sum(len(chunk) for chunk in response.streaming_content)
+                if response.streaming else len(response.content)
+            )
+            return {'url': url, 'status': response.status_code, 'bytes': size_bytes}
+        record(f"view:{name}", _measure(request))
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', nargs='+', default=['1x5x30', '3x30x90'])
+    parser.add_argument('--output', default='bench.json')
+    args = parser.parse_args()
+
+    setup_django()
+
+    print(f"{'размер':>12} {'замер':<28} {'запросов':>7} {'время, мс':>10} {'пик, КБ':>10}")
+    results = []
+    for size in args.sizes:
+        results.extend(run_size(size))
+
+    with open(args.output, 'w', encoding='utf-8') as output:
+        json.dump({
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sizes': args.sizes,
+            'results': results,
+        }, output, ensure_ascii=False, indent=2, default=str)
+    print(f"Результаты записаны в {args.output}")
+
+
+if __name__ == '__main__':
+    main()
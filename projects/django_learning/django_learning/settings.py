@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -41,6 +42,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'appointments.middleware.PerformanceMiddleware',
+    'appointments.db_router.ReplicaPinMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -50,6 +53,11 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Заголовки X-DB-* с числом запросов и временем на каждом ответе
+PERF_HEADERS = DEBUG
+# Сколько одинаковых по форме SQL-запросов за запрос считать признаком N+1
+PERF_N_PLUS_ONE_THRESHOLD = 5
+
 ROOT_URLCONF = 'django_learning.urls'
 
 TEMPLATES = [
@@ -81,6 +89,65 @@ DATABASES = {
     }
 }
 
+# Реплика для страниц списков: путь к SQLite-файлу реплики в DJANGO_REPLICA_DB.
+# В тестах реплика зеркалит default
+REPLICA_DB_NAME = os.environ.get('DJANGO_REPLICA_DB')
+if REPLICA_DB_NAME:
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': REPLICA_DB_NAME,
+        'TEST': {
+            'MIRROR': 'default',
+        },
+    }
+
+DATABASE_ROUTERS = ['appointments.db_router.CacheRouter', 'appointments.db_router.PrimaryReplicaRouter']
+
+# Сколько секунд после бронирования или отмены читать только с основной БД
+REPLICA_LAG_SECONDS = 5
+
+# Как часто фоновый поток перестраивает индекс поиска врачей, секунд (None - без потока)
+DOCTOR_INDEX_REFRESH_SECONDS = 300
+
+
+# Cache
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+
+# Кэш общий для всех процессов: веб-воркеров, воркера генерации и команд.
+# Инвалидация идет увеличением версий в ключах, и бронирование в одном процессе
+# сбрасывает кэш других, только если они читают версии из того же хранилища.
+# DJANGO_REDIS_URL - Redis, иначе DatabaseCache в отдельной SQLite-БД cache
+# (manage.py createcachetable --database cache), чтобы запросы кэша не смешивались
+# с запросами данных. Кэш в памяти процесса (LocMemCache) допустим только
+# с CACHE_SINGLE_PROCESS = True
+REDIS_URL = os.environ.get('DJANGO_REDIS_URL')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'TIMEOUT': 300,
+        }
+    }
+else:
+    DATABASES['cache'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'cache.sqlite3',
+    }
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'appointments_cache',
+            'TIMEOUT': 300,
+            'OPTIONS': {
+                'MAX_ENTRIES': 10000,
+            },
+        }
+    }
+
+CACHE_SINGLE_PROCESS = False
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators